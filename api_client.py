@@ -0,0 +1,165 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from snapshot_format import encode_snapshot, decode_snapshot
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+# (connect, read) seconds; connecting should be quick, the investor payload can take a while
+DEFAULT_TIMEOUT = (5, 30)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def redact_url(url):
+    """
+    Stable short label for a URL that can go in (public) logs: the endpoint URLs are secrets, so
+    only a hash is shown, e.g. "url#3fa2c1d0e4b7"; the same URL always gets the same label.
+    """
+    return "url#" + hashlib.sha256(url.encode("utf-8")).hexdigest()[:12]
+
+
+def redact_error(error, url):
+    """str(error) with the URL and its host / path / query (as requests / urllib3 quote them) masked"""
+    text = str(error)
+    parts = urlsplit(url)
+    label = redact_url(url)
+    path = parts.path if len(parts.path) > 1 else None
+    query = f"{parts.path}?{parts.query}" if parts.query else None
+    for secret in (url, query, parts.netloc, parts.hostname, path, parts.query):
+        if secret:
+            text = text.replace(secret, label)
+    return text
+
+
+def make_retry(total=3, backoff_factor=0.5, backoff_jitter=0.5):
+    """GET-only retries with exponential backoff (0.5s, 1s, 2s, ...) plus jitter; honours Retry-After"""
+    options = dict(total=total, connect=total, read=total, status=total, backoff_factor=backoff_factor,
+                   status_forcelist=RETRY_STATUSES, allowed_methods=frozenset(["GET"]),
+                   respect_retry_after_header=True, raise_on_status=False)
+    try:
+        return Retry(backoff_jitter=backoff_jitter, **options)
+    except TypeError:
+        # urllib3 < 2 has no jitter
+        return Retry(**options)
+
+
+class ConditionalCache:
+    """
+    ETag / Last-Modified validators and the last body per URL, so unchanged endpoints can be
+    answered with 304 Not Modified. Persisted Fernet-encrypted when a fernet and path are given.
+    """
+
+    def __init__(self, fernet=None, path=None):
+        self.fernet = fernet
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if fernet and path and os.path.exists(path):
+            try:
+                with open(path, "rb") as fh:
+                    self.entries = decode_snapshot(fernet.decrypt(fh.read()))
+            except Exception as e:
+                print(f"Ignoring API cache {path}: {e}")
+
+    def headers(self, url):
+        entry = self.entries.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body(self, url):
+        entry = self.entries.get(url)
+        return entry['body'] if entry else None
+
+    def store(self, url, response, body):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.entries[url] = {'etag': etag, 'last_modified': last_modified, 'body': body}
+            self.dirty = True
+
+    def save(self):
+        if not (self.fernet and self.path and self.dirty):
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(self.fernet.encrypt(encode_snapshot(self.entries)))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+class ApiClient:
+    """
+    Shared client for the MyAlternates JSON endpoints: one keep-alive connection pool, common
+    headers, (connect, read) timeouts, retries with backoff + jitter on connection errors and
+    429/5xx, conditional GETs, and concurrent fetches of several endpoints.
+    """
+
+    def __init__(self, session, referer="", timeout=DEFAULT_TIMEOUT, retry=None, pool_size=8, metrics=None,
+                 cache=None):
+        self.session = session
+        self.timeout = timeout
+        self.metrics = metrics
+        self.cache = cache or ConditionalCache()
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry or make_retry())
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self.headers = {'User-Agent': USER_AGENT, 'Accept': 'application/json'}
+        if referer:
+            self.headers['Referer'] = referer
+
+    def get(self, url, cookies=None, token=None, conditional=True, name=None):
+        """
+        GET url and return (status, body): the parsed JSON (or text) body, the cached body on a
+        304, or (None, None) when the request failed after retries. With a `name`, the status and
+        size are recorded as <name>_api_status / <name>_api_bytes gauges.
+        """
+        headers = dict(self.headers)
+        if token:
+            headers['authorization'] = token
+        if conditional:
+            headers.update(self.cache.headers(url))
+        try:
+            response = self.session.get(url, cookies=cookies, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            self._count('api_failures')
+            print(f"GET {name or 'API'} ({redact_url(url)}) failed: {type(e).__name__}: {redact_error(e, url)}")
+            return None, None
+        retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+        if retries:
+            self._count('api_retries', len(retries))
+        if name and self.metrics:
+            self.metrics.gauge(f'{name}_api_status', response.status_code)
+            self.metrics.gauge(f'{name}_api_bytes', len(response.content))
+        if response.status_code == 304:
+            self._count('api_not_modified')
+            return 304, self.cache.body(url)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        if response.ok and conditional and isinstance(body, dict):
+            self.cache.store(url, response, body)
+        return response.status_code, body
+
+    def get_many(self, urls, cookies=None, token=None):
+        """{name: (status, body)} for {name: url}, fetched concurrently over the shared pool"""
+        if len(urls) <= 1:
+            return {name: self.get(url, cookies, token, name=name) for name, url in urls.items()}
+        with ThreadPoolExecutor(max_workers=min(len(urls), self.pool_size)) as pool:
+            futures = {name: pool.submit(self.get, url, cookies, token, name=name) for name, url in urls.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def _count(self, name, n=1):
+        if self.metrics:
+            self.metrics.count(name, n)
@@ -0,0 +1,231 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import RunMetrics
+from portfolio_tracker import MyAlternatesAutomation, parse_extra_api_urls, parse_risk_windows, record_delivery
+
+
+def load_accounts(source):
+    """
+    Load account configs from a JSON file path or a JSON string. Each entry looks like:
+    {"name": "ajay", "username": "...", "password": "...", "recipients": [123],
+     "login_url": "...", "session_api_url": "...", "investor_api_url": "...", "login_backend": "http"}
+    URLs and login_backend default to the LOGIN_URL / SESSION_API_URL / INVESTOR_API_URL /
+    LOGIN_BACKEND environment variables.
+    """
+    if os.path.exists(source):
+        with open(source, "r", encoding="utf-8") as f:
+            accounts = json.load(f)
+    else:
+        accounts = json.loads(source)
+    for i, account in enumerate(accounts):
+        account.setdefault('name', f"account{i + 1}")
+        account.setdefault('login_url', os.environ.get('LOGIN_URL', ''))
+        account.setdefault('session_api_url', os.environ.get('SESSION_API_URL', ''))
+        account.setdefault('investor_api_url', os.environ.get('INVESTOR_API_URL', ''))
+        account.setdefault('login_backend', os.environ.get('LOGIN_BACKEND', 'selenium'))
+    check_unique_names(accounts)
+    return accounts
+
+
+def check_unique_names(accounts):
+    """
+    Results, recipients and history files are all looked up by account name (files by its slug),
+    so two accounts with the same name or slug would overwrite each other: refuse them.
+    """
+    seen = {}
+    for account in accounts:
+        slug = account_slug(account['name'])
+        if slug in seen:
+            raise ValueError(f"Duplicate account name {account['name']!r} "
+                             f"(same files as {seen[slug]!r}); account names must be unique")
+        seen[slug] = account['name']
+
+
+def account_slug(name):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_") or "account"
+
+
+def make_automation(account):
+    """Build a MyAlternatesAutomation whose history files are private to the account"""
+    automation = MyAlternatesAutomation(
+        username=account['username'],
+        password=account['password'],
+        login_url=account['login_url'],
+        session_api_url=account['session_api_url'],
+        investor_api_url=account['investor_api_url'],
+        headless=True,
+        login_backend=account['login_backend']
+    )
+    slug = account_slug(account['name'])
+    automation.enc_file = f"portfolio_data.{slug}.enc"
+    automation.data_file = f"portfolio_data.{slug}.json"
+    automation.history_file = f"portfolio_history.{slug}.enc"
+    automation.rollups_file = f"portfolio_rollups.{slug}.enc"
+    automation.risk_file = f"portfolio_risk.{slug}.enc"
+    automation.api_cache_file = f"api_cache.{slug}.enc"
+    automation.extra_api_urls = account.get('extra_api_urls',
+                                            parse_extra_api_urls(os.environ.get('EXTRA_API_URLS', '')))
+    automation.risk_windows = tuple(account.get('risk_windows',
+                                                parse_risk_windows(os.environ.get('RISK_WINDOWS', ''))))
+    automation.account_name = account['name']
+    automation.metrics = RunMetrics(labels={'account': slug})
+    automation.on_unchanged = account.get('on_unchanged', os.environ.get('ON_UNCHANGED', 'notice'))
+    return automation
+
+
+def fetch_account(automation, cancelled):
+    """Worker: fetch + analyze + render for one account. Telegram and saving stay on the caller."""
+    with automation.metrics.span('fetch'):
+        results = automation.run_full_automation()
+    if cancelled.is_set():
+        return None
+    if not results or not isinstance(results.get('investor_api'), dict):
+        raise Exception("Automation failed")
+    if automation.is_unchanged(results['investor_api']):
+        notice = automation.unchanged_notice(results['investor_api'])
+        return {'data': results['investor_api'], 'unchanged': True,
+                'message': [notice] if automation.on_unchanged == "notice" else []}
+    message = automation.prepare_report(results['investor_api'])
+    return {'data': results['investor_api'], 'unchanged': False, 'message': message}
+
+
+def run_batch(accounts, workers=4, timeout=300):
+    """
+    Fetch all accounts concurrently on a bounded thread pool. Each account gets `timeout`
+    seconds from the moment its worker starts; a timed-out account has its browser closed and
+    its late result discarded. Returns {name: {'status', 'elapsed', 'report', 'error', 'automation'}}.
+
+    Only the Selenium backend can be interrupted (quitting the browser makes the blocked call
+    fail). A request in flight on the HTTP backend cannot be: that worker keeps running until
+    its call returns (bounded by the API timeouts and retries) and keeps its pool slot until
+    then, even though the account is already reported as timed out.
+    """
+    check_unique_names(accounts)
+    results = {}
+    running = {}
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pms-account")
+
+    def job(automation, cancelled, started):
+        started['at'] = time.monotonic()
+        return fetch_account(automation, cancelled)
+
+    pending = set()
+    for account in accounts:
+        automation = make_automation(account)
+        cancelled = threading.Event()
+        started = {}
+        future = pool.submit(job, automation, cancelled, started)
+        running[future] = (account, automation, cancelled, started)
+        pending.add(future)
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                account, automation, _, started = running[future]
+                elapsed = time.monotonic() - started.get('at', time.monotonic())
+                try:
+                    report = future.result()
+                    results[account['name']] = {'status': 'ok', 'elapsed': elapsed, 'report': report,
+                                                'error': None, 'automation': automation}
+                    print(f"[{account['name']}] fetched in {elapsed:.1f}s")
+                except Exception as e:
+                    results[account['name']] = {'status': 'failed', 'elapsed': elapsed, 'report': None,
+                                                'error': str(e), 'automation': automation}
+                    print(f"[{account['name']}] failed after {elapsed:.1f}s: {e}")
+
+            now = time.monotonic()
+            for future in list(pending):
+                account, automation, cancelled, started = running[future]
+                if 'at' in started and now - started['at'] > timeout:
+                    print(f"[{account['name']}] timed out after {timeout}s")
+                    cancelled.set()
+                    pending.discard(future)
+                    results[account['name']] = {'status': 'timeout', 'elapsed': now - started['at'],
+                                                'report': None, 'error': f"timed out after {timeout}s",
+                                                'automation': automation}
+                    # closing the browser makes the blocked WebDriver call fail so the worker unwinds
+                    if automation.driver:
+                        try:
+                            automation.driver.quit()
+                        except Exception:
+                            pass
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def deliver(accounts, results, api_id, api_hash, session_string, default_recipients):
+    """Send each successful report, then persist its snapshot (same order as main())"""
+    from telegram_broadcast import TelegramBroadcaster
+
+    by_name = {a['name']: a for a in accounts}
+    broadcaster = TelegramBroadcaster(api_id, api_hash, session_string)
+    for name, result in results.items():
+        if result['status'] != 'ok':
+            continue
+        account = by_name[name]
+        automation = result['automation']
+        try:
+            if result['report']['message']:
+                with automation.metrics.span('telegram'):
+                    delivery = broadcaster.broadcast(account.get('recipients') or default_recipients,
+                                                     result['report']['message'])
+                record_delivery(automation.metrics, delivery)
+            if result['report']['unchanged']:
+                print(f"[{name}] unchanged since last snapshot - not saved")
+                continue
+            with automation.metrics.span('save'):
+                automation.save_current_data(result['report']['data'])
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = f"delivery failed: {e}"
+            print(f"[{name}] delivery failed: {e}")
+
+
+def export_metrics(results, directory):
+    """One JSON record + Prometheus file per account"""
+    for result in results.values():
+        automation = result['automation']
+        outcome = 'success' if result['status'] == 'ok' else result['status']
+        if outcome == 'success' and result['report']['unchanged']:
+            outcome = 'unchanged'
+        automation.metrics.set_outcome(outcome)
+        automation.metrics.export(directory, name=f"portfolio_tracker_{automation.metrics.labels['account']}")
+
+
+def main(accounts, api_id, api_hash, session_string, recipients, workers=4, timeout=300):
+    started = time.monotonic()
+    results = run_batch(accounts, workers=workers, timeout=timeout)
+    deliver(accounts, results, api_id, api_hash, session_string, recipients)
+    export_metrics(results, os.environ.get('METRICS_DIR', 'metrics'))
+
+    print("\n" + "=" * 50)
+    print(f"BATCH COMPLETED in {time.monotonic() - started:.1f}s")
+    print("=" * 50)
+    for name, result in results.items():
+        suffix = f" ({result['error']})" if result['error'] else ""
+        print(f"{name}: {result['status']} {result['elapsed']:.1f}s{suffix}")
+    return results
+
+
+if __name__ == "__main__":
+    api_id_cred = int(os.environ.get('API_ID', 0))
+    api_hash_cred = os.environ.get('API_HASH', '')
+    session = os.environ.get('SESSION_STRING', '')
+    recipients_str = os.environ.get('RECIPIENT_IDS', '')
+    recipients = [int(r.strip()) for r in recipients_str.split(',') if r.strip()]
+
+    # PMS_ACCOUNTS holds either a path to a JSON file or the JSON itself (e.g. from a secret)
+    accounts = load_accounts(os.environ.get('PMS_ACCOUNTS', 'accounts.json'))
+    workers = int(os.environ.get('BATCH_WORKERS', 4))
+    timeout = float(os.environ.get('BATCH_TIMEOUT', 300))
+
+    results = main(accounts, api_id_cred, api_hash_cred, session, recipients, workers=workers, timeout=timeout)
+    if not any(r['status'] == 'ok' for r in results.values()):
+        raise SystemExit(1)
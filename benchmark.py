@@ -0,0 +1,283 @@
+"""
+Benchmarks for the report hot path on synthetic data:
+
+    load_previous_data       decrypt + parse the latest snapshot
+    analyze_changes          diff previous vs current payload
+    generate_telegram_message
+    save_current_data        serialize + encrypt + append
+    startup                  `import cli` in a fresh interpreter (offline commands)
+
+Usage:
+    python benchmark.py                          # default scales, compare with benchmark_baseline.json
+    python benchmark.py --scales 50x30,2000x250  # holdings x days of history
+    python benchmark.py --update-baseline        # record the current numbers as the baseline
+
+Stage times are the median of --repeat runs. Every scale also times a fixed reference workload
+(JSON round trip and sort of a synthetic payload, no repo code), and the baseline is rescaled by
+how fast that reference ran now versus when the baseline was recorded (median over the scales),
+so the gate compares relative cost rather than one machine's absolute milliseconds.
+
+Exits with status 1 when a stage is slower (or uses more peak memory) than the rescaled baseline
+by more than --tolerance in two measurements in a row, when importing the CLI takes longer than
+--startup-budget (stretched by the same factor on a slower run), or when it loads any of the online-only modules (selenium, telethon, requests).
+Refresh the baseline (--update-baseline) in every change that alters the measured code.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from cryptography.fernet import Fernet
+
+from synthetic_data import generate_history, generate_payload
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SCALES = "20x30,200x60,2000x250"
+# differences below this are timer noise, not regressions
+ABSOLUTE_SLACK_SECONDS = 0.002
+# size and passes of the calibration workload (~10-20 ms)
+REFERENCE_HOLDINGS = 200
+REFERENCE_ROUNDS = 10
+# offline subcommands must start quickly and without the browser / Telegram / HTTP stacks
+STARTUP_BUDGET_SECONDS = 0.25
+HEAVY_MODULES = ("selenium", "telethon", "requests")
+STARTUP_PROBE = (
+    "import json, sys, time, tracemalloc\n"
+    "tracemalloc.start()\n"
+    "started = time.perf_counter()\n"
+    "import cli, portfolio_tracker\n"
+    "seconds = time.perf_counter() - started\n"
+    "heavy = sorted({m.split('.')[0] for m in sys.modules} & set(%r))\n"
+    "print(json.dumps({'seconds': seconds, 'peak_kb': tracemalloc.get_traced_memory()[1] / 1024, 'heavy': heavy}))\n"
+) % (HEAVY_MODULES,)
+
+
+def measure(fn, repeat):
+    """(median seconds of `repeat` runs, peak traced KB) for fn(); memory is taken from a separate traced call"""
+    fn()  # warm caches and lazy imports so the first timed run is not an outlier
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1024
+
+
+def reference_workload(payload):
+    """Fixed CPU work independent of the repo code, to calibrate for the machine's current speed"""
+    def run():
+        for _ in range(REFERENCE_ROUNDS):
+            data = json.loads(json.dumps(payload))
+            sorted(data['Profile']['Holdings'], key=lambda h: (h['Sector'], -h['PortfolioValue']))
+    return run
+
+
+def bench_scale(holdings, days, repeat):
+    from portfolio_tracker import MyAlternatesAutomation
+
+    history = generate_history(holdings=holdings, days=days + 1, seed=holdings * 1000 + days)
+    stored, (_, current) = history[:-1], history[-1]
+
+    automation = MyAlternatesAutomation('bench', 'bench', 'http://localhost/login', '', '')
+    store = automation.get_history_store()
+    for day, payload in stored:
+        store.append(payload, datetime.fromisoformat(day))
+    automation.get_rollups(store).save()
+
+    previous = automation.load_previous_data()
+    analysis = automation.analyze_changes(previous, current)
+    trend = automation.load_trend_history(current)
+
+    def save():
+        automation.save_current_data(current)
+
+    reference, _ = measure(reference_workload(generate_payload(REFERENCE_HOLDINGS)), repeat)
+    stages = {
+        'load_previous_data': lambda: automation.load_previous_data(),
+        'analyze_changes': lambda: automation.analyze_changes(previous, current),
+        'generate_telegram_message': lambda: automation.generate_telegram_message(analysis, history=trend),
+        'save_current_data': save
+    }
+    results = {}
+    for name, fn in stages.items():
+        seconds, peak_kb = measure(fn, repeat)
+        results[name] = {'seconds': seconds, 'peak_kb': peak_kb}
+    results['_reference'] = {'seconds': reference}
+    results['_sizes'] = {
+        'history_bytes': os.path.getsize(store.path),
+        'snapshot_json_bytes': len(json.dumps(current, ensure_ascii=False))
+    }
+    return results
+
+
+def measure_startup(repeat):
+    """Best-of-repeat import time of the CLI, each in a fresh interpreter"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=here, capture_output=True,
+                             text=True, check=True).stdout
+        runs.append(json.loads(out))
+    best = min(runs, key=lambda r: r['seconds'])
+    return {'import_cli': {'seconds': best['seconds'], 'peak_kb': best['peak_kb']},
+            '_heavy_modules': sorted(set().union(*(r['heavy'] for r in runs)))}
+
+
+def check_startup(startup, budget, factor=1.0):
+    """The import budget only grows with the speed factor: a faster machine does not tighten it"""
+    problems = []
+    budget *= max(1.0, factor)
+    if startup['import_cli']['seconds'] > budget:
+        problems.append(f"startup import_cli: {startup['import_cli']['seconds'] * 1000:.1f} ms "
+                        f"> {budget * 1000:.0f} ms budget")
+    if startup['_heavy_modules']:
+        problems.append(f"startup import_cli loads {', '.join(startup['_heavy_modules'])}")
+    return problems
+
+
+def run(scales, repeat):
+    os.environ.setdefault('FERNET_KEY', Fernet.generate_key().decode())
+    cwd = os.getcwd()
+    all_results = {}
+    for scale in scales:
+        holdings, days = (int(x) for x in scale.split("x"))
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            # the automation prints progress; keep the benchmark output readable
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                all_results[scale] = bench_scale(holdings, days, repeat)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+                os.chdir(cwd)
+    return all_results
+
+
+def speed_factor(results, baseline):
+    """
+    How much slower this machine ran the reference workload now than when the baseline was
+    recorded: the median ratio over all scales, which is steadier than any single scale's.
+    """
+    ratios = [stages['_reference']['seconds'] / baseline[scale]['_reference']['seconds']
+              for scale, stages in results.items()
+              if '_reference' in stages and '_reference' in baseline.get(scale, {})]
+    return statistics.median(ratios) if ratios else 1.0
+
+
+def compare(results, baseline, tolerance, factor=1.0):
+    """List of (scale, message) regressions against the baseline, its times multiplied by `factor`"""
+    regressions = []
+    for scale, stages in results.items():
+        if scale == "startup":
+            # checked against --startup-budget instead
+            continue
+        for stage, numbers in stages.items():
+            base = baseline.get(scale, {}).get(stage)
+            if stage.startswith("_") or not base:
+                continue
+            limit = base['seconds'] * factor * (1 + tolerance) + ABSOLUTE_SLACK_SECONDS
+            if numbers['seconds'] > limit:
+                regressions.append((scale, f"{scale} {stage}: {numbers['seconds'] * 1000:.1f} ms "
+                                           f"> {limit * 1000:.1f} ms allowed"))
+            if numbers['peak_kb'] > base['peak_kb'] * (1 + tolerance) + 64:
+                regressions.append((scale, f"{scale} {stage}: peak {numbers['peak_kb']:.0f} KB "
+                                           f"> {base['peak_kb'] * (1 + tolerance):.0f} KB allowed"))
+    return regressions
+
+
+def confirm(results, baseline, tolerance, repeat, factor):
+    """
+    Regressions that survive a second measurement: scales that look slower are run again and
+    each stage keeps the faster of its two medians, so one noisy burst does not fail the gate.
+    The reference is timed again too, and the slower of the two speed factors applies: a
+    reference that happened to run fast must not tighten every limit.
+    """
+    suspects = sorted({scale for scale, _ in compare(results, baseline, tolerance, factor)})
+    if suspects:
+        print(f"Re-measuring {', '.join(suspects)}...")
+        rerun = run(suspects, repeat)
+        factor = max(factor, speed_factor(rerun, baseline))
+        print(f"Speed factor after re-measuring: {factor:.2f}")
+        for scale, stages in rerun.items():
+            for stage, numbers in stages.items():
+                if not stage.startswith("_") and stage in results[scale]:
+                    previous = results[scale][stage]
+                    results[scale][stage] = {'seconds': min(previous['seconds'], numbers['seconds']),
+                                             'peak_kb': min(previous['peak_kb'], numbers['peak_kb'])}
+    return [message for _, message in compare(results, baseline, tolerance, factor)]
+
+
+def print_table(results):
+    print(f"{'scale':<12} {'stage':<28} {'median ms':>10} {'peak KB':>10}")
+    for scale, stages in results.items():
+        for stage, numbers in stages.items():
+            if stage.startswith("_"):
+                continue
+            print(f"{scale:<12} {stage:<28} {numbers['seconds'] * 1000:>10.2f} {numbers['peak_kb']:>10.0f}")
+        if '_reference' in stages:
+            print(f"{scale:<12} {'(reference workload)':<28} {stages['_reference']['seconds'] * 1000:>10.2f}")
+        if '_sizes' not in stages:
+            continue
+        sizes = stages['_sizes']
+        print(f"{scale:<12} {'(history file / snapshot)':<28} "
+              f"{sizes['history_bytes'] / 1024:>9.0f}K {sizes['snapshot_json_bytes'] / 1024:>9.0f}K")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the portfolio report hot path")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma separated HOLDINGSxDAYS")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 = +50%%")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="also write the raw results to this file")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_SECONDS,
+                        help="max seconds to import the CLI")
+    args = parser.parse_args(argv)
+
+    results = run(args.scales.split(","), args.repeat)
+    results['startup'] = measure_startup(args.repeat)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        print("No baseline recorded yet (run with --update-baseline)")
+    factor = speed_factor(results, baseline)
+    print(f"Machine speed factor vs baseline: {factor:.2f}")
+    regressions = (check_startup(results['startup'], args.startup_budget, factor)
+                   + confirm(results, baseline, args.tolerance, args.repeat, factor))
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
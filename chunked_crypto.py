@@ -0,0 +1,187 @@
+import base64
+import json
+import os
+import struct
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Chunked authenticated-encryption container for large histories.
+#
+#   header: MAGIC (4) | version (1) | nonce prefix (7) | chunk size (4)
+#   chunk:  ciphertext length (4) | AES-256-GCM ciphertext
+#
+# Each chunk's nonce is prefix | chunk counter (4) | last-chunk flag (1) and the header is the
+# associated data, so chunks cannot be reordered, dropped, moved between files or truncated
+# without failing authentication (the STREAM construction). The plaintext is newline-delimited
+# JSON records, so a reader holds at most one chunk in memory and can stop at any record.
+MAGIC = b"PMSC"
+VERSION = 1
+HEADER = struct.Struct(">4sB7sI")
+LENGTH = struct.Struct(">I")
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class ChunkedFormatError(Exception):
+    pass
+
+
+def derive_key(fernet_key):
+    """AES-256 key for the container, derived from FERNET_KEY (never used directly)"""
+    if isinstance(fernet_key, str):
+        fernet_key = fernet_key.encode("utf-8")
+    master = base64.urlsafe_b64decode(fernet_key)
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"pms-chunked-v1").derive(master)
+
+
+def _nonce(prefix, counter, last):
+    return prefix + struct.pack(">IB", counter, 1 if last else 0)
+
+
+class ChunkedWriter:
+    """Buffers records and writes one encrypted chunk per `chunk_size` bytes of plaintext"""
+
+    def __init__(self, fh, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.fh = fh
+        self.aead = AESGCM(key)
+        self.chunk_size = chunk_size
+        self.prefix = os.urandom(7)
+        self.header = HEADER.pack(MAGIC, VERSION, self.prefix, chunk_size)
+        self.counter = 0
+        self.buffer = bytearray()
+        self.closed = False
+        fh.write(self.header)
+
+    def write_record(self, record):
+        self.buffer += json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        while len(self.buffer) > self.chunk_size:
+            self._emit(bytes(self.buffer[:self.chunk_size]), last=False)
+            del self.buffer[:self.chunk_size]
+
+    def _emit(self, plaintext, last):
+        ciphertext = self.aead.encrypt(_nonce(self.prefix, self.counter, last), plaintext, self.header)
+        self.fh.write(LENGTH.pack(len(ciphertext)) + ciphertext)
+        self.counter += 1
+
+    def close(self):
+        """Write the final chunk (possibly empty); required for the file to verify"""
+        if not self.closed:
+            self._emit(bytes(self.buffer), last=True)
+            self.buffer = bytearray()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def iter_chunks(fh, key):
+    """Decrypt and yield plaintext chunks one at a time, verifying order and completeness"""
+    header = fh.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ChunkedFormatError("File too short for a chunked container header")
+    magic, version, prefix, _ = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ChunkedFormatError("Not a chunked container (or unsupported version)")
+    aead = AESGCM(key)
+    counter = 0
+    while True:
+        raw_len = fh.read(LENGTH.size)
+        if len(raw_len) != LENGTH.size:
+            raise ChunkedFormatError("Container truncated before its final chunk")
+        ciphertext = fh.read(LENGTH.unpack(raw_len)[0])
+        try:
+            plaintext = aead.decrypt(_nonce(prefix, counter, False), ciphertext, header)
+            last = False
+        except Exception:
+            try:
+                plaintext = aead.decrypt(_nonce(prefix, counter, True), ciphertext, header)
+                last = True
+            except Exception:
+                raise ChunkedFormatError(f"Chunk {counter} failed authentication (wrong key or corrupted)")
+        yield plaintext
+        if last:
+            if fh.read(1):
+                raise ChunkedFormatError("Unexpected data after the final chunk")
+            return
+        counter += 1
+
+
+def iter_records(fh, key):
+    """Yield JSON records; stop iterating at any time to avoid decrypting the rest"""
+    pending = b""
+    for plaintext in iter_chunks(fh, key):
+        pending += plaintext
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line:
+                yield json.loads(line)
+    if pending:
+        yield json.loads(pending)
+
+
+# --- snapshot records -------------------------------------------------------------------------
+# A snapshot is written as one header record followed by one record per holding, so readers can
+# stream holdings without materializing whole payloads.
+
+def write_snapshot(writer, date, data):
+    profile = data['Profile']
+    holdings = profile.get('Holdings', [])
+    writer.write_record({
+        't': 'snapshot',
+        'date': date,
+        'profile': {k: v for k, v in profile.items() if k != 'Holdings'},
+        'extra': {k: v for k, v in data.items() if k != 'Profile'},
+        'holdings': len(holdings)
+    })
+    for h in holdings:
+        writer.write_record({'t': 'holding', 'date': date, 'h': h})
+
+
+def iter_holdings(records):
+    """(date, holding) pairs from a record stream"""
+    for record in records:
+        if record['t'] == 'holding':
+            yield record['date'], record['h']
+
+
+def iter_snapshots(records):
+    """(date, payload) pairs rebuilt from a record stream, one snapshot in memory at a time"""
+    current = None
+    remaining = 0
+    for record in records:
+        if record['t'] == 'snapshot':
+            current = {**record['extra'], 'Profile': dict(record['profile'], Holdings=[])}
+            remaining = record['holdings']
+            date = record['date']
+        elif record['t'] == 'holding' and current is not None:
+            current['Profile']['Holdings'].append(record['h'])
+            remaining -= 1
+        else:
+            continue
+        if remaining == 0:
+            yield date, current
+            current = None
+
+
+def write_archive(path, key, snapshots, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write (date, payload) pairs to a container at `path` (atomically); returns the snapshot count"""
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+        with ChunkedWriter(fh, key, chunk_size) as writer:
+            for date, data in snapshots:
+                write_snapshot(writer, date, data)
+                count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_archive(path, key):
+    """Lazily yield (date, payload) pairs from a container written by write_archive"""
+    with open(path, "rb") as fh:
+        yield from iter_snapshots(iter_records(fh, key))
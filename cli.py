@@ -0,0 +1,333 @@
+"""
+Command line interface with one subcommand per pipeline stage:
+
+    python cli.py fetch                  # log in, download the payload to pending_payload.enc
+    python cli.py analyze [--date D]     # diff the payload against the previous snapshot (JSON)
+    python cli.py render [--date D]      # print the Telegram report chunks
+    python cli.py send                   # render + send the pending payload, then save it
+    python cli.py history list|show|export
+    python cli.py replay [...]           # recompute stored days offline (see replay.py)
+    python cli.py serve [...]            # local read-only HTTP queries (see query_server.py)
+    python cli.py securities list|alias OLD NEW
+    python cli.py exposure [--by sector|category] [--start A] [--date B] [--accounts]
+    python cli.py run                    # the full fetch -> analyze -> send -> save pipeline
+
+analyze / render read the pending payload when there is one, else a stored day (--date, default
+the latest), and never fetch. Only `fetch`, `send` and `run` import selenium / telethon /
+requests, so the offline commands start without loading them.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+PENDING_PAYLOAD_FILE = "pending_payload.enc"
+
+
+def make_automation(env=None):
+    from portfolio_tracker import MyAlternatesAutomation, config_from_env
+
+    config = env or config_from_env()
+    automation = MyAlternatesAutomation(
+        username=config['user_name_cred'],
+        password=config['pwd_cred'],
+        login_url=config['login_url'],
+        session_api_url=config['session_api_url'],
+        investor_api_url=config['investor_api_url'],
+        login_backend=config['login_backend']
+    )
+    automation.on_unchanged = config['on_unchanged']
+    automation.extra_api_urls = config['extra_api_urls']
+    automation.risk_windows = config['risk_windows']
+    return automation
+
+
+def save_payload(automation, data, path):
+    """Encrypt a fetched payload (snapshot_format) to `path`"""
+    from snapshot_format import encode_snapshot
+
+    fernet = automation.make_fernet()
+    if not fernet:
+        raise SystemExit("FERNET_KEY is required to store the fetched payload")
+    with open(path + ".tmp", "wb") as f:
+        f.write(fernet.encrypt(encode_snapshot(data)))
+    os.replace(path + ".tmp", path)
+
+
+def load_payload(automation, path):
+    """Read a payload written by save_payload, or a plain JSON export (*.json)"""
+    from snapshot_format import decode_snapshot
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".json"):
+        return json.loads(raw.decode("utf-8"))
+    fernet = automation.make_fernet()
+    if not fernet:
+        raise SystemExit("FERNET_KEY is required to read " + path)
+    return decode_snapshot(fernet.decrypt(raw))
+
+
+def payload_path(args):
+    """--input, else the pending fetch unless a stored --date was asked for, else None"""
+    if args.input:
+        return args.input
+    if not args.date and os.path.exists(PENDING_PAYLOAD_FILE):
+        return PENDING_PAYLOAD_FILE
+    return None
+
+
+def progress_to_stderr():
+    """
+    Route the automation's progress messages ("Rebuilding ... from history...") to stderr, so
+    commands whose stdout is data (JSON, the report) can be piped.
+    """
+    return contextlib.redirect_stdout(sys.stderr)
+
+
+def resolve_report(automation, args):
+    """(analysis, history, data) for --input / the pending payload / a stored day"""
+    with progress_to_stderr():
+        return _resolve_report(automation, args)
+
+
+def _resolve_report(automation, args):
+    path = payload_path(args)
+    if path:
+        data = load_payload(automation, path)
+        analysis, history = automation.prepare_analysis(data)
+        return analysis, history, data
+    report = automation.prepare_stored_analysis(args.date)
+    if report is None:
+        raise SystemExit(f"No stored snapshot for {args.date or 'the latest day'}")
+    return report
+
+
+def cmd_fetch(args):
+    automation = make_automation()
+    with automation.metrics.span('fetch'):
+        results = automation.run_full_automation()
+    if not results or not results['investor_api']:
+        print("Fetch failed")
+        return 1
+    data = results['investor_api']
+    save_payload(automation, data, args.output)
+    state = "unchanged since the last snapshot" if automation.is_unchanged(data) else "new"
+    print(f"Payload saved to {args.output} ({state})")
+    return 0
+
+
+def cmd_analyze(args):
+    automation = make_automation()
+    analysis, _, _ = resolve_report(automation, args)
+    print(json.dumps(analysis, indent=2, ensure_ascii=False, default=str))
+    return 0
+
+
+def cmd_render(args):
+    automation = make_automation()
+    analysis, history, _ = resolve_report(automation, args)
+    if args.single:
+        print(automation.generate_telegram_message(analysis, history))
+        return 0
+    for i, msg in enumerate(automation.iter_telegram_messages(analysis, history, args.max_chars)):
+        if i:
+            print("\n" + "-" * 40 + "\n")
+        print(msg)
+    return 0
+
+
+def cmd_send(args):
+    from portfolio_tracker import config_from_env, record_delivery
+    from telegram_broadcast import TelegramBroadcaster
+
+    config = config_from_env()
+    automation = make_automation(config)
+    metrics = automation.metrics
+    from_pending = payload_path(args) is not None
+    analysis, history, data = resolve_report(automation, args)
+    unchanged = from_pending and automation.is_unchanged(data)
+    if unchanged and automation.on_unchanged == "silent":
+        print("Portfolio unchanged since last snapshot - nothing sent.")
+        return 0
+    if unchanged:
+        messages = automation.unchanged_notice(data)
+    else:
+        messages = automation.iter_telegram_messages(analysis, history, automation.message_max_chars)
+    broadcaster = TelegramBroadcaster(config['api_id'], config['api_hash'], config['session_string'])
+    with metrics.span('telegram'):
+        delivery = broadcaster.broadcast(config['recipients'], messages)
+    record_delivery(metrics, delivery)
+    # a re-sent stored day is already in the history; only a fresh payload is saved
+    if from_pending and not unchanged and not args.no_save:
+        with metrics.span('save'):
+            automation.save_current_data(data)
+        if not args.input:
+            os.remove(PENDING_PAYLOAD_FILE)
+    return 0 if all(r['ok'] for r in delivery) else 1
+
+
+def cmd_history(args):
+    automation = make_automation()
+    store = automation.get_history_store()
+    if not store:
+        raise SystemExit("FERNET_KEY is required to read the history")
+    if args.action == "list":
+        for entry in store.daily_entries():
+            print(f"{entry['date']}  {entry['timestamp']}  {entry['length']:>9} B  "
+                  f"{(entry.get('fingerprint') or '')[:12]}")
+    elif args.action == "show":
+        for day, data in store.iter_range(args.start, args.end, newest_first=True):
+            networth = data['Profile']['Networth']
+            print(f"{day}  ₹{networth['CurrentNetworth']:,.2f}  "
+                  f"{len(data['Profile'].get('Holdings', []))} holdings")
+    elif args.action == "export":
+        automation.export_history_archive(args.path, args.start, args.end)
+    return 0
+
+
+def cmd_securities(args):
+    master = make_automation().get_security_master()
+    if not master:
+        raise SystemExit("FERNET_KEY is required to read the security master")
+    if args.action == "list":
+        names = {}
+        for variant in master.variants:
+            if variant[1]:
+                names.setdefault(variant[0], set()).add(variant[1])
+        for isin in master.securities:
+            canonical = master.canonical_isin(isin)
+            alias = f"  -> {canonical}" if canonical != isin else ""
+            print(f"{isin}  {' / '.join(sorted(names.get(isin, ())))}{alias}")
+        stats = master.stats()
+        print(f"{stats['securities']} ISINs, {stats['variants']} variants, {stats['aliases']} aliases")
+    elif args.action == "alias":
+        if len(args.isins) != 2:
+            raise SystemExit("usage: cli.py securities alias OLD_ISIN NEW_ISIN")
+        master.add_alias(*args.isins)
+        master.save()
+        print(f"{args.isins[0]} is now tracked as {master.canonical_isin(args.isins[0])}")
+    return 0
+
+
+def cmd_exposure(args):
+    from exposure import ExposureEngine, combined_exposure
+    from snapshot_matrix import SnapshotMatrix
+
+    if args.accounts:
+        from batch import load_accounts, make_automation as make_account_automation
+
+        automations = [make_account_automation(a)
+                       for a in load_accounts(os.environ.get('PMS_ACCOUNTS', 'accounts.json'))]
+    else:
+        automations = [make_automation()]
+    matrices = []
+    with progress_to_stderr():
+        for automation in automations:
+            store = automation.get_history_store()
+            if not store:
+                raise SystemExit("FERNET_KEY is required to read the history")
+            matrix = SnapshotMatrix.from_store(store, args.start, args.date, security_type=None)
+            if matrix.dates:
+                matrices.append(matrix)
+    if not matrices:
+        raise SystemExit("No stored snapshots in that range")
+
+    if args.accounts:
+        groups, dates, exposure = combined_exposure(matrices, args.by)
+        result = {'by': args.by, 'date': dates[-1], 'accounts': len(matrices),
+                  'exposure': sorted(({'group': g, 'weight': float(exposure[i, -1])}
+                                      for i, g in enumerate(groups) if exposure[i, -1] > 0),
+                                     key=lambda row: -row['weight'])}
+    else:
+        engine = ExposureEngine(matrices[0], args.by)
+        start, end = matrices[0].dates[0], matrices[0].dates[-1]
+        result = {'by': args.by, 'start': start, 'date': end, 'exposure': engine.exposure(end),
+                  'drift': engine.drift(start, end), 'attribution': engine.attribution(start, end)}
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+def cmd_replay(args):
+    import replay
+
+    return replay.main(args.args)
+
+
+def cmd_serve(args):
+    import query_server
+
+    return query_server.main(args.args)
+
+
+def cmd_run(args):
+    from portfolio_tracker import main, config_from_env
+
+    main(**config_from_env())
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ABAKKUS PMS portfolio tracker")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fetch = sub.add_parser("fetch", help="log in and download the current payload")
+    fetch.add_argument("--output", default=PENDING_PAYLOAD_FILE)
+    fetch.set_defaults(func=cmd_fetch)
+
+    for name, func, help_text in (("analyze", cmd_analyze, "print the change analysis as JSON"),
+                                  ("render", cmd_render, "print the Telegram report"),
+                                  ("send", cmd_send, "send the report to Telegram")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--input", help="payload file (default: pending fetch, else the history)")
+        p.add_argument("--date", help="use the stored snapshot of this day (YYYY-MM-DD)")
+        p.set_defaults(func=func)
+        if name == "render":
+            p.add_argument("--max-chars", type=int, default=4096)
+            p.add_argument("--single", action="store_true", help="one unsplit message")
+        if name == "send":
+            p.add_argument("--no-save", action="store_true", help="do not append the payload to the history")
+
+    history = sub.add_parser("history", help="inspect or export the stored snapshots")
+    history.add_argument("action", choices=("list", "show", "export"))
+    history.add_argument("path", nargs="?", default="portfolio_history.pmsc", help="export target")
+    history.add_argument("--start")
+    history.add_argument("--end")
+    history.set_defaults(func=cmd_history)
+
+    securities = sub.add_parser("securities", help="list the security master or alias a changed ISIN")
+    securities.add_argument("action", choices=("list", "alias"))
+    securities.add_argument("isins", nargs="*", help="OLD_ISIN NEW_ISIN for alias")
+    securities.set_defaults(func=cmd_securities)
+
+    exposure = sub.add_parser("exposure", help="sector / category exposure, drift and attribution (JSON)")
+    exposure.add_argument("--by", choices=("sector", "category"), default="sector")
+    exposure.add_argument("--start", help="first day of the drift / attribution range (default: first stored)")
+    exposure.add_argument("--date", help="exposure on this day (default: the latest)")
+    exposure.add_argument("--accounts", action="store_true", help="combined over every PMS_ACCOUNTS entry")
+    exposure.set_defaults(func=cmd_exposure)
+
+    replay = sub.add_parser("replay", help="recompute reports for stored days (replay.py options)")
+    replay.set_defaults(func=cmd_replay)
+
+    serve = sub.add_parser("serve", help="local read-only query server (query_server.py options)")
+    serve.set_defaults(func=cmd_serve)
+
+    run = sub.add_parser("run", help="full pipeline (same as python portfolio_tracker.py)")
+    run.set_defaults(func=cmd_run)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # replay's and serve's own options are parsed by their modules
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ("replay", "serve"):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.args = extra
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
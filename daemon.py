@@ -0,0 +1,325 @@
+"""
+Service mode: stay running, keep browsers warm and run the pipeline on a schedule.
+
+    DAEMON_TIMES=09:00,15:45 DAEMON_POLL_MINUTES=30 python daemon.py
+    PMS_ACCOUNTS=accounts.json python daemon.py     # every account, one shared browser pool
+
+Scheduled runs happen at DAEMON_TIMES on DAEMON_DAYS (default Mon-Fri) in DAEMON_TZ (default
+Asia/Kolkata). With DAEMON_POLL_MINUTES > 0 the portfolio is also polled during market hours
+(MARKET_OPEN-MARKET_CLOSE); a poll saves any change but only sends a report once the networth moved
+DAEMON_POLL_MIN_MOVE_PCT (default 1) percent since the last report. Chrome instances
+are kept in a DriverPool (DRIVER_POOL_SIZE) and recycled after DRIVER_MAX_USES logins or when
+their process tree exceeds DRIVER_MAX_RSS_MB; between runs a browser's cookies and the site's
+web storage (where the accessToken lives) are cleared. Each account keeps its history index,
+recent snapshots, rollups and risk series in memory between runs; all of them are re-read when
+another process appended to the history. SIGTERM / SIGINT stop the loop after the current run.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from metrics import RunMetrics
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and all its descendants (Linux /proc), or None if unknown"""
+    try:
+        children = {}
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat", "r") as f:
+                    # the command name may contain spaces; fields after the closing paren are fixed
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(name))
+        total_kb = 0
+        stack = [pid]
+        while stack:
+            current = stack.pop()
+            try:
+                with open(f"/proc/{current}/status", "r") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+                            break
+            except OSError:
+                pass
+            stack.extend(children.get(current, ()))
+        return total_kb / 1024
+    except OSError:
+        return None
+
+
+class DriverPool:
+    """
+    Up to `size` warm WebDriver instances shared by the runs. acquire() lends an idle driver (or
+    starts one), release() clears the session it held (cookies, local / session storage) and keeps
+    it on a blank page unless it has
+    served `max_uses` logins, exceeds `max_rss_mb` or no longer responds.
+    """
+
+    def __init__(self, factory, size=2, max_uses=20, max_rss_mb=1024):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.idle = []
+        self.uses = {}
+        self.created = 0
+        self.recycled = 0
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+
+    def warm(self, n=None):
+        """Start drivers ahead of the first run"""
+        for _ in range(min(n or self.size, self.size)):
+            self._slots.acquire()
+            try:
+                driver = self._create()
+            finally:
+                self._slots.release()
+            with self._lock:
+                self.idle.append(driver)
+
+    def _create(self):
+        driver = self.factory()
+        with self._lock:
+            self.uses[id(driver)] = 0
+            self.created += 1
+        return driver
+
+    def acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            driver = self.idle.pop() if self.idle else None
+        if driver is None:
+            try:
+                driver = self._create()
+            except BaseException:
+                self._slots.release()
+                raise
+        return driver
+
+    def release(self, driver):
+        try:
+            with self._lock:
+                self.uses[id(driver)] = self.uses.get(id(driver), 0) + 1
+                uses = self.uses[id(driver)]
+            reason = None
+            if uses >= self.max_uses:
+                reason = f"{uses} uses"
+            else:
+                rss = self._rss_mb(driver)
+                if rss is not None and rss > self.max_rss_mb:
+                    reason = f"{rss:.0f} MB resident"
+            if reason is None:
+                try:
+                    self.clear_session(driver)
+                except Exception:
+                    reason = "unresponsive"
+            if reason:
+                print(f"Recycling browser ({reason})")
+                self._discard(driver)
+            else:
+                with self._lock:
+                    self.idle.append(driver)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def clear_session(driver):
+        """
+        Forget the previous account's login before the driver is lent again. Web storage is per
+        origin, so it is cleared while the driver is still on the site's page.
+        """
+        origin = driver.execute_script("return window.location.origin")
+        if origin and origin != "null":
+            if hasattr(driver, 'execute_cdp_cmd'):
+                # Chrome: also drops IndexedDB, cache storage and service workers of the origin
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {'origin': origin, 'storageTypes': "all"})
+            else:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    @staticmethod
+    def _rss_mb(driver):
+        service = getattr(driver, 'service', None)
+        process = getattr(service, 'process', None)
+        return process_tree_rss_mb(process.pid) if process else None
+
+    def _discard(self, driver):
+        with self._lock:
+            self.uses.pop(id(driver), None)
+            self.recycled += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            idle, self.idle = self.idle, []
+        for driver in idle:
+            self._discard(driver)
+
+
+def parse_times(value):
+    return sorted(tuple(int(x) for x in t.strip().split(":")) for t in value.split(",") if t.strip())
+
+
+class Schedule:
+    """Fixed daily run times plus optional polling every `poll_minutes` during market hours"""
+
+    def __init__(self, times=((9, 0),), days=(0, 1, 2, 3, 4), poll_minutes=0, market_open=(9, 15),
+                 market_close=(15, 30), tz="Asia/Kolkata"):
+        self.times = list(times)
+        self.days = set(days)
+        self.poll_minutes = poll_minutes
+        self.market_open = market_open
+        self.market_close = market_close
+        self.tz = ZoneInfo(tz)
+
+    def next_run(self, now=None):
+        """(datetime, 'scheduled' | 'poll') of the next run strictly after `now`"""
+        now = (now or datetime.now(self.tz)).astimezone(self.tz)
+        candidates = []
+        for offset in range(8):
+            day = (now + timedelta(days=offset)).date()
+            if day.weekday() not in self.days:
+                continue
+            for h, m in self.times:
+                candidates.append((datetime(day.year, day.month, day.day, h, m, tzinfo=self.tz), 'scheduled'))
+            if self.poll_minutes > 0:
+                at = datetime(day.year, day.month, day.day, *self.market_open, tzinfo=self.tz)
+                close = datetime(day.year, day.month, day.day, *self.market_close, tzinfo=self.tz)
+                while at <= close:
+                    candidates.append((at, 'poll'))
+                    at += timedelta(minutes=self.poll_minutes)
+            upcoming = [c for c in candidates if c[0] > now]
+            if upcoming:
+                # a scheduled run wins over a poll at the same minute
+                return min(upcoming, key=lambda c: (c[0], c[1] != 'scheduled'))
+        return None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            times=parse_times(os.environ.get('DAEMON_TIMES', '09:00')),
+            days=[int(d) for d in os.environ.get('DAEMON_DAYS', '0,1,2,3,4').split(',') if d.strip()],
+            poll_minutes=int(os.environ.get('DAEMON_POLL_MINUTES', 0)),
+            market_open=parse_times(os.environ.get('MARKET_OPEN', '09:15'))[0],
+            market_close=parse_times(os.environ.get('MARKET_CLOSE', '15:30'))[0],
+            tz=os.environ.get('DAEMON_TZ', 'Asia/Kolkata')
+        )
+
+
+class Daemon:
+    """Runs every account's pipeline at each scheduled time, reusing automations and browsers"""
+
+    def __init__(self, automations, broadcaster, recipients, schedule, pool, workers=1, poll_min_move_pct=1.0):
+        self.automations = automations
+        self.broadcaster = broadcaster
+        self.recipients = recipients
+        self.schedule = schedule
+        self.pool = pool
+        self.workers = workers
+        self.poll_min_move_pct = poll_min_move_pct
+        self.stop = threading.Event()
+        for automation, _ in automations:
+            automation.driver_pool = pool
+            automation.history_cache_size = automation.history_cache_size or 32
+
+    def run_account(self, automation, recipients, kind):
+        from portfolio_tracker import run_once
+
+        labels = dict(automation.metrics.labels)
+        automation.metrics = RunMetrics(labels=dict(labels, trigger=kind))
+        configured = automation.on_unchanged
+        if kind == 'poll':
+            # intraday polls stay quiet unless the portfolio moved noticeably
+            automation.on_unchanged = "silent"
+            automation.notify_min_move_pct = self.poll_min_move_pct
+        try:
+            slug = labels.get('account')
+            return run_once(automation, self.broadcaster, recipients,
+                            metrics_name=f"portfolio_tracker_{slug}" if slug else "portfolio_tracker")
+        except Exception as e:
+            print(f"[{automation.account_name or 'default'}] run failed: {e}")
+            return 'error'
+        finally:
+            automation.on_unchanged = configured
+            automation.notify_min_move_pct = 0
+            automation.metrics.labels = labels
+
+    def run_all(self, kind):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            outcomes = list(executor.map(
+                lambda pair: self.run_account(pair[0], pair[1] or self.recipients, kind), self.automations))
+        print(f"{kind} run finished in {time.monotonic() - started:.1f}s: {outcomes} "
+              f"(browsers started {self.pool.created}, recycled {self.pool.recycled})")
+        return outcomes
+
+    def serve(self):
+        while not self.stop.is_set():
+            nxt = self.schedule.next_run()
+            if nxt is None:
+                print("Nothing scheduled - exiting.")
+                return
+            at, kind = nxt
+            print(f"Next {kind} run at {at.isoformat(timespec='minutes')}")
+            if self.stop.wait(max(0.0, (at - datetime.now(at.tzinfo)).total_seconds())):
+                break
+            self.run_all(kind)
+        print("Daemon stopped.")
+
+
+def build_automations():
+    """[(automation, recipients or None)] from PMS_ACCOUNTS, else the single-account environment"""
+    if os.environ.get('PMS_ACCOUNTS'):
+        from batch import load_accounts, make_automation
+
+        return [(make_automation(a), a.get('recipients')) for a in load_accounts(os.environ['PMS_ACCOUNTS'])]
+    from cli import make_automation
+
+    return [(make_automation(), None)]
+
+
+def main():
+    from portfolio_tracker import config_from_env, create_chrome_driver
+    from telegram_broadcast import TelegramBroadcaster
+
+    config = config_from_env()
+    pool = DriverPool(create_chrome_driver,
+                      size=int(os.environ.get('DRIVER_POOL_SIZE', 2)),
+                      max_uses=int(os.environ.get('DRIVER_MAX_USES', 20)),
+                      max_rss_mb=float(os.environ.get('DRIVER_MAX_RSS_MB', 1024)))
+    automations = build_automations()
+    daemon = Daemon(automations, TelegramBroadcaster(config['api_id'], config['api_hash'], config['session_string']),
+                    config['recipients'], Schedule.from_env(), pool,
+                    workers=int(os.environ.get('DAEMON_WORKERS', 1)),
+                    poll_min_move_pct=float(os.environ.get('DAEMON_POLL_MIN_MOVE_PCT', 1)))
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: daemon.stop.set())
+    if any(a.login_backend != "http" for a, _ in automations):
+        pool.warm(1)
+    try:
+        if os.environ.get('DAEMON_RUN_NOW') == '1':
+            daemon.run_all('scheduled')
+        daemon.serve()
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+End-to-end latency harness: runs the daily pipeline (portfolio_tracker.run_once: fetch, analyze,
+render, send, save) against the local stand-in (standin_server.py) and reports per-stage latency,
+without network access.
+
+    python e2e_bench.py                                   # http and http-warm, 5 runs each
+    python e2e_bench.py --strategies http,selenium --runs 3
+    python e2e_bench.py --faults 'investor:delay=0.2,error_rate=0.2' --budget total=2000
+    python e2e_bench.py --json e2e.json
+
+Every run is a fresh MyAlternatesAutomation (like one cron invocation) in a scratch directory
+whose history is seeded with synthetic days, so the analysis compares against a real previous
+snapshot and trend. The report goes to a few recipients through a TelegramBroadcaster whose
+client accepts every message in memory, so the send and the save overlap as in a real run.
+Stage times come from the run metrics (the pipeline stages fetch, analysis_inputs,
+telegram_connect, prepare, telegram, save and the spans inside them: session_cache, http_login,
+browser_login, session_api, investor_api, decrypt, history, analysis, ...) plus `total` wall
+time; the report is rendered while it is sent, so rendering is part of `telegram`. The report
+shows median / p95 / max per strategy.
+
+Strategies:
+    http            browserless login every run
+    http-warm       cookies and accessToken reused from the session cache, conditional API cache on
+    selenium        Chrome login every run (needs Chrome and chromedriver)
+    selenium-warm   Chrome once, then the session cache
+    auto            HTTP login with the Selenium fallback
+
+Exits with status 1 when a run fails or a stage's median exceeds its --budget (milliseconds).
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from cryptography.fernet import Fernet
+
+from standin_server import StandinServer, StandinState, parse_faults
+from synthetic_data import generate_history
+
+# name -> (login_backend, reuse sessions / conditional API cache across runs)
+STRATEGIES = {
+    'http': ("http", False),
+    'http-warm': ("http", True),
+    'selenium': ("selenium", False),
+    'selenium-warm': ("selenium", True),
+    'auto': ("auto", False)
+}
+DEFAULT_STRATEGIES = "http,http-warm"
+# stages in pipeline order, for the report; anything else recorded is listed after them
+STAGE_ORDER = ("session_cache", "http_login", "browser_startup", "browser_login", "session_api", "investor_api",
+               "browser_quit", "fetch", "decrypt", "history", "analysis_inputs", "telegram_connect", "analysis",
+               "prepare", "render", "telegram", "save", "total")
+# recipients of the in-memory Telegram client
+RECIPIENTS = [1, 2, 3]
+
+
+class NullTelegramClient:
+    """Stands in for the Telethon client: every message is accepted without a network round trip"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def send_message(self, recipient, msg):
+        self.sent += 1
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def parse_budgets(value):
+    """{stage: seconds} from 'total=1500,investor_api=300' (milliseconds)"""
+    budgets = {}
+    for item in (value or "").split(","):
+        if item.strip():
+            stage, _, ms = item.partition("=")
+            budgets[stage.strip()] = float(ms) / 1000
+    return budgets
+
+
+def make_automation(server, backend, warm):
+    from portfolio_tracker import MyAlternatesAutomation
+
+    state = server.state
+    automation = MyAlternatesAutomation(state.username, state.password, headless=True,
+                                        session_cache_file="session_cache.enc" if warm else None,
+                                        login_backend=backend, **server.urls())
+    if not warm:
+        automation.api_cache_file = None
+    return automation
+
+
+def run_once(server, backend, warm):
+    """One pipeline run (portfolio_tracker.run_once); returns (stage seconds, counters, ok)"""
+    from portfolio_tracker import run_once as run_pipeline
+    from telegram_broadcast import TelegramBroadcaster
+
+    automation = make_automation(server, backend, warm)
+    metrics = automation.metrics
+    client = NullTelegramClient()
+    broadcaster = TelegramBroadcaster(0, "", "", client_factory=lambda: client)
+    started = time.perf_counter()
+    try:
+        outcome = run_pipeline(automation, broadcaster, RECIPIENTS, metrics_name="e2e_bench")
+    except Exception as e:
+        print(f"Run failed: {e}")
+        outcome = 'error'
+    metrics.add_duration('total', time.perf_counter() - started)
+    ok = outcome == 'success' and client.sent > 0
+    return {k: v['seconds'] for k, v in metrics.stages.items()}, dict(metrics.counters), ok
+
+
+def seed_history(days):
+    from portfolio_tracker import MyAlternatesAutomation
+
+    automation = MyAlternatesAutomation('seed', 'seed', 'http://127.0.0.1/login', '', '')
+    store = automation.get_history_store()
+    for day, payload in days:
+        store.append(payload, datetime.fromisoformat(day))
+    automation.get_rollups(store).save()
+
+
+def run_strategy(name, args, faults):
+    """Stand-in + scratch directory for one strategy; returns its result record"""
+    backend, warm = STRATEGIES[name]
+    history = generate_history(holdings=args.holdings, days=args.history_days + args.runs, seed=args.seed)
+    stored, served = history[:args.history_days], [p for _, p in history[args.history_days:]]
+    cwd = os.getcwd()
+    metrics_dir = os.environ.get('METRICS_DIR')
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        # run records stay in the scratch directory
+        os.environ['METRICS_DIR'] = os.path.join(tmp, "metrics")
+        state = StandinState(payloads=served, faults=faults, seed=args.seed)
+        server = StandinServer(state, port=0).start()
+        try:
+            # the automation prints progress; keep the report readable
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                seed_history(stored)
+                for _ in range(args.runs):
+                    stages, counters, ok = run_once(server, backend, warm)
+                    runs.append({'stages': stages, 'counters': counters, 'ok': ok})
+        finally:
+            server.stop()
+            os.chdir(cwd)
+            if metrics_dir is None:
+                os.environ.pop('METRICS_DIR', None)
+            else:
+                os.environ['METRICS_DIR'] = metrics_dir
+    return {'strategy': name, 'backend': backend, 'warm': warm, 'runs': runs, 'server': state.stats()}
+
+
+def summarize(record):
+    """{stage: {'median', 'p95', 'max', 'runs'}} in seconds over the successful runs"""
+    per_stage = {}
+    for run in record['runs']:
+        if run['ok']:
+            for stage, seconds in run['stages'].items():
+                per_stage.setdefault(stage, []).append(seconds)
+    order = {s: i for i, s in enumerate(STAGE_ORDER)}
+    return {
+        stage: {'median': percentile(values, 50), 'p95': percentile(values, 95), 'max': max(values),
+                'runs': len(values)}
+        for stage, values in sorted(per_stage.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+    }
+
+
+def print_report(records):
+    print(f"{'strategy':<14} {'stage':<16} {'median ms':>10} {'p95 ms':>10} {'max ms':>10} {'runs':>5}")
+    for record in records:
+        for stage, numbers in record['summary'].items():
+            print(f"{record['strategy']:<14} {stage:<16} {numbers['median'] * 1000:>10.1f} "
+                  f"{numbers['p95'] * 1000:>10.1f} {numbers['max'] * 1000:>10.1f} {numbers['runs']:>5}")
+        failed = sum(1 for run in record['runs'] if not run['ok'])
+        counters = {}
+        for run in record['runs']:
+            for k, v in run['counters'].items():
+                counters[k] = counters.get(k, 0) + v
+        injected = sum(v['failed'] for v in record['server']['injected'].values())
+        extras = ", ".join(f"{k}={v}" for k, v in sorted(counters.items()))
+        print(f"{record['strategy']:<14} {'(runs)':<16} {len(record['runs']) - failed} ok, {failed} failed; "
+              f"{injected} injected errors{'; ' + extras if extras else ''}")
+
+
+def check(records, budgets):
+    problems = []
+    for record in records:
+        failed = sum(1 for run in record['runs'] if not run['ok'])
+        if failed:
+            problems.append(f"{record['strategy']}: {failed} of {len(record['runs'])} runs failed")
+        for stage, limit in budgets.items():
+            numbers = record['summary'].get(stage)
+            if numbers and numbers['median'] > limit:
+                problems.append(f"{record['strategy']} {stage}: median {numbers['median'] * 1000:.1f} ms "
+                                f"> {limit * 1000:.0f} ms budget")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end fetch/analyze/render latency against a local stand-in")
+    parser.add_argument("--strategies", default=DEFAULT_STRATEGIES,
+                        help=f"comma separated, from {', '.join(STRATEGIES)}")
+    parser.add_argument("--runs", type=int, default=5, help="runs per strategy")
+    parser.add_argument("--holdings", type=int, default=200)
+    parser.add_argument("--history-days", type=int, default=30, help="synthetic days stored before the first run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--faults", default="", help="stand-in faults, see standin_server.py")
+    parser.add_argument("--budget", default="", help="median limits in ms, e.g. 'total=1500,investor_api=300'")
+    parser.add_argument("--json", help="also write the raw results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the automation's output")
+    args = parser.parse_args(argv)
+
+    strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategy: {', '.join(unknown)}")
+    try:
+        faults = parse_faults(args.faults)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.runs < 1:
+        parser.error("--runs must be at least 1")
+    os.environ.setdefault('FERNET_KEY', Fernet.generate_key().decode())
+
+    records = []
+    for name in strategies:
+        record = run_strategy(name, args, faults)
+        record['summary'] = summarize(record)
+        records.append(record)
+    print_report(records)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
+
+    problems = check(records, parse_budgets(args.budget))
+    for p in problems:
+        print(f"REGRESSION {p}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
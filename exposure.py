@@ -0,0 +1,120 @@
+import numpy as np
+
+# group of holdings without a sector / category
+UNKNOWN_GROUP = "Unknown"
+
+
+def group_matrix(labels):
+    """
+    One-hot (groups x securities) matrix for a label array. Multiplying it with an
+    (securities x dates) array sums every group for every date in a single matmul. Missing or
+    empty labels are grouped as UNKNOWN_GROUP.
+    """
+    labels = [str(label) if label else UNKNOWN_GROUP for label in labels]
+    names, codes = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    onehot = np.zeros((len(names), len(codes)))
+    onehot[codes, np.arange(len(codes))] = 1.0
+    return names.tolist(), onehot
+
+
+class ExposureEngine:
+    """
+    Sector / category exposure, drift and return attribution over a SnapshotMatrix.
+    `by` is any metadata column of the matrix ('sector' or 'category').
+    """
+
+    def __init__(self, matrix, by='sector'):
+        self.matrix = matrix
+        self.by = by
+        self.groups, self.onehot = group_matrix(matrix.meta[by])
+        self._cache = {}
+
+    def _grouped(self, name, values):
+        if name not in self._cache:
+            self._cache[name] = self.onehot @ np.nan_to_num(values)
+        return self._cache[name]
+
+    def weight(self):
+        """Summed PortfolioWeightage per group (groups x dates)"""
+        return self._grouped('weight', self.matrix.weight)
+
+    def value(self):
+        """Summed PortfolioValue per group (groups x dates)"""
+        return self._grouped('value', self.matrix.value)
+
+    def contribution(self):
+        """
+        Contribution of each group to the portfolio's day-over-day return, in % of the previous
+        day's networth (groups x dates, first column 0). Summing a row over a range gives the
+        group's arithmetic attribution for that range.
+        """
+        if 'contribution' not in self._cache:
+            value = self.matrix.value
+            change = np.zeros(value.shape)
+            if value.shape[1] > 1:
+                # a holding contributes only on days it was held on both ends
+                both = ~np.isnan(value[:, 1:]) & ~np.isnan(value[:, :-1])
+                change[:, 1:] = np.where(both, value[:, 1:] - value[:, :-1], 0.0)
+            networth_prev = np.concatenate(([np.nan], self.matrix.networth[:-1]))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                contribution = (self.onehot @ change) / networth_prev * 100
+            contribution[:, 0] = 0.0
+            self._cache['contribution'] = contribution
+        return self._cache['contribution']
+
+    def exposure(self, date=-1):
+        """[{group, weight, value, holdings}] on one date, largest first"""
+        t = self.matrix.column(date)
+        held = (~np.isnan(self.matrix.value[:, t])).astype(float)
+        counts = self.onehot @ held
+        weight = self.weight()[:, t]
+        value = self.value()[:, t]
+        order = np.argsort(-weight, kind='stable')
+        return [
+            {'group': self.groups[g], 'weight': float(weight[g]), 'value': float(value[g]),
+             'holdings': int(counts[g])}
+            for g in order if counts[g] > 0
+        ]
+
+    def drift(self, start, end):
+        """[{group, start_weight, end_weight, change}] between two dates, largest move first"""
+        t0, t1 = self.matrix.column(start), self.matrix.column(end)
+        weight = self.weight()
+        change = weight[:, t1] - weight[:, t0]
+        order = np.argsort(-np.abs(change), kind='stable')
+        return [
+            {'group': self.groups[g], 'start_weight': float(weight[g, t0]),
+             'end_weight': float(weight[g, t1]), 'change': float(change[g])}
+            for g in order
+        ]
+
+    def attribution(self, start=0, end=-1):
+        """[{group, contribution_pct}] summed over (start, end], largest first"""
+        t0, t1 = self.matrix.column(start), self.matrix.column(end)
+        total = self.contribution()[:, t0 + 1:t1 + 1].sum(axis=1)
+        order = np.argsort(-total, kind='stable')
+        return [{'group': self.groups[g], 'contribution_pct': float(total[g])} for g in order]
+
+
+def combined_exposure(matrices, by='sector'):
+    """
+    Value-weighted exposure across several accounts, aligned on the union of their dates.
+    Returns (groups, dates, exposure_pct) with exposure_pct shaped groups x dates.
+    """
+    dates = sorted(set().union(*(m.dates for m in matrices)))
+    date_pos = {d: t for t, d in enumerate(dates)}
+    groups = sorted(set().union(*(group_matrix(m.meta[by])[0] for m in matrices)))
+    group_pos = {g: i for i, g in enumerate(groups)}
+
+    value = np.zeros((len(groups), len(dates)))
+    networth = np.zeros(len(dates))
+    for m in matrices:
+        engine = ExposureEngine(m, by)
+        rows = np.array([group_pos[g] for g in engine.groups], dtype=np.intp)
+        cols = np.array([date_pos[d] for d in m.dates], dtype=np.intp)
+        value[np.ix_(rows, cols)] += engine.value()
+        networth[cols] += np.nan_to_num(m.networth)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exposure = np.where(networth > 0, value / networth * 100, np.nan)
+    return groups, dates, exposure
@@ -0,0 +1,226 @@
+import base64
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from cryptography.fernet import InvalidToken
+
+from chunked_crypto import write_archive
+from snapshot_format import encode_snapshot, decode_snapshot
+
+
+def content_fingerprint(data, key=b"", ignore_keys=()):
+    """
+    HMAC-SHA256 over a canonical JSON encoding of the payload (sorted keys, no whitespace), so
+    identical content always gives the same value regardless of key order or Fernet's random IV.
+    Keyed with FERNET_KEY so the stored fingerprint reveals nothing about the holdings.
+    Keys listed in ignore_keys are dropped at any depth (e.g. server timestamps).
+    """
+    if ignore_keys:
+        data = _without_keys(data, set(ignore_keys))
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hmac.new(key or b"", canonical, hashlib.sha256).hexdigest()
+
+
+def _without_keys(value, ignore):
+    if isinstance(value, dict):
+        return {k: _without_keys(v, ignore) for k, v in value.items() if k not in ignore}
+    if isinstance(value, list):
+        return [_without_keys(v, ignore) for v in value]
+    return value
+
+
+class HistoryStore:
+    """
+    Append-only encrypted snapshot history.
+
+    `portfolio_history.enc` is a sequence of independently encrypted segments, one Fernet token
+    per snapshot. `portfolio_history.idx` is a small JSON index of
+    {date, timestamp, offset, length, fingerprint, encoding} per segment, so reading one day only
+    decrypts that segment and saving a day appends bytes instead of rewriting the whole file.
+
+    Segments hold a snapshot_format plaintext and are stored as the raw token bytes
+    (encoding "raw") rather than Fernet's base64 text; older base64, newline-terminated
+    segments without an encoding field are still read.
+
+    With a SecurityMaster, new segments store holdings as rows referencing the master's interned
+    metadata (snapshot codec 2) and the master is saved before the segment is written.
+    """
+
+    def __init__(self, fernet, path="portfolio_history.enc", index_path=None, fingerprint_key=b"",
+                 fingerprint_ignore=(), cache_size=0, master=None):
+        self.fernet = fernet
+        self.master = master
+        self.fingerprint_key = fingerprint_key
+        self.fingerprint_ignore = fingerprint_ignore
+        self.path = path
+        self.index_path = index_path or os.path.splitext(path)[0] + ".idx"
+        self._entries = None
+        # (mtime, size) of the index when _entries was read or written
+        self._index_stat = None
+        # bumped whenever the index is re-read after a change made elsewhere; state derived from
+        # the history (rollups, risk series) is stale once it moves
+        self.generation = 0
+        # decoded snapshots by segment offset (LRU, 0 disables); treat returned data as read-only
+        self.cache_size = cache_size
+        self._decoded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """
+        Index entries in append order (oldest first). The index is re-read when it changed on disk
+        since it was last read or written, so a long-lived store sees appends by other processes.
+        """
+        if self._entries is not None and self._stat_index() != self._index_stat:
+            self._entries = None
+            self.generation += 1
+        if self._entries is None:
+            self._entries = []
+            self._index_stat = self._stat_index()
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, "r", encoding="utf-8") as f:
+                        self._entries = json.load(f)['segments']
+                except Exception as e:
+                    print(f"Error reading history index {self.index_path}: {e}")
+        return self._entries
+
+    def _stat_index(self):
+        try:
+            st = os.stat(self.index_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self):
+        """Re-read the index on next access (another process may have appended); decoded segments stay cached"""
+        self._entries = None
+        self.generation += 1
+
+    def dates(self):
+        return [e['date'] for e in self.entries()]
+
+    def _write_index(self):
+        tmp_path = self.index_path + ".tmp"
+        # one segment per line keeps the daily git diff of the index to a couple of lines
+        lines = ",\n".join(json.dumps(e, separators=(",", ":")) for e in self._entries)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write('{"version":1,"segments":[\n' + lines + '\n]}\n')
+        os.replace(tmp_path, self.index_path)
+        self._index_stat = self._stat_index()
+
+    def encode(self, data):
+        return encode_snapshot(data, master=self.master)
+
+    def decode(self, plaintext):
+        return decode_snapshot(plaintext, master=self.master)
+
+    def fingerprint(self, data):
+        return content_fingerprint(data, self.fingerprint_key, self.fingerprint_ignore)
+
+    def latest_fingerprint(self):
+        entries = self.entries()
+        return entries[-1].get('fingerprint') if entries else None
+
+    def append(self, data, when=None):
+        """Encrypt data as a new segment and record it in the index. Returns the index entry."""
+        when = when or datetime.now()
+        # with a master, its file lock also serializes appends by other processes: variant ids
+        # are handed out, saved and referenced by the segment without anyone else in between
+        with self.master.locked() if self.master else contextlib.nullcontext():
+            return self._append(data, when)
+
+    def _append(self, data, when):
+        raw = base64.urlsafe_b64decode(self.fernet.encrypt(self.encode(data)))
+        if self.master:
+            # new variants must be readable before any segment refers to them
+            self.master.save()
+        entries = self.entries()
+        # the data file is the source of truth for the offset; bytes from an interrupted
+        # append that never reached the index are simply skipped over
+        with open(self.path, "ab") as fh:
+            offset = fh.tell()
+            fh.write(raw)
+        entry = {
+            'date': when.strftime('%Y-%m-%d'),
+            'timestamp': when.isoformat(timespec='seconds'),
+            'offset': offset,
+            'length': len(raw),
+            'fingerprint': self.fingerprint(data),
+            'encoding': 'raw'
+        }
+        entries.append(entry)
+        self._write_index()
+        self._remember(offset, data)
+        return entry
+
+    def read(self, entry):
+        """Decrypt a single segment (or return it from the in-memory cache)"""
+        if self.cache_size:
+            with self._lock:
+                if entry['offset'] in self._decoded:
+                    self._decoded.move_to_end(entry['offset'])
+                    return self._decoded[entry['offset']]
+        data = self._read_segment(entry)
+        self._remember(entry['offset'], data)
+        return data
+
+    def _remember(self, offset, data):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._decoded[offset] = data
+            while len(self._decoded) > self.cache_size:
+                self._decoded.popitem(last=False)
+
+    def _read_segment(self, entry):
+        with open(self.path, "rb") as fh:
+            fh.seek(entry['offset'])
+            token = fh.read(entry['length'])
+        if entry.get('encoding') == 'raw':
+            token = base64.urlsafe_b64encode(token)
+        try:
+            return self.decode(self.fernet.decrypt(token))
+        except InvalidToken:
+            raise ValueError(f"History segment for {entry['date']} cannot be decrypted (wrong key or corrupted)")
+
+    def latest(self):
+        entries = self.entries()
+        return self.read(entries[-1]) if entries else None
+
+    def daily_entries(self):
+        """Last segment of each day, in date order"""
+        by_date = {}
+        for entry in self.entries():
+            by_date[entry['date']] = entry
+        return [by_date[d] for d in sorted(by_date)]
+
+    def range(self, start=None, end=None):
+        """[(date, data)] for days in [start, end] (YYYY-MM-DD strings, inclusive); one snapshot per day"""
+        return [
+            (e['date'], self.read(e)) for e in self.daily_entries()
+            if (start is None or e['date'] >= start) and (end is None or e['date'] <= end)
+        ]
+
+    def iter_range(self, start=None, end=None, newest_first=False):
+        """Lazy range(): decrypts one segment per step, so callers can stop early"""
+        entries = self.daily_entries()
+        for e in reversed(entries) if newest_first else entries:
+            if (start is None or e['date'] >= start) and (end is None or e['date'] <= end):
+                yield e['date'], self.read(e)
+
+    def export_archive(self, path, key, start=None, end=None, newest_first=True):
+        """
+        Write daily snapshots to a chunked_crypto container (newest first by default, so a
+        reader that only needs recent days stops after the first few chunks). Returns the count.
+        """
+        return write_archive(path, key, self.iter_range(start, end, newest_first))
+
+    def last(self, n):
+        """[(date, data)] for the most recent n days"""
+        return [(e['date'], self.read(e)) for e in self.daily_entries()[-n:]] if n > 0 else []
@@ -0,0 +1,149 @@
+import json
+import os
+from datetime import date, datetime
+
+from cryptography.fernet import InvalidToken
+
+# period-to-date horizons: each is measured from the last snapshot before the current day / ISO
+# week / month / year began (not trailing 7 / 30 day windows)
+HORIZONS = ('1D', 'WTD', 'MTD', 'YTD')
+# names used by rollup files written before the week / month horizons were renamed
+LEGACY_NAMES = {'1W': 'WTD', '1M': 'MTD'}
+
+
+def period_key(horizon, day):
+    """Identifier of the period `day` falls in; a new period starts when the key changes"""
+    if horizon == '1D':
+        return day.isoformat()
+    if horizon == 'WTD':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if horizon == 'MTD':
+        return f"{day.year}-{day.month:02d}"
+    return str(day.year)
+
+
+def compact_snapshot(day, data):
+    """The few numbers the rollups need from an investor payload"""
+    networth = data['Profile']['Networth']
+    values = {}
+    names = {}
+    for h in data['Profile']['Holdings']:
+        if h['SecurityType'] == 'Equity':
+            values[h['ISIN']] = h['PortfolioValue']
+            names[h['ISIN']] = h['CompanyName']
+    return {
+        'date': day.isoformat(),
+        'networth': networth['CurrentNetworth'],
+        'return': networth['Return'],
+        'values': values,
+        'names': names
+    }
+
+
+class HorizonRollups:
+    """
+    Running 1D/WTD/MTD/YTD baselines. For each horizon we keep the last snapshot of the previous
+    period (the "anchor"); appending a snapshot only moves anchors whose period rolled over, so
+    the horizon numbers never require rescanning the history. A horizon whose anchor is the
+    current snapshot itself (the first run) is left out. State is Fernet-encrypted on disk.
+    """
+
+    def __init__(self, fernet, path="portfolio_rollups.enc"):
+        self.fernet = fernet
+        self.path = path
+        self.state = {'last': None, 'anchors': {}}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as fh:
+                self.state = json.loads(self.fernet.decrypt(fh.read()).decode("utf-8"))
+            anchors = self.state['anchors']
+            for old, new in LEGACY_NAMES.items():
+                if old in anchors:
+                    anchors.setdefault(new, anchors.pop(old))
+            return True
+        except InvalidToken:
+            print(f"Decryption failed for {self.path} - rollups will be rebuilt.")
+        except Exception as e:
+            print(f"Error reading {self.path}: {e}")
+        return False
+
+    def save(self):
+        payload = json.dumps(self.state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(self.fernet.encrypt(payload))
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def advance(state, day, data):
+        """Return the state after appending `data` for `day`; does not mutate `state`"""
+        snapshot = compact_snapshot(day, data)
+        last = state['last']
+        anchors = dict(state['anchors'])
+        for horizon in HORIZONS:
+            current_period = period_key(horizon, day)
+            anchor = anchors.get(horizon)
+            if anchor and anchor['period'] == current_period:
+                continue
+            if last and period_key(horizon, date.fromisoformat(last['date'])) != current_period:
+                # the previous snapshot closed the previous period
+                anchors[horizon] = dict(last, period=current_period)
+            elif not anchor:
+                # no earlier data yet: measure from the first snapshot we have
+                anchors[horizon] = dict(last or snapshot, period=current_period)
+        return {'last': snapshot, 'anchors': anchors}
+
+    def update(self, day, data):
+        self.state = self.advance(self.state, day, data)
+
+    def rebuild(self, store):
+        """Recompute from every stored day (one-off, when no rollup file exists yet)"""
+        self.state = {'last': None, 'anchors': {}}
+        for entry in store.daily_entries():
+            self.update(date.fromisoformat(entry['date']), store.read(entry))
+
+    @staticmethod
+    def summarize(state, top=3):
+        """Per-horizon change vs its anchor, with the largest per-holding contributions"""
+        last = state['last']
+        if not last:
+            return {}
+        result = {}
+        for horizon in HORIZONS:
+            base = state['anchors'].get(horizon)
+            if not base or base['date'] == last['date']:
+                # nothing earlier to compare with yet
+                continue
+            base_networth = base['networth']
+            contributions = []
+            for isin in set(last['values']) | set(base['values']):
+                delta = last['values'].get(isin, 0.0) - base['values'].get(isin, 0.0)
+                name = last['names'].get(isin) or base['names'].get(isin) or isin
+                contributions.append({
+                    'company': name,
+                    'contribution_pct': delta / base_networth * 100 if base_networth else 0.0,
+                    'value_change': delta
+                })
+            contributions.sort(key=lambda c: c['contribution_pct'], reverse=True)
+            value_change = last['networth'] - base_networth
+            result[horizon] = {
+                'base_date': base['date'],
+                'value_change': value_change,
+                'value_change_pct': value_change / base_networth * 100 if base_networth else 0.0,
+                'return_change': (last['return'] - base['return']) * 100,
+                'top_contributors': [c for c in contributions[:top] if c['contribution_pct'] > 0],
+                'top_detractors': [c for c in contributions[::-1][:top] if c['contribution_pct'] < 0]
+            }
+        return result
+
+    def preview(self, data, day=None):
+        """Horizon summary as if `data` were appended now, without changing the stored state"""
+        day = day or datetime.now().date()
+        return self.summarize(self.advance(self.state, day, data))
+
+    def summary(self):
+        return self.summarize(self.state)
@@ -0,0 +1,152 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+
+from api_client import redact_error, redact_url
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+USERNAME_HINTS = ("username", "email", "user", "login", "userid")
+
+
+class _FormParser(HTMLParser):
+    """Collect every <form> on a page together with its <input> fields."""
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k.lower(): (v or "") for k, v in attrs}
+        if tag == "form":
+            # a form without method= is submitted with GET, as a browser would
+            self._current = {
+                'action': attrs.get('action', ''),
+                'method': (attrs.get('method') or 'get').lower(),
+                'inputs': []
+            }
+            self.forms.append(self._current)
+        elif tag == "input" and self._current is not None:
+            self._current['inputs'].append({
+                'name': attrs.get('name', ''),
+                'id': attrs.get('id', ''),
+                'type': attrs.get('type', 'text').lower(),
+                'value': attrs.get('value', ''),
+                'placeholder': attrs.get('placeholder', '').lower()
+            })
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._current = None
+
+
+def find_login_form(html):
+    """Return the first form containing a password input, or None."""
+    parser = _FormParser()
+    parser.feed(html)
+    for form in parser.forms:
+        if any(i['type'] == 'password' for i in form['inputs']):
+            return form
+    return None
+
+
+def _looks_like_username(field):
+    text = " ".join((field['name'], field['id'], field['placeholder'])).lower()
+    return any(hint in text for hint in USERNAME_HINTS)
+
+
+def build_form_data(form, username, password):
+    """
+    Fill the login form: keeps hidden/CSRF fields as served, puts the credentials into the
+    username-like and password inputs. Returns (data, error).
+    """
+    data = {}
+    username_name = None
+    password_name = None
+    text_candidates = []
+    for field in form['inputs']:
+        if not field['name']:
+            continue
+        if field['type'] == 'password' and not password_name:
+            password_name = field['name']
+        elif field['type'] in ('text', 'email', 'tel'):
+            text_candidates.append(field)
+            if not username_name and _looks_like_username(field):
+                username_name = field['name']
+        elif field['type'] in ('hidden', 'submit') or (field['type'] == 'checkbox' and field['value']):
+            data[field['name']] = field['value']
+
+    if not username_name and text_candidates:
+        username_name = text_candidates[0]['name']
+    if not username_name:
+        return None, "Could not find username field"
+    if not password_name:
+        return None, "Could not find password field"
+
+    data[username_name] = username
+    data[password_name] = password
+    return data, None
+
+
+class HttpLoginBackend:
+    """
+    Browserless login: GET the login page, submit its form with requests, follow redirects to
+    the dashboard and expose the resulting cookie jar. Only works when the login page is a plain
+    HTML form; JS-rendered logins need the Selenium backend.
+    """
+
+    name = "http"
+
+    def __init__(self, session=None, timeout=30):
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def login(self, login_url, username, password):
+        try:
+            print("Fetching login page (HTTP)...")
+            page = self.session.get(login_url, headers={'User-Agent': USER_AGENT}, timeout=self.timeout)
+            page.raise_for_status()
+
+            form = find_login_form(page.text)
+            if not form:
+                print("No HTML login form found (page is probably rendered by JavaScript)")
+                return False
+            data, error = build_form_data(form, username, password)
+            if error:
+                print(error)
+                return False
+
+            action = urljoin(page.url, form['action'] or page.url)
+            print("Submitting login form (HTTP)...")
+            headers = {'User-Agent': USER_AGENT, 'Referer': page.url}
+            if form['method'] == 'get':
+                response = self.session.get(action, params=data, headers=headers,
+                                            timeout=self.timeout, allow_redirects=True)
+            else:
+                response = self.session.post(action, data=data, headers=headers,
+                                             timeout=self.timeout, allow_redirects=True)
+
+            if response.status_code >= 400:
+                print(f"HTTP login rejected with status {response.status_code}")
+                return False
+            if "dashboard" in response.url.lower():
+                return True
+            # Still on a page with a password form means the credentials were refused
+            if find_login_form(response.text):
+                print(f"HTTP login did not leave the login page ({redact_url(response.url)})")
+                return False
+            print(f"No dashboard redirect after HTTP login ({redact_url(response.url)})")
+            return True
+
+        except Exception as e:
+            print(f"HTTP login failed: {type(e).__name__}: {redact_error(e, login_url)}")
+            return False
+
+    def cookies(self):
+        return {c.name: c.value for c in self.session.cookies}
+
+    def cookie_expiry(self):
+        expiries = [c.expires for c in self.session.cookies if c.expires]
+        return min(expiries) if expiries else None
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# outcomes of a run that did its job: nothing to alert on
+OK_OUTCOMES = ('success', 'unchanged', 'below_threshold')
+
+
+class RunMetrics:
+    """
+    Per-run instrumentation: timed spans per pipeline stage, counters (retries, ...),
+    gauges (payload sizes, ...) and an overall outcome. Exported as a JSON run record
+    (appended to runs.jsonl) and a Prometheus textfile-collector file.
+    """
+
+    def __init__(self, labels=None):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.labels = dict(labels or {})
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.outcome = None
+        # stages may run on worker threads (pipeline, concurrent API fetches)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        """Time a stage; repeated stages accumulate. Exceptions mark the stage failed and propagate."""
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.add_duration(stage, time.perf_counter() - started, status)
+
+    def add_duration(self, stage, seconds, status="ok"):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'status': "ok"})
+            entry['seconds'] += seconds
+            entry['calls'] += 1
+            if status != "ok":
+                entry['status'] = status
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def set_outcome(self, outcome):
+        self.outcome = outcome
+
+    def record(self):
+        return {
+            'run_id': self.run_id,
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec='seconds'),
+            'duration_seconds': round(time.perf_counter() - self._started, 4),
+            'outcome': self.outcome or "unknown",
+            'labels': self.labels,
+            'stages': {k: dict(v, seconds=round(v['seconds'], 4)) for k, v in self.stages.items()},
+            'counters': self.counters,
+            'gauges': self.gauges
+        }
+
+    def prometheus(self, prefix="pms"):
+        """Prometheus exposition text for this run"""
+        base = "".join(f',{k}="{_escape(v)}"' for k, v in sorted(self.labels.items()))
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Wall-clock time spent in a pipeline stage",
+            f"# TYPE {prefix}_stage_duration_seconds gauge",
+        ]
+        for stage, entry in self.stages.items():
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",status="{entry["status"]}"{base}}} '
+                         f'{entry["seconds"]:.6f}')
+        # counts restart at zero every run, so they are exported as gauges: a Prometheus counter
+        # that resets on every scrape would make rate() / increase() meaningless
+        lines += [
+            f"# HELP {prefix}_run_count Events counted during the last run (retries, cache hits, ...)",
+            f"# TYPE {prefix}_run_count gauge",
+        ]
+        for name, value in self.counters.items():
+            lines.append(f'{prefix}_run_count{{name="{name}"{base}}} {value}')
+        lines += [
+            f"# HELP {prefix}_value Values recorded during the last run (payload sizes, status codes, ...)",
+            f"# TYPE {prefix}_value gauge",
+        ]
+        for name, value in self.gauges.items():
+            lines.append(f'{prefix}_value{{name="{name}"{base}}} {value}')
+        label_block = "{" + base[1:] + "}" if base else ""
+        lines += [
+            f"# HELP {prefix}_run_success 1 if the last run did its job (sent a report, or had nothing to send), else 0",
+            f"# TYPE {prefix}_run_success gauge",
+            f"{prefix}_run_success{label_block} {1 if self.outcome in OK_OUTCOMES else 0}",
+            f"# HELP {prefix}_run_outcome Outcome of the last run (success, unchanged, below_threshold, partial, "
+            f"fetch_failed, error, ...) as a label, always 1",
+            f"# TYPE {prefix}_run_outcome gauge",
+            f'{prefix}_run_outcome{{outcome="{_escape(self.outcome or "unknown")}"{base}}} 1',
+            f"# HELP {prefix}_run_duration_seconds Wall-clock time of the last run",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"{prefix}_run_duration_seconds{label_block} {time.perf_counter() - self._started:.6f}",
+            f"# HELP {prefix}_run_timestamp_seconds Unix time the last run started",
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f"{prefix}_run_timestamp_seconds{label_block} {self.started_at:.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory, name="portfolio_tracker"):
+        """Append the JSON record to <dir>/runs.jsonl and (atomically) write <dir>/<name>.prom"""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, "runs.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.record(), ensure_ascii=False) + "\n")
+            prom_path = os.path.join(directory, f"{name}.prom")
+            with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(prom_path + ".tmp", prom_path)
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,131 @@
+import asyncio
+
+
+class StageSkipped(Exception):
+    """A stage did not run because one of its dependencies failed"""
+
+
+class Pipeline:
+    """
+    Runs stages as soon as their dependencies are done instead of one after another.
+    A stage is fn(**results_of_its_deps); blocking functions run on a worker thread, coroutine
+    functions (run_async=True) on the event loop. Each stage is timed as a metrics span covering
+    its own work, not the wait for its dependencies. A failed stage skips its dependents; the
+    independent stages still run.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.stages = {}
+
+    def add(self, name, fn, deps=(), run_async=False):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self.stages[name] = (fn, tuple(deps), run_async)
+
+    async def _run_stage(self, name, tasks):
+        fn, deps, run_async = self.stages[name]
+        inputs = {}
+        for dep in deps:
+            try:
+                inputs[dep] = await tasks[dep]
+            except Exception as e:
+                raise StageSkipped(f"{name} skipped: {dep} failed ({e})")
+        call = fn(**inputs) if run_async else asyncio.to_thread(fn, **inputs)
+        if not self.metrics:
+            return await call
+        with self.metrics.span(name):
+            return await call
+
+    async def run_async(self):
+        """({stage: result}, {stage: exception}) once every stage has finished or been skipped"""
+        tasks = {}
+        # stages are registered after their dependencies, so creating them in order is safe
+        for name in self.stages:
+            tasks[name] = asyncio.ensure_future(self._run_stage(name, tasks))
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        results, errors = {}, {}
+        for name, outcome in zip(tasks, outcomes):
+            if isinstance(outcome, BaseException):
+                errors[name] = outcome
+            else:
+                results[name] = outcome
+        return results, errors
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+
+def daily_pipeline(automation, broadcaster, recipients):
+    """
+    The daily run as a dependency graph:
+
+        fetch (login, session + investor API) ─┐
+        analysis_inputs (decrypt history) ─────┴─ prepare ─┬─ telegram ── (disconnect)
+        telegram_connect ──────────────────────────────────┘
+                                                           └─ save (runs while sending)
+
+    `prepare` returns None when the fetch failed, else {'data', 'unchanged', 'messages'} ('quiet'
+    when a change is saved without a report, see below_notify_threshold).
+    """
+    pipeline = Pipeline(automation.metrics)
+
+    def prepare(fetch, analysis_inputs):
+        if not fetch or not fetch.get('investor_api'):
+            return None
+        data = fetch['investor_api']
+        if automation.is_unchanged(data):
+            # nothing moved (holiday / weekend): skip analysis, re-encryption and the commit
+            print("Portfolio unchanged since last snapshot - skipping analysis and save.")
+            notice = automation.unchanged_notice(data)
+            return {'data': data, 'unchanged': True,
+                    'messages': [notice] if automation.on_unchanged == "notice" else []}
+        if automation.below_notify_threshold(data, analysis_inputs['previous']):
+            # intraday noise: keep the snapshot, skip the report
+            print(f"Networth moved less than {automation.notify_min_move_pct}% since the last report - saving without sending.")
+            return {'data': data, 'unchanged': False, 'quiet': True, 'messages': []}
+        analysis, history = automation.analyze_with_inputs(analysis_inputs, data)
+        # chunks are rendered while they are sent
+        messages = automation.iter_telegram_messages(analysis, history, automation.message_max_chars)
+        return {'data': data, 'unchanged': False, 'messages': messages}
+
+    async def telegram(prepare, telegram_connect):
+        if not prepare or not prepare['messages']:
+            return []
+        results = await broadcaster.broadcast_async(recipients, prepare['messages'], client=telegram_connect)
+        broadcaster.report(results)
+        if not prepare['unchanged'] and any(r['ok'] for r in results):
+            automation.reported_networth = prepare['data']['Profile']['Networth']['CurrentNetworth']
+        return results
+
+    def save(prepare):
+        if prepare and not prepare['unchanged']:
+            automation.save_current_data(prepare['data'])
+            return True
+        return False
+
+    pipeline.add('fetch', automation.run_full_automation)
+    pipeline.add('analysis_inputs', automation.load_analysis_inputs)
+    pipeline.add('telegram_connect', broadcaster.connect, run_async=True)
+    pipeline.add('prepare', prepare, deps=('fetch', 'analysis_inputs'))
+    pipeline.add('telegram', telegram, deps=('prepare', 'telegram_connect'), run_async=True)
+    pipeline.add('save', save, deps=('prepare',))
+    return pipeline
+
+
+async def run_daily_async(automation, broadcaster, recipients):
+    results, errors = await daily_pipeline(automation, broadcaster, recipients).run_async()
+    # the connection was opened speculatively during the login; close it whatever happened
+    client = results.get('telegram_connect')
+    if client:
+        try:
+            await client.disconnect()
+        except Exception as e:
+            print(f"Telegram disconnect failed: {e}")
+    return results, errors
+
+
+def run_daily(automation, broadcaster, recipients):
+    """Blocking wrapper around the daily pipeline; returns ({stage: result}, {stage: exception})"""
+    return asyncio.run(run_daily_async(automation, broadcaster, recipients))
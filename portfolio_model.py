@@ -0,0 +1,156 @@
+from operator import itemgetter
+
+
+class PayloadError(ValueError):
+    """The investor API payload does not have the shape the analysis relies on"""
+
+
+_NUMBERS = frozenset((int, float))
+_TEXT = frozenset((str, type(None)))
+_EQUITY_KEYS = frozenset(('CompanyName', 'Sector', 'Category'))
+_ALL_FIELDS = itemgetter('SecurityType', 'ISIN', 'CompanyName', 'Sector', 'Category', 'PortfolioValue',
+                         'PortfolioWeightage')
+
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PayloadError(f"{where}: expected a number, got {type(value).__name__}")
+    return value
+
+
+def _text(value, where):
+    if value is not None and not isinstance(value, str):
+        raise PayloadError(f"{where}: expected a string, got {type(value).__name__}")
+    return value
+
+
+def _field(record, key, where):
+    try:
+        return record[key]
+    except KeyError:
+        raise PayloadError(f"{where}: missing {key}") from None
+
+
+class Networth:
+    __slots__ = ('current', 'invested', 'ret')
+
+    def __init__(self, current, invested, ret):
+        self.current = current
+        self.invested = invested
+        self.ret = ret
+
+
+class Holding:
+    """One position, as returned by Portfolio.holding(); sector / category may be None for non-equity lines"""
+    __slots__ = ('isin', 'company', 'sector', 'category', 'security_type', 'value', 'weightage')
+
+    def __init__(self, isin, company, sector, category, security_type, value, weightage):
+        self.isin = isin
+        self.company = company
+        self.sector = sector
+        self.category = category
+        self.security_type = security_type
+        self.value = value
+        self.weightage = weightage
+
+
+class Portfolio:
+    """
+    A validated investor payload, stored column-wise: one sequence per holding field (row i is the
+    i-th holding in payload order) instead of a dict per holding. `equity` maps each equity ISIN
+    to its row (first position, last row wins, as a dict comprehension over the payload would
+    give). Only the fields the analysis reads are kept; numbers keep their JSON type.
+    """
+    __slots__ = ('networth', 'isin', 'company', 'sector', 'category', 'security_type', 'value',
+                 'weightage', 'equity')
+
+    def __init__(self, networth, isin, company, sector, category, security_type, value, weightage):
+        self.networth = networth
+        self.isin = isin
+        self.company = company
+        self.sector = sector
+        self.category = category
+        self.security_type = security_type
+        self.value = value
+        self.weightage = weightage
+        self.equity = {isin[i]: i for i, t in enumerate(security_type) if t == 'Equity'}
+
+    def __len__(self):
+        return len(self.isin)
+
+    def holding(self, i):
+        return Holding(self.isin[i], self.company[i], self.sector[i], self.category[i], self.security_type[i],
+                       self.value[i], self.weightage[i])
+
+    def __iter__(self):
+        return (self.holding(i) for i in range(len(self.isin)))
+
+
+def parse_payload(data):
+    """
+    Validate an investor API payload and return a Portfolio (a Portfolio is passed through).
+    The holdings are read in one sweep into columns that are type-checked as a whole; raises
+    PayloadError naming the first offending field.
+    """
+    if isinstance(data, Portfolio):
+        return data
+    if not isinstance(data, dict):
+        raise PayloadError(f"payload: expected an object, got {type(data).__name__}")
+    profile = _field(data, 'Profile', "payload")
+    if not isinstance(profile, dict):
+        raise PayloadError("Profile: expected an object")
+    raw_networth = _field(profile, 'Networth', "Profile")
+    if not isinstance(raw_networth, dict):
+        raise PayloadError("Profile.Networth: expected an object")
+    invested = raw_networth.get('InvestedAmount')
+    networth = Networth(
+        _number(_field(raw_networth, 'CurrentNetworth', "Profile.Networth"), "Profile.Networth.CurrentNetworth"),
+        None if invested is None else _number(invested, "Profile.Networth.InvestedAmount"),
+        _number(_field(raw_networth, 'Return', "Profile.Networth"), "Profile.Networth.Return")
+    )
+    raw = _field(profile, 'Holdings', "Profile")
+    if not isinstance(raw, list):
+        raise PayloadError("Profile.Holdings: expected a list")
+    try:
+        columns = list(zip(*map(_ALL_FIELDS, raw))) if raw else [()] * 7
+    except KeyError:
+        # some line lacks a name / classification: allowed for non-equity holdings
+        columns = None
+    except TypeError:
+        _explain(raw)
+        raise PayloadError("Profile.Holdings: malformed holding")
+    if columns is None:
+        try:
+            columns = [[h['SecurityType'] for h in raw], [h['ISIN'] for h in raw],
+                       [h.get('CompanyName') for h in raw], [h.get('Sector') for h in raw],
+                       [h.get('Category') for h in raw], [h['PortfolioValue'] for h in raw],
+                       [h['PortfolioWeightage'] for h in raw]]
+        except (KeyError, TypeError, AttributeError):
+            _explain(raw)
+            raise PayloadError("Profile.Holdings: malformed holding")
+    security_type, isin, company, sector, category, value, weightage = columns
+    valid = (set(map(type, value)) <= _NUMBERS and set(map(type, weightage)) <= _NUMBERS
+             and all(set(map(type, column)) <= _TEXT
+                     for column in (security_type, isin, company, sector, category)))
+    # equity lines must carry their name and classification (None values are fine, missing keys are not)
+    if valid and not all(raw[i].keys() >= _EQUITY_KEYS for i, t in enumerate(security_type)
+                         if t == 'Equity' and (company[i] is None or sector[i] is None or category[i] is None)):
+        valid = False
+    if not valid:
+        _explain(raw)
+        raise PayloadError("Profile.Holdings: malformed holding")
+    return Portfolio(networth, isin, company, sector, category, security_type, value, weightage)
+
+
+def _explain(raw):
+    """Slow path: walk the holdings field by field to name the first invalid one"""
+    for i, h in enumerate(raw):
+        where = f"Profile.Holdings[{i}]"
+        if not isinstance(h, dict):
+            raise PayloadError(f"{where}: expected an object")
+        equity = _text(_field(h, 'SecurityType', where), f"{where}.SecurityType") == 'Equity'
+        _text(_field(h, 'ISIN', where), f"{where}.ISIN")
+        for key in ('CompanyName', 'Sector', 'Category'):
+            _text(_field(h, key, where) if equity else h.get(key), f"{where}.{key}")
+        for key in ('PortfolioValue', 'PortfolioWeightage'):
+            _number(_field(h, key, where), f"{where}.{key}")
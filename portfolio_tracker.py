@@ -1,56 +1,116 @@
-import requests
+import heapq
 import time
 import json
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import os
 from datetime import datetime
-from telethon.sync import TelegramClient
-from telethon.sessions import StringSession
 from cryptography.fernet import Fernet, InvalidToken
-import base64
-from telethon.tl.types import MessageMediaPoll
+from session_cache import SessionCache
+from history_store import HistoryStore
+from snapshot_format import decode_snapshot
+from security_master import SecurityMaster
+from portfolio_model import PayloadError, parse_payload
+from chunked_crypto import derive_key, read_archive
+from horizons import HorizonRollups
+from metrics import RunMetrics
+
+# selenium, telethon and requests are imported where they are used so that offline commands
+# (render / analyze / history, see cli.py) start without loading them.
+
+# payloads whose parsed form is kept by MyAlternatesAutomation.parse_payload
+PARSED_PAYLOADS = 4
+# Telegram rejects messages longer than this (UTF-16 code units)
+TELEGRAM_MESSAGE_LIMIT = 4096
+# how long to keep polling the session API after a browser login before giving up
+SESSION_WAIT_SECONDS = 2
 
 class MyAlternatesAutomation:
-    def __init__(self, username, password, login_url, session_api_url, investor_api_url, headless=True):
+    def __init__(self, username, password, login_url, session_api_url, investor_api_url, headless=True,
+                 session_cache_file="session_cache.enc", login_backend="selenium"):
         self.username = username
         self.password = password
         self.login_url = login_url
         self.session_api_url = session_api_url
         self.investor_api_url = investor_api_url
-        self.session = requests.Session()
+        self._session = None
+        self._api_client = None
+        # encrypted ETag/Last-Modified cache for conditional API requests (None disables persistence)
+        self.api_cache_file = "api_cache.enc"
+        # {name: url} fetched alongside the investor API (e.g. transactions, NAV history)
+        self.extra_api_urls = {}
+        self.extra_data = {}
         self.driver = None
+        # optional DriverPool (daemon mode) lending warm browsers instead of starting Chrome
+        self.driver_pool = None
         self.headless = headless
         self.data_file = "portfolio_data.json"
+        self.enc_file = "portfolio_data.enc"
+        self.history_file = "portfolio_history.enc"
+        self.rollups_file = "portfolio_rollups.enc"
+        # TWR / XIRR / volatility / drawdown series; risk_windows (e.g. ('1M', 'YTD')) adds the report section
+        self.risk_file = "portfolio_risk.enc"
+        self.risk_windows = ()
+        # interned ISIN / security metadata shared by every account (None stores full holdings)
+        self.security_master_file = "security_master.enc"
+        # label shown in the report header when several accounts are tracked
+        self.account_name = None
+        # >0 keeps one HistoryStore with that many decoded snapshots cached (daemon mode)
+        self.history_cache_size = 0
+        self._history_store = None
+        # with history_cache_size the rollups and risk series also stay loaded between runs, as
+        # (object, store generation): another process appending to the history invalidates them
+        self._rollups = None
+        self._risk_series = None
+        # cookies used when no browser is running (restored from the session cache)
+        self.cookies = None
+        self.cookie_expiry = None
+        self.session_cache_file = session_cache_file
+        # "selenium" (browser), "http" (requests only) or "auto" (http first, selenium fallback)
+        self.login_backend = login_backend
+        self.selector_cache_file = "selector_cache.json"
+        self.selector_timings = {}
+        self.metrics = RunMetrics()
+        self.message_max_chars = TELEGRAM_MESSAGE_LIMIT
+        # what to do when the payload matches the last snapshot: "notice" (short message) or "silent"
+        self.on_unchanged = "notice"
+        # >0: a changed payload is saved but only reported once the networth moved this many percent
+        # since the last report sent by this process (or the previous snapshot); used by daemon polls
+        self.notify_min_move_pct = 0
+        self.reported_networth = None
+        # header time of the report; None means now (replays pin it to the snapshot's timestamp)
+        self.report_time = None
+        # [(payload, Portfolio)] for the last few payloads analyzed
+        self._parsed = []
+
+    @property
+    def session(self):
+        """requests.Session for the API calls, created on first use"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    @session.setter
+    def session(self, value):
+        self._session = value
 
     def setup_driver(self):
-        """Setup Chrome WebDriver with options"""
-        chrome_options = Options()
-        if self.headless:
-            chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-
-        # Add user agent to avoid detection
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(10)
+        """Setup Chrome WebDriver with options (a warm one from driver_pool when set)"""
+        if self.driver_pool:
+            self.driver = self.driver_pool.acquire()
+        else:
+            self.driver = create_chrome_driver(self.headless)
 
     def login(self):
         """Perform login on the MyAlternates platform"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
+        from selector_resolver import SelectorResolver
+
         try:
             print("Navigating to login page...")
             self.driver.get(self.login_url)
-
-            # Wait for page to load
-            time.sleep(3)
+            resolver = SelectorResolver(self.driver, self.login_url, self.selector_cache_file)
 
             # Try different possible selectors for username field
             username_selectors = [
@@ -62,16 +122,8 @@ class MyAlternatesAutomation:
                 "input[placeholder*='email' i]"
             ]
 
-            username_field = None
-            for selector in username_selectors:
-                try:
-                    username_field = WebDriverWait(self.driver, 5).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    print(f"Found username field with selector: {selector}")
-                    break
-                except TimeoutException:
-                    continue
+            # Waiting on the username field replaces a fixed page-load sleep
+            username_field, _ = resolver.resolve("username", username_selectors, timeout=15)
 
             if not username_field:
                 # Fallback: try to find any input field
@@ -89,14 +141,7 @@ class MyAlternatesAutomation:
                 "input[id='password']"
             ]
 
-            password_field = None
-            for selector in password_selectors:
-                try:
-                    password_field = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    print(f"Found password field with selector: {selector}")
-                    break
-                except NoSuchElementException:
-                    continue
+            password_field, _ = resolver.resolve("password", password_selectors, timeout=5)
 
             if not password_field:
                 # Fallback: use second input field if available
@@ -119,31 +164,13 @@ class MyAlternatesAutomation:
             submit_selectors = [
                 "button[type='submit']",
                 "input[type='submit']",
-                "button:contains('Sign in')",
-                "button:contains('Login')",
+                "button:contains('Sign in', 'Login')",
                 ".btn-primary",
                 ".login-btn",
                 "form button"
             ]
 
-            submit_button = None
-            for selector in submit_selectors:
-                try:
-                    if ":contains" in selector:
-                        # Handle text-based selectors
-                        buttons = self.driver.find_elements(By.TAG_NAME, "button")
-                        for btn in buttons:
-                            if "sign in" in btn.text.lower() or "login" in btn.text.lower():
-                                submit_button = btn
-                                break
-                    else:
-                        submit_button = self.driver.find_element(By.CSS_SELECTOR, selector)
-
-                    if submit_button:
-                        print(f"Found submit button with selector: {selector}")
-                        break
-                except NoSuchElementException:
-                    continue
+            submit_button, _ = resolver.resolve("submit", submit_selectors, timeout=5)
 
             if not submit_button:
                 # Fallback: try any button
@@ -154,6 +181,9 @@ class MyAlternatesAutomation:
                 else:
                     raise Exception("Could not find submit button")
 
+            resolver.save()
+            self.selector_timings = resolver.timings
+
             print("Clicking sign in button...")
             submit_button.click()
 
@@ -174,97 +204,210 @@ class MyAlternatesAutomation:
             print(f"Login failed: {str(e)}")
             return False
 
+    def http_login(self):
+        """Log in without a browser; on success the cookie jar is handed to the API calls"""
+        from http_login import HttpLoginBackend
+
+        backend = HttpLoginBackend(self.session)
+        if not backend.login(self.login_url, self.username, self.password):
+            return False
+        self.cookies = backend.cookies()
+        self.cookie_expiry = backend.cookie_expiry()
+        return True
+
     def extract_cookies(self):
-        """Extract cookies from browser session"""
+        """Extract cookies from browser session (or the cached cookies when running without a browser)"""
+        if not self.driver:
+            return dict(self.cookies or {})
         cookies = {}
+        expiries = []
         for cookie in self.driver.get_cookies():
             cookies[cookie['name']] = cookie['value']
+            if cookie.get('expiry'):
+                expiries.append(cookie['expiry'])
+        self.cookies = cookies
+        self.cookie_expiry = min(expiries) if expiries else None
         return cookies
 
+    def get_session_cache(self):
+        """Return a SessionCache bound to FERNET_KEY, or None if caching is disabled / no key."""
+        if not self.session_cache_file:
+            return None
+        fernet = self.make_fernet()
+        if not fernet:
+            return None
+        return SessionCache(fernet, self.session_cache_file)
+
+    def try_cached_session(self):
+        """
+        Warm path: restore cookies from the encrypted session cache and validate them with
+        the session API. Returns the session response on success, None if a browser login is needed.
+        """
+        cache = self.get_session_cache()
+        if not cache:
+            return None
+        key = SessionCache.make_key(self.username, self.login_url)
+        entry = cache.load(key)
+        if not entry:
+            return None
+        print("Found cached session, validating...")
+        self.cookies = entry['cookies']
+        session_response = self.call_session_api()
+        if isinstance(session_response, dict) and session_response.get('accessToken'):
+            print("Cached session is valid - skipping browser login.")
+            return session_response
+        print("Cached session rejected - falling back to browser login.")
+        cache.clear(key)
+        self.cookies = None
+        return None
+
+    def store_session(self, session_response):
+        """Persist the current cookies and accessToken after a successful browser login."""
+        cache = self.get_session_cache()
+        if not cache or not self.cookies:
+            return
+        if not (isinstance(session_response, dict) and session_response.get('accessToken')):
+            return
+        cache.save(
+            SessionCache.make_key(self.username, self.login_url),
+            self.cookies,
+            session_response['accessToken'],
+            self.cookie_expiry
+        )
+
+    @property
+    def api_client(self):
+        """Shared ApiClient (pooled, retrying) over self.session, created on first use"""
+        if self._api_client is None:
+            from api_client import ApiClient, ConditionalCache
+
+            fernet = self.make_fernet() if self.api_cache_file else None
+            self._api_client = ApiClient(
+                self.session,
+                referer=self.login_url.replace('/login', '/dashboard'),
+                metrics=self.metrics,
+                cache=ConditionalCache(fernet, self.api_cache_file)
+            )
+        return self._api_client
+
     def call_session_api(self):
         """Call the session API with extracted cookies"""
         print("Extracting cookies from browser...")
         cookies = self.extract_cookies()
 
         print("Calling session API...")
-        try:
-            response = self.session.get(
-                self.session_api_url,
-                cookies=cookies,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'application/json',
-                    'Referer': self.login_url.replace('/login', '/dashboard')
-                },
-                timeout=30
-            )
-
-            print(f"Session API Response Status: {response.status_code}")
-            print("Session API Response Headers:")
-
-            print("Session API Response Body: [REDACTED]")
-            try:
-                json_response = response.json()
-                return json_response
-            except:
-                return response.text
-
-        except Exception as e:
-            print(f"Session API call failed: {str(e)}")
+        # the accessToken changes per login, so never answer this one from the conditional cache
+        status, body = self.api_client.get(self.session_api_url, cookies=cookies, conditional=False, name='session')
+        if status is None:
+            print("Session API call failed")
             return None
+        print(f"Session API Response Status: {status}")
+        print("Session API Response Body: [REDACTED]")
+        return body
 
     def call_investor_api(self, session_response):
-        """Call the investor API with extracted cookies"""
+        """
+        Call the investor API (plus any extra_api_urls, concurrently) with the cookies from the
+        session call. Extra endpoint bodies are kept in self.extra_data.
+        """
         print("Calling investor API...")
-        cookies = self.extract_cookies()
+        cookies = self.cookies if self.cookies is not None else self.extract_cookies()
+        urls = dict(self.extra_api_urls, investor=self.investor_api_url)
         try:
-            response = self.session.get(
-                self.investor_api_url,
-                cookies=cookies,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'application/json',
-                    'authorization': session_response['accessToken'],
-                    'Referer': self.login_url.replace('/login', '/dashboard')
-                },
-                timeout=30
-            )
-
-            print(f"Investor API Response Status: {response.status_code}")
-            print("Investor API Response Body: [REDACTED]")
-            try:
-                json_response = response.json()
-                return json_response
-            except:
-                return response.text
-
+            token = session_response['accessToken']
         except Exception as e:
             print(f"Investor API call failed: {str(e)}")
             return None
+        responses = self.api_client.get_many(urls, cookies=cookies, token=token)
+        self.extra_data = {}
+        for name, (status, body) in responses.items():
+            if name != 'investor':
+                if status and status < 400:
+                    self.extra_data[name] = body
+                else:
+                    print(f"{name} API call failed (status {status})")
+
+        status, body = responses['investor']
+        if status is None:
+            print("Investor API call failed")
+            return None
+        print(f"Investor API Response Status: {status}")
+        print("Investor API Response Body: [REDACTED]")
+        try:
+            # reject malformed payloads here rather than halfway through the analysis; the
+            # parsed form is reused by analyze_changes
+            self.parse_payload(body)
+        except PayloadError as e:
+            print(f"Investor API returned an unusable payload: {e}")
+            self.metrics.count('payload_errors')
+            return None
+        return body
 
     def run_full_automation(self):
         """Run the complete automation flow"""
         try:
-            # Setup browser
-            print("Setting up Chrome WebDriver...")
-            self.setup_driver()
-
-            # Perform login
-            if self.login():
+            # Warm path: reuse cached cookies/accessToken without starting Chrome
+            with self.metrics.span('session_cache'):
+                session_response = self.try_cached_session()
+            if session_response:
+                with self.metrics.span('investor_api'):
+                    investor_response = self.call_investor_api(session_response)
+                if isinstance(investor_response, dict):
+                    self.metrics.count('session_cache_hits')
+                    return {
+                        'session_api': session_response,
+                        'investor_api': investor_response,
+                        'extra_api': self.extra_data
+                    }
+                print("Investor API failed with cached session - falling back to browser login.")
+                cache = self.get_session_cache()
+                if cache:
+                    cache.clear(SessionCache.make_key(self.username, self.login_url))
+                self.cookies = None
+
+            logged_in = False
+            if self.login_backend in ("http", "auto"):
+                with self.metrics.span('http_login'):
+                    logged_in = self.http_login()
+                if not logged_in and self.login_backend == "auto":
+                    print("HTTP login failed - falling back to Selenium.")
+
+            if not logged_in and self.login_backend in ("selenium", "auto"):
+                # Setup browser
+                print("Setting up Chrome WebDriver...")
+                with self.metrics.span('browser_startup'):
+                    self.setup_driver()
+
+                # Perform login
+                with self.metrics.span('browser_login'):
+                    logged_in = self.login()
+                for field, seconds in self.selector_timings.items():
+                    self.metrics.gauge(f'selector_{field}_seconds', round(seconds, 4))
+
+            if logged_in:
                 print("Login successful!")
 
-                # Wait a moment for session to be established
-                time.sleep(2)
-
-                # Call session API
-                session_response = self.call_session_api()
+                # Call session API; right after a browser login the session may need a moment
+                # to be established, so poll briefly instead of sleeping a fixed 2 seconds
+                with self.metrics.span('session_api'):
+                    session_response = self.call_session_api()
+                    deadline = time.monotonic() + SESSION_WAIT_SECONDS
+                    while (self.driver and not (isinstance(session_response, dict) and session_response.get('accessToken'))
+                           and time.monotonic() < deadline):
+                        time.sleep(0.25)
+                        self.metrics.count('session_api_polls')
+                        session_response = self.call_session_api()
 
                 # Call investor API
-                investor_response = self.call_investor_api(session_response)
+                with self.metrics.span('investor_api'):
+                    investor_response = self.call_investor_api(session_response)
+                if isinstance(investor_response, dict):
+                    self.store_session(session_response)
 
                 return {
                     'session_api': session_response,
-                    'investor_api': investor_response
+                    'investor_api': investor_response,
+                    'extra_api': self.extra_data
                 }
             else:
                 print("Login failed!")
@@ -274,9 +417,17 @@ class MyAlternatesAutomation:
             print(f"Automation failed: {str(e)}")
             return None
         finally:
+            if self._api_client:
+                self._api_client.cache.save()
             if self.driver:
-                print("Closing browser...")
-                self.driver.quit()
+                if self.driver_pool:
+                    with self.metrics.span('browser_release'):
+                        self.driver_pool.release(self.driver)
+                else:
+                    print("Closing browser...")
+                    with self.metrics.span('browser_quit'):
+                        self.driver.quit()
+                self.driver = None
 
     def get_fernet_key(self):
         """
@@ -309,9 +460,129 @@ class MyAlternatesAutomation:
             print("Invalid FERNET_KEY:", e)
             return None
 
+    def get_history_store(self):
+        """Return the append-only HistoryStore for this account, or None without FERNET_KEY."""
+        if self._history_store and self._history_store.path == self.history_file:
+            return self._history_store
+        fernet = self.make_fernet()
+        if not fernet:
+            return None
+        ignore = [k.strip() for k in os.environ.get('FINGERPRINT_IGNORE_KEYS', '').split(',') if k.strip()]
+        store = HistoryStore(fernet, self.history_file, fingerprint_key=self.get_fernet_key(),
+                             fingerprint_ignore=ignore, cache_size=self.history_cache_size,
+                             master=self.get_security_master())
+        if self.history_cache_size:
+            # long-running processes keep the index and recently decoded snapshots in memory
+            self._history_store = store
+        return store
+
+    def get_security_master(self):
+        """The process-wide SecurityMaster for security_master_file, or None when disabled."""
+        fernet = self.make_fernet()
+        if not fernet or not self.security_master_file:
+            return None
+        return SecurityMaster.shared(fernet, self.security_master_file)
+
+    def is_unchanged(self, current_data):
+        """True when current_data has the same content fingerprint as the latest stored snapshot"""
+        store = self.get_history_store()
+        if not store:
+            return False
+        latest = store.latest_fingerprint()
+        return latest is not None and latest == store.fingerprint(current_data)
+
+    def below_notify_threshold(self, current_data, previous_data=None):
+        """True when the networth moved less than notify_min_move_pct since the last report"""
+        if not self.notify_min_move_pct:
+            return False
+        base = self.reported_networth
+        if base is None and previous_data:
+            base = previous_data['Profile']['Networth']['CurrentNetworth']
+        if not base:
+            return False
+        current = current_data['Profile']['Networth']['CurrentNetworth']
+        return abs(current - base) / abs(base) * 100 < self.notify_min_move_pct
+
+    def unchanged_notice(self, current_data):
+        """Short message sent instead of the full report when nothing moved"""
+        store = self.get_history_store()
+        since = store.entries()[-1]['timestamp'].replace("T", " ") if store and store.entries() else "last run"
+        title = "📊💼 ABAKKUS PMS"
+        if self.account_name:
+            title += f" • {self.account_name}"
+        value = current_data['Profile']['Networth']['CurrentNetworth']
+        return (
+            f"{title}\n"
+            f"😴 No change since {since}\n"
+            f"• Current Value: ₹{value:,.2f}\n"
+        )
+
+    def get_rollups(self, store):
+        """Load the 1D/WTD/MTD/YTD rollups, rebuilding them from the history store if missing."""
+        cached = self._kept(self._rollups, store, self.rollups_file)
+        if cached:
+            return cached
+        rollups = HorizonRollups(store.fernet, self.rollups_file)
+        if not rollups.load() and store.entries():
+            print("Rebuilding horizon rollups from history...")
+            rollups.rebuild(store)
+        if self.history_cache_size:
+            self._rollups = (rollups, store.generation)
+        return rollups
+
+    def get_risk_series(self, store):
+        """Load the risk/return series (risk_metrics.RiskSeries), rebuilding it from history if missing."""
+        from risk_metrics import RiskSeries
+
+        cached = self._kept(self._risk_series, store, self.risk_file)
+        if cached:
+            return cached
+        series = RiskSeries(store.fernet, self.risk_file)
+        if not series.load() and store.entries():
+            print("Rebuilding risk series from history...")
+            series.rebuild(store)
+        if self.history_cache_size:
+            self._risk_series = (series, store.generation)
+        return series
+
+    @staticmethod
+    def _kept(kept, store, path):
+        """A kept (object, generation) still valid for `path` and the store's current index, else None"""
+        if not kept:
+            return None
+        obj, generation = kept
+        # entries() notices an index changed by another process and bumps the generation
+        store.entries()
+        return obj if obj.path == path and generation == store.generation else None
+
+    def export_history_archive(self, path="portfolio_history.pmsc", start=None, end=None):
+        """Export daily snapshots (newest first) to a streaming chunked container."""
+        store = self.get_history_store()
+        if not store:
+            print("FERNET_KEY not configured or invalid - cannot export history")
+            return 0
+        count = store.export_archive(path, derive_key(self.get_fernet_key()), start, end)
+        print(f"Exported {count} snapshots to {path}")
+        return count
+
+    def iter_history_archive(self, path="portfolio_history.pmsc"):
+        """Lazily yield (date, payload) from an exported archive; stop iterating to skip the rest."""
+        return read_archive(path, derive_key(self.get_fernet_key()))
+
     def load_previous_data(self):
+        """Load the latest snapshot from the history store, else from portfolio_data.enc."""
+        store = self.get_history_store()
+        if store and store.entries():
+            try:
+                return store.latest()
+            except Exception as e:
+                print(f"Error reading {store.path}: {e}")
+                return None
+        return self.load_legacy_data()
+
+    def load_legacy_data(self):
         """Load previous portfolio data from encrypted file (portfolio_data.enc)."""
-        enc_path = "portfolio_data.enc"
+        enc_path = self.enc_file
         if not os.path.exists(enc_path):
             # fallback to old unencrypted file for compatibility
             plain_path = self.data_file
@@ -330,7 +601,7 @@ class MyAlternatesAutomation:
             with open(enc_path, "rb") as fh:
                 token = fh.read()
             plaintext = fernet.decrypt(token)
-            data = json.loads(plaintext.decode("utf-8"))
+            data = decode_snapshot(plaintext)
             return data
         except InvalidToken:
             print("Decryption failed: Invalid Fernet token (wrong key or corrupted file).")
@@ -341,30 +612,42 @@ class MyAlternatesAutomation:
 
     def save_current_data(self, data):
         """
-        Save current portfolio data encrypted to portfolio_data.enc using FERNET_KEY.
+        Append current portfolio data as a new encrypted segment of the history store.
+        The first append seeds the store with the legacy portfolio_data.enc snapshot.
         Also keep a plaintext backup if FERNET_KEY not configured (optional).
         """
-        enc_path = "portfolio_data.enc"
         plain_path = self.data_file
 
-        fernet = self.make_fernet()
-        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        store = self.get_history_store()
 
-        if fernet:
+        if store:
             try:
-                token = fernet.encrypt(payload)
-                with open(enc_path, "wb") as fh:
-                    fh.write(token)
+                if not store.entries() and os.path.exists(self.enc_file):
+                    legacy = self.load_legacy_data()
+                    if legacy:
+                        store.append(legacy, datetime.fromtimestamp(os.path.getmtime(self.enc_file)))
+                        print(f"Migrated {self.enc_file} into {store.path}")
+                store.append(data)
+                # a rebuild already includes the new segment; updating the same day again is a no-op
+                rollups = self.get_rollups(store)
+                rollups.update(datetime.now().date(), data)
+                rollups.save()
+                if self.risk_windows:
+                    series = self.get_risk_series(store)
+                    series.update(datetime.now().date(), data)
+                    series.save()
                 # optional: remove plaintext file if exists (safer)
                 if os.path.exists(plain_path):
                     try:
                         os.remove(plain_path)
                     except Exception:
                         pass
-                print(f"Encrypted data saved to {enc_path}")
+                print(f"Encrypted snapshot appended to {store.path}")
                 return
             except Exception as e:
                 print(f"Failed to encrypt and save data: {e}")
+                # the kept copies may be half updated; reload them from disk next time
+                self._rollups = self._risk_series = None
                 # fallthrough to save plaintext below
 
         # If no key or encryption failed, save plaintext as fallback (less secure)
@@ -375,135 +658,281 @@ class MyAlternatesAutomation:
         except Exception as e:
             print(f"Error saving plaintext data: {e}")
 
+    def parse_payload(self, data):
+        """
+        portfolio_model.parse_payload, remembered for the last few payload objects: in replays and
+        daemon runs one day's current snapshot is the next comparison's previous one.
+        """
+        for payload, portfolio in self._parsed:
+            if payload is data:
+                return portfolio
+        portfolio = parse_payload(data)
+        self._parsed = [(data, portfolio)] + self._parsed[:PARSED_PAYLOADS - 1]
+        return portfolio
+
     def analyze_changes(self, previous_data, current_data):
-        """Analyze portfolio changes with enhanced detail"""
+        """
+        Analyze portfolio changes with enhanced detail. Payloads are validated by parse_payload
+        (PayloadError on a malformed one); the sections are built in one pass over the current
+        equity holdings plus one over the previous ones for exits.
+        """
+        current = self.parse_payload(current_data)
         if not previous_data:
             # Get all equity holdings with their details
-            equity_holdings = []
-            for holding in current_data['Profile']['Holdings']:
-                if holding['SecurityType'] == 'Equity':
-                    equity_holdings.append({
-                        'company': holding['CompanyName'],
-                        'sector': holding['Sector'],
-                        'category': holding['Category'],
-                        'weightage': holding['PortfolioWeightage'],
-                        'value': holding['PortfolioValue']
-                    })
-
+            equity_holdings = [
+                {'company': current.company[i], 'sector': current.sector[i], 'category': current.category[i],
+                 'weightage': current.weightage[i], 'value': current.value[i]}
+                for i, t in enumerate(current.security_type) if t == 'Equity'
+            ]
             # Sort by weightage (highest first)
             equity_holdings.sort(key=lambda x: x['weightage'], reverse=True)
 
             return {
                 'is_first_run': True,
-                'current_value': current_data['Profile']['Networth']['CurrentNetworth'],
-                'current_return': current_data['Profile']['Networth']['Return'] * 100,
+                'current_value': current.networth.current,
+                'current_return': current.networth.ret * 100,
                 'total_holdings': len(equity_holdings),
                 'holdings_list': equity_holdings
             }
 
-        prev_networth = previous_data['Profile']['Networth']
-        curr_networth = current_data['Profile']['Networth']
+        previous = self.parse_payload(previous_data)
+        prev_networth = previous.networth
+        curr_networth = current.networth
 
         # Portfolio changes
-        value_change = curr_networth['CurrentNetworth'] - prev_networth['CurrentNetworth']
-        value_change_pct = (value_change / prev_networth['CurrentNetworth']) * 100
-        return_change = (curr_networth['Return'] - prev_networth['Return']) * 100
-
-        # Holdings analysis
-        prev_holdings = {h['ISIN']: h for h in previous_data['Profile']['Holdings'] if h['SecurityType'] == 'Equity'}
-        curr_holdings = {h['ISIN']: h for h in current_data['Profile']['Holdings'] if h['SecurityType'] == 'Equity'}
-
-        # Current holdings with change data for display
+        value_change = curr_networth.current - prev_networth.current
+        value_change_pct = (value_change / prev_networth.current) * 100
+        return_change = (curr_networth.ret - prev_networth.ret) * 100
+
+        prev_rows = previous.equity
+        curr_rows = current.equity
+        company, sector, category = current.company, current.sector, current.category
+        value, weightage = current.value, current.weightage
+        prev_value, prev_weightage = previous.value, previous.weightage
         current_holdings_display = []
-        for isin, curr_holding in curr_holdings.items():
-            change_pct = 0
-            if isin in prev_holdings:
-                prev_holding = prev_holdings[isin]
-                weight_change = curr_holding['PortfolioWeightage'] - prev_holding['PortfolioWeightage']
-                value_change_pct = ((curr_holding['PortfolioValue'] - prev_holding['PortfolioValue']) / prev_holding['PortfolioValue']) * 100
-                change_pct = value_change_pct
-
+        new_stocks = []
+        gainers = []
+        losers = []
+        for isin, i in curr_rows.items():
+            j = prev_rows.get(isin)
+            if j is None:
+                current_holdings_display.append({
+                    'company': company[i], 'sector': sector[i], 'category': category[i],
+                    'weightage': weightage[i], 'value': value[i], 'change_pct': 0, 'is_new': True
+                })
+                new_stocks.append({'company': company[i], 'weightage': weightage[i], 'value': value[i],
+                                   'sector': sector[i]})
+                continue
+            holding_change = value[i] - prev_value[j]
+            holding_change_pct = (holding_change / prev_value[j]) * 100
             current_holdings_display.append({
-                'company': curr_holding['CompanyName'],
-                'sector': curr_holding['Sector'],
-                'category': curr_holding['Category'],
-                'weightage': curr_holding['PortfolioWeightage'],
-                'value': curr_holding['PortfolioValue'],
-                'change_pct': change_pct,
-                'is_new': isin not in prev_holdings
+                'company': company[i], 'sector': sector[i], 'category': category[i],
+                'weightage': weightage[i], 'value': value[i], 'change_pct': holding_change_pct, 'is_new': False
             })
+            if abs(holding_change_pct) > 0.01:
+                change = {'company': company[i], 'value_change': holding_change, 'value_change_pct': holding_change_pct,
+                          'weight_change': weightage[i] - prev_weightage[j], 'current_weight': weightage[i]}
+                (gainers if holding_change_pct > 0 else losers).append(change)
+
+        removed_stocks = [
+            {'company': previous.company[j], 'weightage': prev_weightage[j], 'value': prev_value[j],
+             'sector': previous.sector[j]}
+            for isin, j in prev_rows.items() if isin not in curr_rows
+        ]
 
         # Sort by weightage (highest first)
         current_holdings_display.sort(key=lambda x: x['weightage'], reverse=True)
 
-        # New stocks
-        new_stocks = []
-        for isin, holding in curr_holdings.items():
-            if isin not in prev_holdings:
-                new_stocks.append({
-                    'company': holding['CompanyName'],
-                    'weightage': holding['PortfolioWeightage'],
-                    'value': holding['PortfolioValue'],
-                    'sector': holding['Sector']
-                })
-
-        # Removed stocks
-        removed_stocks = []
-        for isin, holding in prev_holdings.items():
-            if isin not in curr_holdings:
-                removed_stocks.append({
-                    'company': holding['CompanyName'],
-                    'weightage': holding['PortfolioWeightage'],
-                    'value': holding['PortfolioValue'],
-                    'sector': holding['Sector']
-                })
-
-        # Top changes
-        stock_changes = []
-        for isin, curr_holding in curr_holdings.items():
-            if isin in prev_holdings:
-                prev_holding = prev_holdings[isin]
-                value_change = curr_holding['PortfolioValue'] - prev_holding['PortfolioValue']
-                value_change_pct = (value_change / prev_holding['PortfolioValue']) * 100
-                weight_change = curr_holding['PortfolioWeightage'] - prev_holding['PortfolioWeightage']
-
-                if abs(value_change_pct) > 0.01:
-                    stock_changes.append({
-                        'company': curr_holding['CompanyName'],
-                        'value_change_pct': value_change_pct,
-                        'weight_change': weight_change,
-                        'current_weight': curr_holding['PortfolioWeightage']
-                    })
-
-        # Sort by change percentage
-        gainers = sorted([s for s in stock_changes if s['value_change_pct'] > 0],
-                         key=lambda x: x['value_change_pct'], reverse=True)[:5]
-        losers = sorted([s for s in stock_changes if s['value_change_pct'] < 0],
-                        key=lambda x: x['value_change_pct'])[:5]
-
         return {
             'is_first_run': False,
             'portfolio': {
-                'previous_value': prev_networth['CurrentNetworth'],
-                'current_value': curr_networth['CurrentNetworth'],
+                'previous_value': prev_networth.current,
+                'current_value': curr_networth.current,
                 'value_change': value_change,
                 'value_change_pct': value_change_pct,
                 'return_change': return_change,
-                'current_return': curr_networth['Return'] * 100
+                'current_return': curr_networth.ret * 100
             },
             'new_stocks': sorted(new_stocks, key=lambda x: x['weightage'], reverse=True),
             'removed_stocks': sorted(removed_stocks, key=lambda x: x['weightage'], reverse=True),
-            'top_gainers': gainers,
-            'top_losers': losers,
-            'total_holdings': len(curr_holdings),
+            'top_gainers': heapq.nlargest(5, gainers, key=lambda x: x['value_change_pct']),
+            'top_losers': heapq.nsmallest(5, losers, key=lambda x: x['value_change_pct']),
+            'total_holdings': len(curr_rows),
             'current_holdings': current_holdings_display
         }
 
+    def prepare_report(self, current_data):
+        """Load the previous snapshot, analyze against current_data and render Telegram-sized messages"""
+        analysis, history = self.prepare_analysis(current_data)
+        with self.metrics.span('render'):
+            messages = list(self.iter_telegram_messages(analysis, history, self.message_max_chars))
+        self.metrics.gauge('message_chunks', len(messages))
+        return messages
+
+    def prepare_analysis(self, current_data):
+        """Load the previous snapshot and trend history and analyze current_data. Returns (analysis, history)"""
+        return self.analyze_with_inputs(self.load_analysis_inputs(), current_data)
+
+    def load_analysis_inputs(self, days=7):
+        """
+        Everything the analysis reads from disk: the previous snapshot, the horizon rollups and the
+        stored part of the trend. Independent of today's payload, so it can run during the login.
+        """
+        with self.metrics.span('decrypt'):
+            previous_data = self.load_previous_data()
+        rollups = None
+        risk = None
+        store = self.get_history_store()
+        if store:
+            try:
+                rollups = self.get_rollups(store)
+            except Exception as e:
+                print(f"Error loading horizon rollups: {e}")
+            if self.risk_windows:
+                try:
+                    risk = self.get_risk_series(store)
+                except Exception as e:
+                    print(f"Error loading risk series: {e}")
+        with self.metrics.span('history'):
+            trend = self.load_trend_base(days)
+        return {'previous': previous_data, 'rollups': rollups, 'risk': risk, 'trend': trend}
+
+    def analyze_with_inputs(self, inputs, current_data):
+        """(analysis, history) for current_data from load_analysis_inputs() output"""
+        with self.metrics.span('analysis'):
+            analysis = self.analyze_changes(inputs['previous'], current_data)
+            if inputs['rollups']:
+                try:
+                    analysis['horizons'] = inputs['rollups'].preview(current_data)
+                except Exception as e:
+                    print(f"Error computing horizon rollups: {e}")
+            if inputs.get('risk') is not None:
+                try:
+                    analysis['risk'] = inputs['risk'].preview(current_data, windows=self.risk_windows)
+                except Exception as e:
+                    print(f"Error computing risk metrics: {e}")
+        history = None
+        if inputs['trend'] is not None:
+            history = inputs['trend'] + [{'portfolio': {'current_value': current_data['Profile']['Networth']['CurrentNetworth']}}]
+        return analysis, history
+
+    def prepare_stored_analysis(self, day=None, days=7):
+        """
+        (analysis, history, data) for a stored day (default: the latest) compared with the stored
+        day before it; nothing is fetched. Returns None when the day is not in the history.
+        """
+        from replay import anchor_entries, horizons_from_anchors
+
+        store = self.get_history_store()
+        entries = store.daily_entries() if store else []
+        dates = [e['date'] for e in entries]
+        if not dates or (day and day not in dates):
+            return None
+        i = dates.index(day) if day else len(dates) - 1
+        # the report header shows when the snapshot was taken, as in replay.py
+        self.report_time = datetime.fromisoformat(entries[i]['timestamp'])
+        with self.metrics.span('decrypt'):
+            current_data = store.read(entries[i])
+            previous_data = store.read(entries[i - 1]) if i > 0 else None
+        with self.metrics.span('analysis'):
+            analysis = self.analyze_changes(previous_data, current_data)
+            # the 1D/WTD/MTD/YTD baselines the live run had that day, as replay.py rebuilds them
+            day = datetime.fromisoformat(dates[i]).date()
+            analysis['horizons'] = horizons_from_anchors(day, current_data, anchor_entries(entries, i), store.read)
+            if self.risk_windows:
+                analysis['risk'] = self.get_risk_series(store).summary(self.risk_windows, end=dates[i])
+        with self.metrics.span('history'):
+            window = [store.read(e) for e in entries[max(0, i - days + 1):i]] + [current_data]
+            history = [{'portfolio': {'current_value': d['Profile']['Networth']['CurrentNetworth']}} for d in window]
+        return analysis, history, current_data
+
+    def load_trend_history(self, current_data, days=7):
+        """Networth points for the sparkline: last days-1 stored snapshots plus today's"""
+        trend = self.load_trend_base(days)
+        if trend is None:
+            return None
+        return trend + [{'portfolio': {'current_value': current_data['Profile']['Networth']['CurrentNetworth']}}]
+
+    def load_trend_base(self, days=7):
+        """The stored part of the sparkline (last days-1 snapshots), or None without history"""
+        store = self.get_history_store()
+        if not store or not store.entries():
+            return None
+        try:
+            snapshots = [data for _, data in store.last(days - 1)]
+        except Exception as e:
+            print(f"Error reading history for trend: {e}")
+            return None
+        return [{'portfolio': {'current_value': d['Profile']['Networth']['CurrentNetworth']}} for d in snapshots]
+
     def generate_telegram_message(self, analysis, history=None):
         """
         Enhanced Telegram message:
         - Adds 1-line sparkline for Networth trend (last N values from history)
         - Shows ALL holdings expanded with proportional bars
+        Single string, no size limit; see iter_telegram_messages for Telegram-sized chunks.
+        """
+        parts = []
+        for title, items, sep, end in self.telegram_sections(analysis, history):
+            parts.append(title)
+            parts.append(sep.join(items))
+            parts.append(end)
+        return "".join(parts)
+
+    def iter_telegram_messages(self, analysis, history=None, max_chars=TELEGRAM_MESSAGE_LIMIT):
+        """
+        Yield the report as messages of at most max_chars (counted in UTF-16 units, like Telegram).
+        Whole sections are kept together when they fit; longer ones (the holdings list) are split
+        between items and continue under a "(cont.)" title. Chunks are produced lazily, so the
+        first one can be sent while the rest is still being rendered.
+        """
+        chunk = []
+        size = 0
+        for title, items, sep, end in self.telegram_sections(analysis, history):
+            whole = tg_len(title) + sum(tg_len(i) for i in items) + tg_len(sep) * max(len(items) - 1, 0) + tg_len(end)
+            if size + whole <= max_chars:
+                chunk.extend((title, sep.join(items), end))
+                size += whole
+                continue
+            if chunk and whole <= max_chars:
+                # start the section in a fresh message rather than splitting it
+                yield from split_oversized("".join(chunk), max_chars)
+                chunk, size = [title, sep.join(items), end], whole
+                continue
+
+            # section larger than a message: split between items
+            part_title = title
+            open_part = False
+            for item in items:
+                need = tg_len(item) + tg_len(end) + (tg_len(sep) if open_part else tg_len(part_title))
+                if chunk and size + need > max_chars:
+                    if open_part:
+                        chunk.append(end)
+                    yield from split_oversized("".join(chunk), max_chars)
+                    chunk, size, open_part = [], 0, False
+                    part_title = title.rstrip("\n") + " (cont.)\n" if title else ""
+                if open_part:
+                    chunk.append(sep)
+                    size += tg_len(sep)
+                else:
+                    chunk.append(part_title)
+                    size += tg_len(part_title)
+                    open_part = True
+                chunk.append(item)
+                size += tg_len(item)
+            if open_part:
+                chunk.append(end)
+                size += tg_len(end)
+            elif not items:
+                chunk.extend((title, end))
+                size += tg_len(title) + tg_len(end)
+        if chunk:
+            yield from split_oversized("".join(chunk), max_chars)
+
+    def telegram_sections(self, analysis, history=None):
+        """
+        The report as (title, items, separator, end) sections; a section renders as
+        title + separator.join(items) + end. Sections are generated one at a time.
         """
 
         # === helper: sparkline ===
@@ -533,8 +962,11 @@ class MyAlternatesAutomation:
                 return str(x)
 
         # === HEADER ===
-        now = datetime.now().strftime('%d-%b-%Y | %I:%M %p IST')
-        header = f"📊💼 ABAKKUS PMS DAILY PORTFOLIO SNAPSHOT\n🗓️ {now}\n" + "━" * 50 + "\n\n"
+        now = (self.report_time or datetime.now()).strftime('%d-%b-%Y | %I:%M %p IST')
+        title = "📊💼 ABAKKUS PMS DAILY PORTFOLIO SNAPSHOT"
+        if self.account_name:
+            title += f" • {self.account_name}"
+        header = f"{title}\n🗓️ {now}\n" + "━" * 50 + "\n\n"
 
         # === NETWORTH TREND (if history provided) ===
         sparkline_block = ""
@@ -568,62 +1000,134 @@ class MyAlternatesAutomation:
                 f"• Return Change: {return_change:+.2f}%\n\n"
             )
 
+        # === HORIZONS (WTD / MTD / YTD, day change is already in the summary) ===
+        horizons = analysis.get('horizons') or {}
+        horizon_lines = []
+        for name in ('WTD', 'MTD', 'YTD'):
+            h = horizons.get(name)
+            if h:
+                emoji = "📈" if h['value_change'] >= 0 else "📉"
+                horizon_lines.append(f"• {name}: {emoji} ₹{abs(h['value_change']):,.0f} ({h['value_change_pct']:+.2f}%)")
+        if horizon_lines:
+            summary += "⏱️ PERFORMANCE BY HORIZON\n" + "\n".join(horizon_lines) + "\n\n"
+
+        # === RISK & RETURN (optional, see risk_windows) ===
+        risk_lines = []
+        for name, r in (analysis.get('risk') or {}).items():
+            parts = [f"TWR {r['twr_pct']:+.2f}%"]
+            if r.get('xirr_pct') is not None:
+                parts.append(f"XIRR {r['xirr_pct']:+.1f}%")
+            elif r.get('mwr_pct') is not None:
+                parts.append(f"MWR {r['mwr_pct']:+.2f}%")
+            if r.get('volatility_pct') is not None:
+                parts.append(f"Vol {r['volatility_pct']:.1f}%")
+            parts.append(f"MaxDD {r['max_drawdown_pct']:.2f}%")
+            risk_lines.append(f"• {name}: " + " | ".join(parts))
+        if risk_lines:
+            summary += "📐 RISK & RETURN\n" + "\n".join(risk_lines) + "\n\n"
+
         # === HOLDINGS (all expanded) ===
         holdings = analysis.get('current_holdings') or analysis.get('holdings_list') or []
+        yield header, [], "", ""
         if not holdings:
-            return header + summary + "⚠️ No holdings found.\n"
+            yield summary, [], "", ""
+            yield "⚠️ No holdings found.\n", [], "", ""
+            return
+        if sparkline_block:
+            yield sparkline_block, [], "", ""
+        yield summary, [], "", ""
 
         max_weight = max((h.get('weightage', 0) for h in holdings), default=0.0)
-        holdings_lines = []
-        for i, h in enumerate(holdings, start=1):
-            company = h.get('company') or h.get('CompanyName') or "Unknown"
-            pct = h.get('weightage', 0.0)
-            value_num = h.get('value', 0.0)
-            bar = proportional_bar(pct, max_weight, length=20)
-            company_display = company if len(company) <= 36 else company[:33] + "..."
-            holdings_lines.append(
-                f"{i:2}. {company_display}\n"
-                f"    {bar} {pct:5.2f}%  • {fmt_rs(value_num)}"
-            )
-        holdings_block = "📋 FULL PORTFOLIO ALLOCATION\n" + "\n".join(holdings_lines) + "\n\n"
+
+        def holding_lines():
+            for i, h in enumerate(holdings, start=1):
+                company = h.get('company') or h.get('CompanyName') or "Unknown"
+                pct = h.get('weightage', 0.0)
+                value_num = h.get('value', 0.0)
+                bar = proportional_bar(pct, max_weight, length=20)
+                company_display = company if len(company) <= 36 else company[:33] + "..."
+                yield (
+                    f"{i:2}. {company_display}\n"
+                    f"    {bar} {pct:5.2f}%  • {fmt_rs(value_num)}"
+                )
+        yield "📋 FULL PORTFOLIO ALLOCATION\n", list(holding_lines()), "\n", "\n\n"
 
         # === MOVERS ===
-        movers_block = ""
         if not analysis.get('is_first_run', False):
             gainers = analysis.get('top_gainers', [])[:5]
             losers = analysis.get('top_losers', [])[:5]
             if gainers:
-                movers_block += "🚀 TOP GAINERS\n"
-                for g in gainers:
-                    movers_block += f"• {g.get('company')[:36]} +{g.get('value_change_pct', 0):.2f}%\n"
-                movers_block += "\n"
+                yield "🚀 TOP GAINERS\n", [
+                    f"• {g.get('company')[:36]} +{g.get('value_change_pct', 0):.2f}%\n" for g in gainers
+                ], "", "\n"
             if losers:
-                movers_block += "⚠️ TOP LOSERS\n"
-                for l in losers:
-                    movers_block += f"• {l.get('company')[:36]} {l.get('value_change_pct', 0):.2f}%\n"
-                movers_block += "\n"
+                yield "⚠️ TOP LOSERS\n", [
+                    f"• {l.get('company')[:36]} {l.get('value_change_pct', 0):.2f}%\n" for l in losers
+                ], "", "\n"
 
-        exits_block = ""
-        if not analysis.get('is_first_run', False):
             exits = analysis.get('removed_stocks', [])
             if exits:
-                exits_block = "🗑️ COMPLETELY EXITED STOCKS\n"
-                for e in exits:
-                    exits_block += (
-                        f"• {e.get('company')[:36]} "
-                        f"(was {e.get('weightage', 0):.2f}% • {fmt_rs(e.get('value', 0))})\n"
-                    )
-                exits_block += "\n"
+                yield "🗑️ COMPLETELY EXITED STOCKS\n", [
+                    f"• {e.get('company')[:36]} "
+                    f"(was {e.get('weightage', 0):.2f}% • {fmt_rs(e.get('value', 0))})\n"
+                    for e in exits
+                ], "", "\n"
 
         # === FOOTER ===
         footer = (
             f"📱 Total Holdings: {len(holdings)}\n"
             f"🔔 Next Update: Tomorrow 9 PM IST\n"
         )
-
-        return header + sparkline_block + summary + holdings_block + movers_block + exits_block + footer
+        yield footer, [], "", ""
+
+
+def create_chrome_driver(headless=True):
+    """Start Chrome with the options the login flow expects"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+
+    # Add user agent to avoid detection
+    chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.implicitly_wait(10)
+    return driver
+
+
+def tg_len(text):
+    """Message length as Telegram counts it (UTF-16 code units, so most emoji count as 2)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_oversized(text, max_chars):
+    """Last-resort split of a single piece that alone exceeds the limit (yields text unchanged otherwise)"""
+    if tg_len(text) <= max_chars:
+        yield text
+        return
+    piece = []
+    size = 0
+    for ch in text:
+        n = tg_len(ch)
+        if size + n > max_chars:
+            yield "".join(piece)
+            piece, size = [], 0
+        piece.append(ch)
+        size += n
+    if piece:
+        yield "".join(piece)
 
 def send_message(api_id, api_hash, recipient, session_string, msg):
+    from telethon.sync import TelegramClient
+    from telethon.sessions import StringSession
+
     # Connect to Telegram
     client = TelegramClient(StringSession(session_string), api_id, api_hash)
     client.connect()
@@ -632,6 +1136,9 @@ def send_message(api_id, api_hash, recipient, session_string, msg):
     print("Telegram message sent!")
 
 def get_session(api_id, api_hash):
+    from telethon.sync import TelegramClient
+    from telethon.sessions import StringSession
+
     client = TelegramClient('telegram_session', api_id, api_hash)
     client.start()
 
@@ -643,7 +1150,10 @@ def get_session(api_id, api_hash):
     else:
         print("Session file not authorized. Use the first method.")
 
-def main(user_name_cred, pwd_cred, api_id, api_hash, session_string, recipients, login_url, session_api_url, investor_api_url):
+def main(user_name_cred, pwd_cred, api_id, api_hash, session_string, recipients, login_url, session_api_url, investor_api_url,
+         login_backend="selenium", on_unchanged="notice", extra_api_urls=None, risk_windows=()):
+    from telegram_broadcast import TelegramBroadcaster
+
     # Configuration
     # Create automation instance
     automation = MyAlternatesAutomation(
@@ -652,43 +1162,98 @@ def main(user_name_cred, pwd_cred, api_id, api_hash, session_string, recipients,
         login_url=login_url,
         session_api_url=session_api_url,
         investor_api_url=investor_api_url,
-        headless=True
+        headless=True,
+        login_backend=login_backend
     )
-    # Run the complete flow
-    results = automation.run_full_automation()
-    if results:
-        print("\n" + "="*50)
-        print("AUTOMATION COMPLETED SUCCESSFULLY")
-        print("="*50)
-
-        # Session API response redacted for security
-        if results['investor_api']:
-            # Investor API response redacted for security
-            previous_data = automation.load_previous_data()
-            analysis = automation.analyze_changes(previous_data, results['investor_api'])
-            message = automation.generate_telegram_message(analysis)
-            # Message content redacted for security
-            for recipient in recipients:
-                send_message(api_id, api_hash, recipient, session_string, message)
-            automation.save_current_data(results['investor_api'])
-    else:
-        print("Automation failed!")
-
-if __name__ == "__main__":
-    api_id_cred = int(os.environ.get('API_ID', 0))
-    api_hash_cred = os.environ.get('API_HASH', '')
-    session = os.environ.get('SESSION_STRING', '')
+    automation.on_unchanged = on_unchanged
+    automation.extra_api_urls = extra_api_urls or {}
+    automation.risk_windows = tuple(risk_windows or ())
+    broadcaster = TelegramBroadcaster(api_id, api_hash, session_string)
+    return run_once(automation, broadcaster, recipients)
+
+
+def run_once(automation, broadcaster, recipients, metrics_name="portfolio_tracker"):
+    """One fetch -> analyze -> send -> save run; exports the run metrics and returns the outcome"""
+    from pipeline import StageSkipped, run_daily
+
+    metrics = automation.metrics
+    try:
+        # Login, history decryption and the Telegram connection run concurrently; the snapshot
+        # is saved while the report is being sent (see pipeline.daily_pipeline)
+        results, errors = run_daily(automation, broadcaster, recipients)
+        for stage, error in errors.items():
+            print(f"Stage {stage} failed: {error}")
+        prepared = results.get('prepare')
+        if prepared:
+            print("\n" + "="*50)
+            print("AUTOMATION COMPLETED SUCCESSFULLY")
+            print("="*50)
+        else:
+            print("Automation failed!")
+        delivery = results.get('telegram') or []
+        record_delivery(metrics, delivery)
+        if errors:
+            metrics.set_outcome('error')
+            # report the stage that actually failed rather than one it caused to be skipped
+            raise next((e for e in errors.values() if not isinstance(e, StageSkipped)), next(iter(errors.values())))
+        if not prepared:
+            metrics.set_outcome('fetch_failed')
+        elif prepared['unchanged']:
+            metrics.set_outcome('unchanged')
+        elif prepared.get('quiet'):
+            metrics.set_outcome('below_threshold')
+        else:
+            metrics.set_outcome('success' if all(r['ok'] for r in delivery) else 'partial')
+    except Exception:
+        metrics.set_outcome('error')
+        raise
+    finally:
+        metrics.export(os.environ.get('METRICS_DIR', 'metrics'), name=metrics_name)
+    return metrics.outcome
+
+
+def record_delivery(metrics, delivery):
+    """Counters for a TelegramBroadcaster result list"""
+    metrics.count('telegram_recipients', len(delivery))
+    metrics.count('telegram_failures', sum(1 for r in delivery if not r['ok']))
+    metrics.count('telegram_retries', sum(r['attempts'] - 1 for r in delivery))
+
+def parse_extra_api_urls(value):
+    """"transactions=https://...,nav=https://..." -> {name: url}"""
+    urls = {}
+    for item in value.split(','):
+        name, sep, url = item.partition('=')
+        if sep and name.strip() and url.strip():
+            urls[name.strip()] = url.strip()
+    return urls
+
+def parse_risk_windows(value):
+    """"1M,YTD,1Y" -> ('1M', 'YTD', '1Y'); names as in risk_metrics.WINDOWS"""
+    return tuple(w.strip().upper() for w in value.split(',') if w.strip())
+
+def config_from_env():
+    """main() keyword arguments from the environment (GitHub Secrets / vars or a local shell)"""
     recipients_str = os.environ.get('RECIPIENT_IDS', '')
     # ajay_id = os.environ.get('AJAY_ID', '')
     recipients = [int(r.strip()) for r in recipients_str.split(',') if r.strip()]
     # recipients.append(ajay_id)
-    user_name = os.environ.get('PMS_USERNAME', '')
-    pwd = os.environ.get('PMS_PWD', '')
-    
-    # URL configuration from environment variables
-    login_url = os.environ.get('LOGIN_URL', '')
-    session_api_url = os.environ.get('SESSION_API_URL', '')
-    investor_api_url = os.environ.get('INVESTOR_API_URL', '')
+    return {
+        'user_name_cred': os.environ.get('PMS_USERNAME', ''),
+        'pwd_cred': os.environ.get('PMS_PWD', ''),
+        'api_id': int(os.environ.get('API_ID', 0)),
+        'api_hash': os.environ.get('API_HASH', ''),
+        'session_string': os.environ.get('SESSION_STRING', ''),
+        'recipients': recipients,
+        # URL configuration from environment variables
+        'login_url': os.environ.get('LOGIN_URL', ''),
+        'session_api_url': os.environ.get('SESSION_API_URL', ''),
+        'investor_api_url': os.environ.get('INVESTOR_API_URL', ''),
+        'login_backend': os.environ.get('LOGIN_BACKEND', 'selenium'),
+        'on_unchanged': os.environ.get('ON_UNCHANGED', 'notice'),
+        'extra_api_urls': parse_extra_api_urls(os.environ.get('EXTRA_API_URLS', '')),
+        'risk_windows': parse_risk_windows(os.environ.get('RISK_WINDOWS', ''))
+    }
 
+if __name__ == "__main__":
     # Credentials and session data redacted for security
-    main(user_name, pwd, api_id_cred, api_hash_cred, session, recipients, login_url, session_api_url, investor_api_url)
+    main(**config_from_env())
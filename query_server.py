@@ -0,0 +1,332 @@
+"""
+Local read-only HTTP query service over the encrypted snapshot history.
+
+    python query_server.py [--port 8765]        # or: python cli.py serve
+    curl 'http://127.0.0.1:8765/diff?start=2024-03-01&end=2024-03-28'
+
+The history is decrypted once and kept in memory together with a SnapshotMatrix; computed
+responses are cached in an LRU keyed by endpoint and date range, so repeated dashboard queries
+are answered without decrypting or recomputing anything. When another process appends to the
+history the index changes on disk and the in-memory views are rebuilt on the next request.
+
+Endpoints (GET, JSON): /dates, /snapshot?date=, /diff?start=&end=, /holding?isin=&start=&end=,
+/sectors?date= (or start= & end= for the change), /networth?start=&end=, /risk?start=&end=,
+/stats. Dates are YYYY-MM-DD; a date without a snapshot resolves to the last stored day before it.
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+CACHE_SIZE = 256
+# decoded snapshots kept in the history store's own cache
+HISTORY_CACHE_DAYS = 4096
+
+
+class QueryError(Exception):
+    """A request that cannot be answered; carries the HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryService:
+    """
+    In-memory analytics over one account's history. Every public method returns plain JSON-able
+    data; results of the range queries are memoized in an LRU of `cache_size` entries keyed by
+    (endpoint, resolved start date, resolved end date, extra arguments).
+    """
+
+    def __init__(self, automation, cache_size=CACHE_SIZE):
+        self.automation = automation
+        automation.history_cache_size = max(automation.history_cache_size, HISTORY_CACHE_DAYS)
+        self.store = automation.get_history_store()
+        if not self.store:
+            raise ValueError("FERNET_KEY is required to read the history")
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._index_version = None
+        self._entries = []
+        self._dates = []
+        self._positions = {}
+        self._matrix = None
+        self._sector_exposure = None
+        self._risk = None
+
+    # --- state ---------------------------------------------------------------------------------
+
+    def refresh(self):
+        """Drop the in-memory views when the history index or the security master changed on disk"""
+        try:
+            stat = os.stat(self.store.index_path)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            version = None
+        master = self.store.master
+        if master:
+            # new securities (and aliases, which move matrix rows) come with the daily append
+            master.refresh()
+            version = (version, tuple(sorted(master.stats().items())))
+        with self._lock:
+            if version == self._index_version and self._index_version is not None:
+                return
+            self.store.refresh()
+            self._entries = self.store.daily_entries()
+            self._dates = [e['date'] for e in self._entries]
+            self._positions = {d: i for i, d in enumerate(self._dates)}
+            self._matrix = None
+            self._sector_exposure = None
+            self._risk = None
+            self._cache.clear()
+            self._index_version = version
+
+    def matrix(self):
+        from snapshot_matrix import SnapshotMatrix
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = SnapshotMatrix.from_snapshots(
+                    [(e['date'], self.store.read(e)) for e in self._entries], master=self.store.master)
+            return self._matrix
+
+    def sector_exposure(self):
+        """ExposureEngine by sector over every holding (not only equities), built on first use"""
+        from exposure import ExposureEngine
+        from snapshot_matrix import SnapshotMatrix
+
+        with self._lock:
+            if self._sector_exposure is None:
+                matrix = SnapshotMatrix.from_snapshots(
+                    [(e['date'], self.store.read(e)) for e in self._entries], security_type=None,
+                    master=self.store.master)
+                self._sector_exposure = ExposureEngine(matrix, by='sector')
+            return self._sector_exposure
+
+    def risk_series(self):
+        with self._lock:
+            if self._risk is None:
+                self._risk = self.automation.get_risk_series(self.store)
+            return self._risk
+
+    def resolve(self, day, default=-1):
+        """The stored date on or before `day` (default: the latest / first with default=0)"""
+        if not self._dates:
+            raise QueryError(404, "history is empty")
+        if not day:
+            return self._dates[default]
+        i = bisect.bisect_right(self._dates, day) - 1
+        if i < 0:
+            raise QueryError(404, f"no snapshot on or before {day}")
+        return self._dates[i]
+
+    def snapshot_for(self, day):
+        return self.store.read(self._entries[self._positions[day]])
+
+    def cached(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        result = compute()
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    # --- queries -------------------------------------------------------------------------------
+
+    def dates(self):
+        return {'dates': list(self._dates)}
+
+    def snapshot(self, date=None):
+        day = self.resolve(date)
+        return {'date': day, 'snapshot': self.snapshot_for(day)}
+
+    def diff(self, start=None, end=None, top=5):
+        start, end = self.resolve(start, 0), self.resolve(end)
+        return self.cached(('diff', start, end, top), lambda: self.matrix().diff(start, end, top=top))
+
+    def holding(self, isin, start=None, end=None):
+        start, end = self.resolve(start, 0), self.resolve(end)
+
+        def compute():
+            matrix = self.matrix()
+            canonical = self.store.master.canonical_isin(isin) if self.store.master else isin
+            i = matrix.isin_index.get(canonical)
+            if i is None:
+                raise QueryError(404, f"{isin} was never held")
+            t0, t1 = matrix.column(start), matrix.column(end) + 1
+            value, weight = matrix.value[i, t0:t1], matrix.weight[i, t0:t1]
+            return {
+                'isin': canonical,
+                'company': matrix.meta['company'][i],
+                'sector': matrix.meta['sector'][i],
+                'dates': matrix.dates[t0:t1],
+                'value': [None if v != v else float(v) for v in value],
+                'weight': [None if w != w else float(w) for w in weight]
+            }
+        return self.cached(('holding', start, end, isin), compute)
+
+    def sector_breakdown(self, day):
+        def compute():
+            groups = self.sector_exposure().exposure(day)
+            return {g['group']: {'value': g['value'], 'weight': g['weight'], 'holdings': g['holdings']}
+                    for g in sorted(groups, key=lambda g: -g['value'])}
+        return self.cached(('sectors', day, day), compute)
+
+    def sectors(self, date=None, start=None, end=None):
+        if not start:
+            day = self.resolve(date)
+            return {'date': day, 'sectors': self.sector_breakdown(day)}
+        start, end = self.resolve(start, 0), self.resolve(end)
+
+        def compute():
+            before, after = self.sector_breakdown(start), self.sector_breakdown(end)
+            change = {}
+            for name in set(before) | set(after):
+                b = before.get(name, {'value': 0.0, 'weight': 0.0})
+                a = after.get(name, {'value': 0.0, 'weight': 0.0})
+                change[name] = {'value_change': a['value'] - b['value'], 'weight_change': a['weight'] - b['weight']}
+            return {'start': start, 'end': end, 'sectors': after,
+                    'change': dict(sorted(change.items(), key=lambda item: -item[1]['value_change']))}
+        return self.cached(('sector_change', start, end), compute)
+
+    def networth(self, start=None, end=None):
+        start, end = self.resolve(start, 0), self.resolve(end)
+
+        def compute():
+            matrix = self.matrix()
+            t0, t1 = matrix.column(start), matrix.column(end) + 1
+            return {'dates': matrix.dates[t0:t1], 'networth': matrix.networth[t0:t1].tolist(),
+                    'return': matrix.total_return[t0:t1].tolist()}
+        return self.cached(('networth', start, end), compute)
+
+    def risk(self, start=None, end=None):
+        start, end = self.resolve(start, 0), self.resolve(end)
+        return self.cached(('risk', start, end), lambda: self.risk_series().metrics(start, end))
+
+    def stats(self):
+        with self._lock:
+            return {'days': len(self._dates), 'cached': len(self._cache), 'cache_size': self.cache_size,
+                    'hits': self.hits, 'misses': self.misses}
+
+    # path -> (method, query parameters, required parameters)
+    ROUTES = {
+        '/dates': (dates, (), ()),
+        '/snapshot': (snapshot, ('date',), ()),
+        '/diff': (diff, ('start', 'end'), ()),
+        '/holding': (holding, ('isin', 'start', 'end'), ('isin',)),
+        '/sectors': (sectors, ('date', 'start', 'end'), ()),
+        '/networth': (networth, ('start', 'end'), ()),
+        '/risk': (risk, ('start', 'end'), ()),
+        '/stats': (stats, (), ())
+    }
+
+    def handle(self, path, query):
+        """(status, body) for a GET path and its parsed query string"""
+        route = self.ROUTES.get(path.rstrip('/') or '/')
+        if route is None:
+            return 404, {'error': f"unknown endpoint {path}", 'endpoints': sorted(self.ROUTES)}
+        method, params, required = route
+        args = {p: query[p][-1] for p in params if query.get(p)}
+        missing = [p for p in required if p not in args]
+        if missing:
+            return 400, {'error': f"missing parameter: {', '.join(missing)}"}
+        try:
+            self.refresh()
+            return 200, method(self, **args)
+        except QueryError as e:
+            return e.status, {'error': str(e)}
+        except KeyError as e:
+            return 404, {'error': f"not found: {e}"}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            print(f"Query {path} failed: {type(e).__name__}: {e}")
+            return 500, {'error': f"internal error: {type(e).__name__}"}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service = None
+    verbose = False
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        status, body = self.service.handle(url.path, parse_qs(url.query))
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Server-Timing", f"app;dur={(time.perf_counter() - started) * 1000:.2f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_only(self):
+        self.send_error(405, "read-only service")
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = _read_only
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    handler = type("BoundQueryHandler", (QueryHandler,), {'service': service, 'verbose': verbose})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve read-only queries over the snapshot history")
+    parser.add_argument("--host", default=os.environ.get('QUERY_HOST', DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('QUERY_PORT', DEFAULT_PORT)))
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="cached query results")
+    parser.add_argument("--account", help="serve this PMS_ACCOUNTS entry instead of the default history")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    if args.account:
+        from batch import load_accounts, make_automation
+
+        accounts = [a for a in load_accounts(os.environ.get('PMS_ACCOUNTS', 'accounts.json'))
+                    if a['name'] == args.account]
+        if not accounts:
+            raise SystemExit(f"No account named {args.account}")
+        automation = make_automation(accounts[0])
+    else:
+        from cli import make_automation
+
+        automation = make_automation()
+    service = QueryService(automation, args.cache_size)
+    service.refresh()
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"Serving {service.stats()['days']} days of {service.store.path} on "
+          f"http://{args.host}:{server.server_address[1]}/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
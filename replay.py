@@ -0,0 +1,286 @@
+"""
+Offline replay / backfill: recompute the analysis and the rendered Telegram report for stored
+days, without the PMS site or Telegram.
+
+    python replay.py --start 2024-01-01 --end 2024-03-31 --output replay/
+    PMS_ACCOUNTS=accounts.json python replay.py --accounts --workers 8
+
+Each day is analyzed against the stored day before it, with the same 7-day trend and
+WTD/MTD/YTD horizon anchors a live run on that day would have had. Days are decrypted and
+rendered on a process pool. Results are cached (encrypted) per account, keyed by the
+fingerprints of the snapshot pair plus the trend / anchor snapshots and a hash of the report
+code, so re-running only recomputes days whose inputs or logic changed.
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from horizons import HORIZONS, HorizonRollups, compact_snapshot, period_key
+from snapshot_format import encode_snapshot, decode_snapshot
+
+TREND_DAYS = 7
+DAYS_PER_TASK = 16
+# everything on the decode -> analyze -> render path of a replayed day, this module included
+REPORT_MODULES = ("replay", "portfolio_tracker", "portfolio_model", "horizons", "risk_metrics",
+                  "snapshot_format", "security_master")
+
+
+def logic_version():
+    """Hash of the modules that produce analyses and reports; a change invalidates the cache"""
+    digest = hashlib.sha256()
+    for name in REPORT_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def anchor_entries(entries, i):
+    """
+    Horizon anchors for entries[i], as HorizonRollups would hold them after replaying
+    entries[:i]: the last stored day before the current period, else the first stored day.
+    """
+    day = date.fromisoformat(entries[i]['date'])
+    anchors = {}
+    for horizon in HORIZONS:
+        period = period_key(horizon, day)
+        anchor = entries[0]
+        for e in reversed(entries[:i]):
+            if period_key(horizon, date.fromisoformat(e['date'])) != period:
+                anchor = e
+                break
+        anchors[horizon] = anchor
+    return anchors
+
+
+def horizons_from_anchors(day, current, anchors, read):
+    """HorizonRollups summary for `current` on `day` against {horizon: anchor entry} (anchor_entries)"""
+    state = {'last': compact_snapshot(day, current), 'anchors': {}}
+    for horizon, entry in anchors.items():
+        anchor_day = date.fromisoformat(entry['date'])
+        state['anchors'][horizon] = dict(compact_snapshot(anchor_day, read(entry)), period=period_key(horizon, day))
+    return HorizonRollups.summarize(state)
+
+
+class ReplayCache:
+    """{key: result} for one account, Fernet-encrypted; discarded when the report code changes"""
+
+    def __init__(self, fernet, path, version):
+        self.fernet = fernet
+        self.path = path
+        self.version = version
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as fh:
+                state = decode_snapshot(self.fernet.decrypt(fh.read()))
+            if state.get('version') == self.version:
+                self.entries = state['entries']
+        except Exception as e:
+            print(f"Ignoring replay cache {self.path}: {e}")
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(self.fernet.encrypt(encode_snapshot({'version': self.version, 'entries': self.entries})))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+class ReplayEngine:
+    """Plans and caches the replay of one account's history store"""
+
+    def __init__(self, automation, cache_file=None, trend_days=TREND_DAYS):
+        self.automation = automation
+        self.store = automation.get_history_store()
+        if not self.store:
+            raise ValueError("FERNET_KEY is required to replay the history")
+        self.trend_days = trend_days
+        self.version = logic_version()
+        if cache_file is None:
+            cache_file = os.path.splitext(self.store.path)[0].replace("portfolio_history", "replay_cache", 1) + ".enc"
+        self.cache = ReplayCache(self.store.fernet, cache_file, self.version)
+        self.cache.load()
+        # the risk series covers every stored day, so each day's windows are a cheap slice of it
+        self.risk = automation.get_risk_series(self.store) if automation.risk_windows else None
+
+    def cache_key(self, job):
+        fingerprints = [
+            job['current'].get('fingerprint'),
+            job['previous'].get('fingerprint') if job['previous'] else None,
+            [e.get('fingerprint') for e in job['window']],
+            {h: e.get('fingerprint') for h, e in job['anchors'].items()}
+        ]
+        # entries written before fingerprints existed are identified by their position instead
+        if any(e.get('fingerprint') is None for e in [job['current']] + job['window']):
+            fingerprints.append([job['current']['offset'], job['current']['length']])
+        payload = json.dumps([self.version, self.automation.account_name, self.automation.message_max_chars,
+                              fingerprints, job.get('risk')], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def plan(self, start=None, end=None):
+        """One job per stored day in [start, end] (inclusive YYYY-MM-DD)"""
+        entries = self.store.daily_entries()
+        jobs = []
+        for i, entry in enumerate(entries):
+            if (start and entry['date'] < start) or (end and entry['date'] > end):
+                continue
+            job = {
+                'date': entry['date'],
+                'current': entry,
+                'previous': entries[i - 1] if i > 0 else None,
+                # the live trend is the last TREND_DAYS-1 stored days plus the current payload
+                'window': entries[max(0, i - self.trend_days + 1):i],
+                'anchors': anchor_entries(entries, i)
+            }
+            if self.risk is not None:
+                job['risk'] = self.risk.summary(self.automation.risk_windows, end=entry['date'])
+            job['key'] = self.cache_key(job)
+            jobs.append(job)
+        return jobs
+
+    def task_args(self, jobs):
+        a = self.automation
+        return (self.store.path, self.store.index_path, a.account_name, a.message_max_chars, jobs,
+                a.security_master_file)
+
+
+def replay_days(history_path, index_path, account_name, max_chars, jobs, master_path=None):
+    """Process-pool worker: decrypt, analyze and render a run of consecutive days"""
+    from history_store import HistoryStore
+    from portfolio_tracker import MyAlternatesAutomation
+
+    automation = MyAlternatesAutomation('', '', '', '', '')
+    automation.account_name = account_name
+    automation.security_master_file = master_path
+    fernet = automation.make_fernet()
+    store = HistoryStore(fernet, history_path, index_path, master=automation.get_security_master())
+    decoded = {}
+
+    def read(entry):
+        # consecutive days share most of their trend window; decrypt each segment once
+        if entry['offset'] not in decoded:
+            decoded[entry['offset']] = store.read(entry)
+        return decoded[entry['offset']]
+
+    results = []
+    for job in jobs:
+        current = read(job['current'])
+        previous = read(job['previous']) if job['previous'] else None
+        analysis = automation.analyze_changes(previous, current)
+        analysis['horizons'] = horizons_from_anchors(date.fromisoformat(job['date']), current, job['anchors'], read)
+        if job.get('risk') is not None:
+            analysis['risk'] = job['risk']
+        window = [read(e) for e in job['window']] + [current]
+        history = [{'portfolio': {'current_value': d['Profile']['Networth']['CurrentNetworth']}} for d in window]
+        automation.report_time = datetime.fromisoformat(job['current']['timestamp'])
+        messages = list(automation.iter_telegram_messages(analysis, history, max_chars))
+        results.append((job['key'], {'date': job['date'], 'analysis': analysis, 'messages': messages}))
+    return results
+
+
+def backfill(automations, start=None, end=None, workers=None, use_cache=True):
+    """
+    Replay [start, end] for every automation (one per account) on a shared process pool.
+    Returns ({account: {date: result}}, stats).
+    """
+    started = time.perf_counter()
+    engines = [ReplayEngine(a) for a in automations]
+    output = {}
+    pending = []
+    stats = {'days': 0, 'cached': 0, 'computed': 0}
+    for engine in engines:
+        name = engine.automation.account_name or "default"
+        output[name] = {}
+        todo = []
+        for job in engine.plan(start, end):
+            stats['days'] += 1
+            hit = engine.cache.get(job['key']) if use_cache else None
+            if hit:
+                output[name][job['date']] = dict(hit, cached=True)
+                stats['cached'] += 1
+            else:
+                todo.append(job)
+        for i in range(0, len(todo), DAYS_PER_TASK):
+            pending.append((engine, name, todo[i:i + DAYS_PER_TASK]))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(engine, name, pool.submit(replay_days, *engine.task_args(jobs)))
+                       for engine, name, jobs in pending]
+            for engine, name, future in futures:
+                for key, result in future.result():
+                    engine.cache.put(key, result)
+                    output[name][result['date']] = dict(result, cached=False)
+                    stats['computed'] += 1
+    for engine in engines:
+        engine.cache.save()
+    for name in output:
+        output[name] = dict(sorted(output[name].items()))
+    stats['seconds'] = time.perf_counter() - started
+    return output, stats
+
+
+def write_reports(output, directory):
+    """<dir>/<account>/<date>.txt (rendered chunks) and <date>.json (analysis)"""
+    from batch import account_slug
+
+    for name, days in output.items():
+        account_dir = os.path.join(directory, account_slug(name))
+        os.makedirs(account_dir, exist_ok=True)
+        for day, result in days.items():
+            with open(os.path.join(account_dir, f"{day}.txt"), "w", encoding="utf-8") as f:
+                f.write("\n\n".join(result['messages']))
+            with open(os.path.join(account_dir, f"{day}.json"), "w", encoding="utf-8") as f:
+                json.dump(result['analysis'], f, indent=2, ensure_ascii=False, default=str)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute reports from stored snapshots")
+    parser.add_argument("--start", help="first day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last day (YYYY-MM-DD)")
+    parser.add_argument("--accounts", action="store_true", help="replay every account in PMS_ACCOUNTS")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--output", help="write the reports and analyses to this directory")
+    parser.add_argument("--no-cache", action="store_true", help="recompute every day")
+    args = parser.parse_args(argv)
+
+    if args.accounts:
+        from batch import load_accounts, make_automation
+
+        automations = [make_automation(a) for a in load_accounts(os.environ.get('PMS_ACCOUNTS', 'accounts.json'))]
+    else:
+        from cli import make_automation
+
+        automations = [make_automation()]
+
+    output, stats = backfill(automations, args.start, args.end, args.workers, use_cache=not args.no_cache)
+    if args.output:
+        write_reports(output, args.output)
+    for name, days in output.items():
+        print(f"{name}: {len(days)} days")
+    print(f"Replayed {stats['days']} days ({stats['cached']} cached, {stats['computed']} computed) "
+          f"in {stats['seconds']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
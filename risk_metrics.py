@@ -0,0 +1,345 @@
+import os
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from cryptography.fernet import InvalidToken
+
+from snapshot_format import encode_snapshot, decode_snapshot
+
+# window -> calendar days back from the last date (YTD / ALL are resolved separately)
+WINDOW_DAYS = {'1M': 30, '3M': 91, '6M': 182, '1Y': 365}
+WINDOWS = ('1M', '3M', '6M', 'YTD', '1Y', 'ALL')
+TRADING_DAYS = 252
+CACHE_SIZE = 128
+
+
+def xirr(day_offsets, amounts, guess=0.1, tol=1e-9, max_iter=50):
+    """
+    Annualized money-weighted return of cash flows (negative = paid in) at day offsets, or None.
+    Newton's method on the vectorized NPV, falling back to bisection when it does not converge.
+    """
+    years = np.asarray(day_offsets, dtype=float) / 365.0
+    amounts = np.asarray(amounts, dtype=float)
+    if years.size < 2 or years[-1] - years[0] <= 0 or not (amounts > 0).any() or not (amounts < 0).any():
+        return None
+
+    def npv(rate):
+        return float(np.sum(amounts * (1.0 + rate) ** -years))
+
+    rate = guess
+    for _ in range(max_iter):
+        discount = (1.0 + rate) ** -years
+        value = float(np.sum(amounts * discount))
+        slope = float(np.sum(-years * amounts * discount / (1.0 + rate)))
+        if slope == 0 or not np.isfinite(value):
+            break
+        step = value / slope
+        rate = max(rate - step, -0.9999)
+        if abs(step) < tol:
+            return rate
+    low, high = -0.9999, 1e3
+    f_low = npv(low)
+    if not np.isfinite(f_low) or f_low * npv(high) > 0:
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        f_mid = npv(mid)
+        if abs(f_mid) < tol or high - low < tol:
+            return mid
+        if f_low * f_mid < 0:
+            high = mid
+        else:
+            low, f_low = mid, f_mid
+    return (low + high) / 2
+
+
+class RiskSeries:
+    """
+    Daily NumPy series of CurrentNetworth, InvestedAmount and per-holding PortfolioValue (holding x
+    date, NaN when not held) for time-weighted return, XIRR, volatility, maximum drawdown and
+    per-holding contribution over any window.
+
+    Changes in InvestedAmount are treated as external cash flows at the end of the day they appear,
+    so TWR and drawdown measure the portfolio rather than deposits. append() adds one day in O(holdings)
+    (arrays grow by doubling; a second snapshot on the same date replaces it) and keeps a running
+    growth index, so TWR over a window is a ratio of two entries. Window results are cached by
+    (start, end) index; appending never invalidates earlier windows. Fernet-encrypted on disk.
+    """
+
+    def __init__(self, fernet, path="portfolio_risk.enc"):
+        self.fernet = fernet
+        self.path = path
+        self.dates = []
+        self.isins = []
+        self.names = []
+        self.isin_index = {}
+        self._ordinals = np.zeros(0, dtype=np.int64)
+        self._networth = np.zeros(0)
+        self._invested = np.zeros(0)
+        self._growth = np.zeros(0)
+        self._values = np.full((0, 0), np.nan)
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.dates)
+
+    # --- storage -------------------------------------------------------------------------------
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as fh:
+                state = decode_snapshot(self.fernet.decrypt(fh.read()))
+        except InvalidToken:
+            print(f"Decryption failed for {self.path} - risk series will be rebuilt.")
+            return False
+        except Exception as e:
+            print(f"Error reading {self.path}: {e}")
+            return False
+        n = len(state['dates'])
+        self.__init__(self.fernet, self.path)
+        self.dates = list(state['dates'])
+        self.isins = list(state['isins'])
+        self.names = list(state['names'])
+        self.isin_index = {isin: i for i, isin in enumerate(self.isins)}
+        self._ordinals = np.array([date.fromisoformat(d).toordinal() for d in self.dates], dtype=np.int64)
+        self._networth = np.asarray(state['networth'], dtype=float)
+        self._invested = np.asarray(state['invested'], dtype=float)
+        self._values = np.full((len(self.isins), n), np.nan)
+        rows, cols, values = state['cells']
+        if rows:
+            self._values[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = values
+        self._growth = self._growth_index(self._networth, self._invested)
+        return True
+
+    def save(self):
+        n = len(self.dates)
+        values = self._values[:len(self.isins), :n]
+        rows, cols = np.nonzero(~np.isnan(values))
+        state = {
+            'version': 1,
+            'dates': self.dates,
+            'networth': self._networth[:n].tolist(),
+            'invested': self._invested[:n].tolist(),
+            'isins': self.isins,
+            'names': self.names,
+            # held cells only, as parallel holding index / date index / value lists
+            'cells': [rows.tolist(), cols.tolist(), values[rows, cols].tolist()]
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(self.fernet.encrypt(encode_snapshot(state)))
+        os.replace(tmp_path, self.path)
+
+    def rebuild(self, store):
+        """Recompute from every stored day (one-off, when no risk file exists yet)"""
+        self.__init__(self.fernet, self.path)
+        for entry in store.daily_entries():
+            self.append(date.fromisoformat(entry['date']), store.read(entry))
+
+    # --- incremental update --------------------------------------------------------------------
+
+    @staticmethod
+    def _growth_index(networth, invested):
+        """Cumulative time-weighted growth: g[t] = g[t-1] * (networth[t] - flow[t]) / networth[t-1]"""
+        growth = np.ones(len(networth))
+        if len(networth) > 1:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                factors = (networth[1:] - np.diff(invested)) / networth[:-1]
+            growth[1:] = np.cumprod(np.where(np.isfinite(factors), factors, 1.0))
+        return growth
+
+    def _reserve(self, rows, cols):
+        cap_rows, cap_cols = self._values.shape
+        if rows <= cap_rows and cols <= len(self._networth):
+            return
+        new_cols = len(self._networth)
+        if cols > new_cols:
+            new_cols = max(cols, 2 * new_cols, 16)
+            for name in ('_ordinals', '_networth', '_invested', '_growth'):
+                old = getattr(self, name)
+                grown = np.zeros(new_cols, dtype=old.dtype)
+                grown[:len(old)] = old
+                setattr(self, name, grown)
+        new_rows = max(rows, 2 * cap_rows, 16) if rows > cap_rows else cap_rows
+        values = np.full((new_rows, new_cols), np.nan)
+        values[:cap_rows, :cap_cols] = self._values
+        self._values = values
+
+    def append(self, day, data):
+        """Add (or replace) the snapshot for `day`; days must not go backwards"""
+        key = day.isoformat()
+        n = len(self.dates)
+        if n and key < self.dates[-1]:
+            raise ValueError(f"Snapshot for {key} is older than the last one ({self.dates[-1]})")
+        t = n - 1 if n and key == self.dates[-1] else n
+        networth = data['Profile']['Networth']
+        holdings = data['Profile']['Holdings']
+        new = [h['ISIN'] for h in holdings if h['ISIN'] not in self.isin_index]
+        self._reserve(len(self.isins) + len(new), t + 1)
+        for h in holdings:
+            i = self.isin_index.get(h['ISIN'])
+            if i is None:
+                i = self.isin_index[h['ISIN']] = len(self.isins)
+                self.isins.append(h['ISIN'])
+                self.names.append(h['CompanyName'])
+            else:
+                self.names[i] = h['CompanyName']
+        if t == n:
+            self.dates.append(key)
+        else:
+            # cached windows ending on the replaced day are stale
+            for k in [k for k in self._cache if k[1] >= t]:
+                del self._cache[k]
+        self._ordinals[t] = day.toordinal()
+        self._networth[t] = networth['CurrentNetworth']
+        # without InvestedAmount every change counts as performance (no flows)
+        invested = networth.get('InvestedAmount')
+        self._invested[t] = invested if invested is not None else (self._invested[t - 1] if t else 0.0)
+        column = self._values[:, t]
+        column[:] = np.nan
+        for h in holdings:
+            column[self.isin_index[h['ISIN']]] = h['PortfolioValue']
+        if t == 0:
+            self._growth[t] = 1.0
+        else:
+            flow = self._invested[t] - self._invested[t - 1]
+            previous = self._networth[t - 1]
+            factor = (self._networth[t] - flow) / previous if previous else 1.0
+            self._growth[t] = self._growth[t - 1] * factor
+
+    def update(self, day, data):
+        self.append(day, data)
+
+    def preview(self, data, day=None, windows=WINDOWS):
+        """Window metrics as if `data` were appended for `day`, without changing this series"""
+        day = day or datetime.now().date()
+        n = len(self.dates)
+        copy = RiskSeries(self.fernet, self.path)
+        copy.dates = list(self.dates)
+        copy.isins = list(self.isins)
+        copy.names = list(self.names)
+        copy.isin_index = dict(self.isin_index)
+        for name in ('_ordinals', '_networth', '_invested', '_growth'):
+            setattr(copy, name, getattr(self, name)[:n + 1].copy())
+        copy._values = self._values[:len(self.isins), :n + 1].copy()
+        # windows ending before the new day are still valid
+        copy._cache = OrderedDict((k, v) for k, v in self._cache.items() if k[1] < n - 1)
+        copy.append(day, data)
+        return copy.summary(windows)
+
+    # --- windows -------------------------------------------------------------------------------
+
+    def bounds(self, window, end=None):
+        """(start, end) indices of a named window ending at `end` (a date string or index, default last)"""
+        n = len(self.dates)
+        if not n:
+            return None
+        e = n - 1 if end is None else (end % n if isinstance(end, int) else self.index_on_or_before(end))
+        if e is None:
+            return None
+        if window == 'ALL':
+            return 0, e
+        end_day = date.fromordinal(int(self._ordinals[e]))
+        if window == 'YTD':
+            cutoff = date(end_day.year - 1, 12, 31)
+        elif window in WINDOW_DAYS:
+            cutoff = end_day - timedelta(days=WINDOW_DAYS[window])
+        else:
+            raise ValueError(f"Unknown window {window}")
+        # the base is the last snapshot on or before the cutoff, else the first one we have
+        s = self.index_on_or_before(cutoff.isoformat())
+        return (0 if s is None else s), e
+
+    def index_on_or_before(self, day):
+        i = int(np.searchsorted(self._ordinals[:len(self.dates)], date.fromisoformat(day).toordinal(), 'right')) - 1
+        return i if i >= 0 else None
+
+    def metrics(self, start=None, end=None, top=3):
+        """Metrics between the snapshot on/before `start` (default first) and on/before `end` (default last)"""
+        n = len(self.dates)
+        if not n:
+            return None
+        s = 0 if start is None else (self.index_on_or_before(start) or 0)
+        e = n - 1 if end is None else self.index_on_or_before(end)
+        if e is None:
+            return None
+        return self.window_metrics(min(s, e), e, top)
+
+    def window_metrics(self, s, e, top=3):
+        key = (s, e, top)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        result = self._compute(s, e, top)
+        self._cache[key] = result
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def summary(self, windows=WINDOWS, end=None):
+        """{window: metrics} for the named windows ending at `end` (default the last day)"""
+        result = {}
+        for window in windows:
+            bounds = self.bounds(window, end)
+            if bounds and bounds[1] > bounds[0]:
+                result[window] = self.window_metrics(*bounds)
+        return result
+
+    def _compute(self, s, e, top):
+        networth = self._networth[s:e + 1]
+        invested = self._invested[s:e + 1]
+        growth = self._growth[s:e + 1] / self._growth[s]
+        ordinals = self._ordinals[s:e + 1]
+        span = int(ordinals[-1] - ordinals[0])
+
+        twr = growth[-1] - 1
+        returns = growth[1:] / growth[:-1] - 1
+        volatility = float(np.std(returns, ddof=1) * np.sqrt(TRADING_DAYS)) if len(returns) > 1 else None
+
+        peaks = np.maximum.accumulate(growth)
+        drawdowns = growth / peaks - 1
+        trough = int(np.argmin(drawdowns))
+        peak = int(np.argmax(growth[:trough + 1]))
+
+        flows = np.diff(invested)
+        # XIRR: start value paid in, flows paid in on their day, end value taken out
+        amounts = np.concatenate(([-networth[0]], -flows, [networth[-1]]))
+        offsets = np.concatenate(([0], ordinals[1:] - ordinals[0], [span]))
+        irr = xirr(offsets, amounts)
+
+        start_values = np.nan_to_num(self._values[:len(self.isins), s])
+        end_values = np.nan_to_num(self._values[:len(self.isins), e])
+        deltas = end_values - start_values
+        base = networth[0]
+        contribution = deltas / base * 100 if base else np.zeros_like(deltas)
+        order = np.argsort(-contribution, kind='stable')
+        gainers = [i for i in order[:top] if contribution[i] > 0]
+        losers = [i for i in order[::-1][:top] if contribution[i] < 0]
+
+        def rows(idx):
+            return [{'company': self.names[i], 'contribution_pct': float(contribution[i]),
+                     'value_change': float(deltas[i])} for i in idx]
+
+        return {
+            'start': self.dates[s],
+            'end': self.dates[e],
+            'days': span,
+            'observations': e - s,
+            'twr_pct': float(twr * 100),
+            'twr_annualized_pct': float(((1 + twr) ** (365.0 / span) - 1) * 100) if span >= 365 else None,
+            # annualizing a few weeks compounds noise into nonsense (-98% for a 2% dip): like the
+            # annualized TWR, XIRR needs a year; shorter windows get the period money-weighted return
+            'xirr_pct': float(irr * 100) if irr is not None and span >= 365 else None,
+            'mwr_pct': float(((1 + irr) ** (span / 365.0) - 1) * 100) if irr is not None and span else None,
+            'volatility_pct': volatility * 100 if volatility is not None else None,
+            'max_drawdown_pct': float(drawdowns[trough] * 100),
+            'drawdown_peak': self.dates[s + peak],
+            'drawdown_trough': self.dates[s + trough],
+            'net_flows': float(invested[-1] - invested[0]),
+            'top_contributors': rows(gainers),
+            'top_detractors': rows(losers)
+        }
@@ -0,0 +1,277 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from cryptography.fernet import InvalidToken
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+# Holding fields that describe the security rather than the position
+META_KEYS = ('ISIN', 'CompanyName', 'Sector', 'Category', 'SecurityType')
+_META_INDEX = {k: i for i, k in enumerate(META_KEYS)}
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class SecurityMaster:
+    """
+    Interned security metadata shared by every account and date.
+
+    A *variant* is one distinct (ISIN, CompanyName, Sector, Category, SecurityType) tuple; its
+    integer id never changes, so stored snapshots can reference holdings as [variant_id, values...]
+    rows and decoding shares one set of strings across the whole history. Each ISIN also maps to a
+    *security id*; aliases point a retired ISIN's security at its successor (renames, mergers,
+    ISIN changes after a corporate action) so joins across dates follow the security.
+
+    The table only grows and is Fernet-encrypted on disk (security_master.enc). It must be
+    saved before a snapshot referencing new variants is written (HistoryStore.append does this)
+    and is needed to read those snapshots back.
+
+    Several processes may share the file (the daemon plus a manual `cli.py send`, batch runs):
+    the table is re-read whenever the file's mtime or size changed before it decodes or registers
+    anything, and writers hold locked() (an flock on `<path>.lock`) while they register new
+    variants and save, so ids handed out by one process are never reused by another. save()
+    merges with whatever is on disk instead of overwriting it.
+    """
+
+    def __init__(self, fernet, path="security_master.enc"):
+        self.fernet = fernet
+        self.path = path
+        self.variants = []
+        self.variant_ids = {}
+        self.securities = []
+        self.security_ids = {}
+        self.aliases = {}
+        self.dirty = False
+        # (mtime, size) of the file as last read or written
+        self._file_stat = None
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+
+    @classmethod
+    def shared(cls, fernet, path="security_master.enc"):
+        """The process-wide instance for `path` (loaded on first use), so accounts share one table"""
+        key = os.path.abspath(path)
+        with _shared_lock:
+            master = _shared.get(key)
+            if master is None:
+                master = _shared[key] = cls(fernet, path)
+                master.load()
+            return master
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self):
+        """Replace the in-memory table with the file's (unsaved entries are dropped)"""
+        with self._lock:
+            stat = self._stat()
+            if stat is None:
+                return False
+            try:
+                with open(self.path, "rb") as fh:
+                    state = json.loads(self.fernet.decrypt(fh.read()).decode("utf-8"))
+            except InvalidToken:
+                raise ValueError(f"{self.path} cannot be decrypted (wrong key or corrupted)")
+            self.securities = [_intern(isin) for isin in state['securities']]
+            self.security_ids = {isin: i for i, isin in enumerate(self.securities)}
+            self.variants = [tuple(_intern(v) for v in variant) for variant in state['variants']]
+            self.variant_ids = {variant: i for i, variant in enumerate(self.variants)}
+            self.aliases = {int(k): v for k, v in state.get('aliases', {}).items()}
+            self.dirty = False
+            self._file_stat = stat
+        return True
+
+    def refresh(self):
+        """
+        Re-read the file when another process changed it since we last read or wrote it. Entries
+        registered here but not saved yet are kept, after the file's (they may get new ids).
+        """
+        with self._lock:
+            if self._stat() == self._file_stat:
+                return False
+            if not self.dirty:
+                return self.load()
+            pending_securities = list(self.securities)
+            pending_variants = list(self.variants)
+            pending_aliases = {self.securities[k]: self.securities[v] for k, v in self.aliases.items()}
+            self.load()
+            for isin in pending_securities:
+                self._register_isin(isin)
+            for variant in pending_variants:
+                if variant not in self.variant_ids:
+                    self.variant_ids[variant] = len(self.variants)
+                    self.variants.append(variant)
+                    self.dirty = True
+            for old, new in pending_aliases.items():
+                old_sid = self.security_ids[old]
+                if old_sid not in self.aliases:
+                    self.aliases[old_sid] = self.security_ids[new]
+                    self.dirty = True
+            return True
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the cross-process write lock with the table up to date. Register new variants and
+        save() inside it, together with whatever is written referencing them. Re-entrant.
+        """
+        with self._lock:
+            if self._lock_depth or fcntl is None:
+                self._lock_depth += 1
+                try:
+                    self.refresh()
+                    yield self
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.path + ".lock", "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    self.refresh()
+                    yield self
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def save(self):
+        """Write the table, merged with any entries another process saved in the meantime"""
+        with self.locked():
+            if not self.dirty:
+                return
+            state = {'version': 1, 'securities': self.securities, 'variants': self.variants,
+                     'aliases': {str(k): v for k, v in self.aliases.items()}}
+            payload = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(self.fernet.encrypt(payload))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+            self._file_stat = self._stat()
+
+    # --- lookups -------------------------------------------------------------------------------
+
+    def _register_isin(self, isin):
+        sid = self.security_ids.get(isin)
+        if sid is None:
+            sid = self.security_ids[isin] = len(self.securities)
+            self.securities.append(_intern(isin))
+            self.dirty = True
+        return sid
+
+    def variant_id(self, holding):
+        """Id of the holding's metadata tuple, registering it (and its ISIN) when new"""
+        variant = tuple(holding.get(k) for k in META_KEYS)
+        vid = self.variant_ids.get(variant)
+        if vid is not None:
+            return vid
+        with self._lock:
+            vid = self.variant_ids.get(variant)
+            if vid is None:
+                variant = tuple(_intern(v) for v in variant)
+                self._register_isin(variant[0])
+                vid = self.variant_ids[variant] = len(self.variants)
+                self.variants.append(variant)
+                self.dirty = True
+            return vid
+
+    def variant(self, vid):
+        """(ISIN, CompanyName, Sector, Category, SecurityType) of a variant id"""
+        return self.variants[vid]
+
+    def security_id(self, isin):
+        """Canonical security id of an ISIN after following aliases, or None if never seen"""
+        sid = self.security_ids.get(isin)
+        if sid is None:
+            return None
+        seen = 0
+        while sid in self.aliases and seen < len(self.aliases):
+            sid = self.aliases[sid]
+            seen += 1
+        return sid
+
+    def canonical_isin(self, isin):
+        """The ISIN the security is currently known by (isin itself when not aliased)"""
+        sid = self.security_id(isin)
+        return isin if sid is None else self.securities[sid]
+
+    def add_alias(self, old_isin, new_isin):
+        """Treat old_isin as the same security as new_isin from now on (rename / corporate action)"""
+        with self.locked():
+            old_sid = self._register_isin(old_isin)
+            new_sid = self.security_id(new_isin)
+            if new_sid is None:
+                new_sid = self._register_isin(new_isin)
+            if new_sid == self.security_id(old_isin):
+                return
+            self.aliases[old_sid] = new_sid
+            self.dirty = True
+
+    # --- compact snapshots ---------------------------------------------------------------------
+
+    def compact(self, data):
+        """
+        Payload -> {'p': Profile with Holdings as a placeholder, 'x': other top-level keys,
+        'k': holding key order, 'r': rows}. A row is [variant_id, *non-meta values in 'k' order];
+        holdings with a different key layout are kept whole as {'raw': holding}.
+        """
+        # ids must not collide with variants another process registered meanwhile
+        self.refresh()
+        profile = data['Profile']
+        holdings = profile.get('Holdings') or []
+        keys = list(holdings[0].keys()) if holdings else []
+        value_keys = [k for k in keys if k not in _META_INDEX]
+        rows = []
+        for h in holdings:
+            if list(h.keys()) == keys and all(isinstance(h.get(k), (str, type(None))) for k in META_KEYS):
+                rows.append([self.variant_id(h)] + [h[k] for k in value_keys])
+            else:
+                rows.append({'raw': h})
+        return {
+            'p': {k: (None if k == 'Holdings' else v) for k, v in profile.items()},
+            'x': {k: v for k, v in data.items() if k != 'Profile'},
+            'k': keys,
+            'r': rows
+        }
+
+    def expand(self, compact):
+        """Inverse of compact(); metadata strings are the shared interned objects"""
+        # the segment may reference variants another process added since we read the table
+        self.refresh()
+        keys = compact['k']
+        # per key: (True, meta index) or (False, position in the row)
+        plan = []
+        position = 1
+        for k in keys:
+            if k in _META_INDEX:
+                plan.append((k, True, _META_INDEX[k]))
+            else:
+                plan.append((k, False, position))
+                position += 1
+        variants = self.variants
+        holdings = []
+        for row in compact['r']:
+            if isinstance(row, dict):
+                holdings.append(row['raw'])
+                continue
+            variant = variants[row[0]]
+            holdings.append({k: (variant[i] if is_meta else row[i]) for k, is_meta, i in plan})
+        profile = {k: (holdings if k == 'Holdings' else v) for k, v in compact['p'].items()}
+        return {**compact['x'], 'Profile': profile}
+
+    def stats(self):
+        return {'securities': len(self.securities), 'variants': len(self.variants), 'aliases': len(self.aliases)}
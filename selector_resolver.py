@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Returns [index, element] for the first spec (in priority order) present in the DOM, or null.
+# Evaluating all candidates in one script keeps every poll to a single WebDriver round-trip.
+_RESOLVE_JS = """
+const specs = arguments[0];
+for (let i = 0; i < specs.length; i++) {
+    const spec = specs[i];
+    let el = null;
+    try {
+        if (spec.texts) {
+            // case-insensitive, any of the texts, whitespace runs collapsed
+            el = Array.from(document.querySelectorAll(spec.css)).find(e => {
+                const text = (e.innerText || e.value || '').replace(/\\s+/g, ' ').toLowerCase();
+                return spec.texts.some(t => text.includes(t));
+            }) || null;
+        } else {
+            el = document.querySelector(spec.css);
+        }
+    } catch (e) {
+        continue;
+    }
+    if (el) return [i, el];
+}
+return null;
+"""
+
+_CONTAINS_RE = re.compile(r"^(?P<css>.+?):contains\((?P<args>.+)\)$")
+_QUOTED_RE = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+
+def to_spec(selector):
+    """
+    Turn a CSS selector into a resolver spec. A jQuery-style :contains('text') suffix, which may
+    list alternatives (:contains('Sign in', 'Login')), matches elements whose text includes any of
+    them, ignoring case.
+    """
+    match = _CONTAINS_RE.match(selector)
+    if match:
+        texts = [" ".join((a or b).split()).lower() for a, b in _QUOTED_RE.findall(match.group('args'))]
+        if texts:
+            return {'css': match.group('css'), 'texts': texts}
+    return {'css': selector}
+
+
+class SelectorResolver:
+    """
+    Finds login form elements with one combined DOM query per poll instead of a chain of
+    per-selector waits. The selector that matched is remembered per login URL (hashed, the URL
+    itself is a secret) and tried first on the next run. Lookup durations are kept in `timings`.
+    """
+
+    def __init__(self, driver, login_url, cache_path="selector_cache.json", poll_frequency=0.1):
+        self.driver = driver
+        self.url_key = hashlib.sha256(login_url.encode("utf-8")).hexdigest()[:16]
+        self.cache_path = cache_path
+        self.poll_frequency = poll_frequency
+        self.cache = self._load_cache()
+        self.timings = {}
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading selector cache: {e}")
+            return {}
+
+    def save(self):
+        if not self.cache_path:
+            return
+        try:
+            # merge with whatever other logins stored meanwhile, then swap the file in atomically
+            merged = self._load_cache()
+            merged.update(self.cache)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(merged, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error saving selector cache: {e}")
+
+    def ordered(self, field, selectors):
+        """Candidates with last run's winning selector moved to the front"""
+        winner = self.cache.get(self.url_key, {}).get(field)
+        if winner in selectors:
+            return [winner] + [s for s in selectors if s != winner]
+        return list(selectors)
+
+    def resolve(self, field, selectors, timeout=10):
+        """
+        Wait until any candidate is present and return (element, selector), or (None, None)
+        after `timeout` seconds.
+        """
+        candidates = self.ordered(field, selectors)
+        specs = [to_spec(s) for s in candidates]
+        started = time.perf_counter()
+
+        # implicit waits would stall every find inside the script poll; disable while resolving
+        self.driver.implicitly_wait(0)
+        try:
+            found = WebDriverWait(self.driver, timeout, poll_frequency=self.poll_frequency).until(
+                lambda d: d.execute_script(_RESOLVE_JS, specs)
+            )
+        except TimeoutException:
+            found = None
+        finally:
+            self.driver.implicitly_wait(10)
+
+        elapsed = time.perf_counter() - started
+        self.timings[field] = elapsed
+        if not found:
+            print(f"No {field} selector matched after {elapsed * 1000:.0f} ms")
+            return None, None
+
+        index, element = found
+        selector = candidates[index]
+        print(f"Found {field} field with selector: {selector} ({elapsed * 1000:.0f} ms)")
+        self.cache.setdefault(self.url_key, {})[field] = selector
+        return element, selector
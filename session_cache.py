@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+import threading
+import time
+
+from cryptography.fernet import InvalidToken
+
+# read-modify-write of the shared cache file must not interleave when accounts run in threads
+_cache_lock = threading.Lock()
+
+
+class SessionCache:
+    """
+    Encrypted on-disk cache of the cookies + accessToken obtained after a browser login.
+    Entries are keyed per account (username @ login url) and encrypted with the same
+    Fernet instance used for portfolio_data.enc, so nothing sensitive is stored in clear.
+    """
+
+    def __init__(self, fernet, path="session_cache.enc", ttl=6 * 3600):
+        self.fernet = fernet
+        self.path = path
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(username, login_url):
+        return f"{username}@{login_url}"
+
+    def _read_all(self):
+        if not self.fernet or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "rb") as fh:
+                token = fh.read()
+            return json.loads(self.fernet.decrypt(token).decode("utf-8"))
+        except InvalidToken:
+            print("Session cache could not be decrypted (key changed?) - ignoring it.")
+            return {}
+        except Exception as e:
+            print(f"Error reading session cache: {e}")
+            return {}
+
+    def _write_all(self, entries):
+        if not self.fernet:
+            return
+        try:
+            payload = json.dumps(entries, separators=(",", ":")).encode("utf-8")
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(self.fernet.encrypt(payload))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error writing session cache: {e}")
+
+    def load(self, key):
+        """Return the cached entry for key, or None if missing or expired."""
+        entry = self._read_all().get(key)
+        if not entry:
+            return None
+        if entry.get('expires_at', 0) <= time.time():
+            print("Cached session expired.")
+            self.clear(key)
+            return None
+        return entry
+
+    def save(self, key, cookies, access_token=None, cookie_expiry=None):
+        """Store cookies/accessToken; expiry is the earliest of cookie expiry, JWT exp and ttl."""
+        expires_at = time.time() + self.ttl
+        for candidate in (cookie_expiry, jwt_expiry(access_token)):
+            if candidate:
+                expires_at = min(expires_at, candidate)
+        with _cache_lock:
+            entries = self._read_all()
+            entries[key] = {
+                'cookies': cookies,
+                'access_token': access_token,
+                'expires_at': expires_at,
+                'saved_at': time.time()
+            }
+            self._write_all(entries)
+
+    def clear(self, key):
+        with _cache_lock:
+            entries = self._read_all()
+            if entries.pop(key, None) is not None:
+                self._write_all(entries)
+
+
+def jwt_expiry(token):
+    """Best-effort read of the `exp` claim if the accessToken is a JWT; None otherwise."""
+    if not token or not isinstance(token, str):
+        return None
+    parts = token.replace("Bearer ", "").split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        padded = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(padded))
+        exp = claims.get('exp')
+        return float(exp) if exp else None
+    except Exception:
+        return None
@@ -0,0 +1,47 @@
+import json
+import struct
+import zlib
+
+# Snapshot plaintext (before encryption):
+#   MAGIC (4 bytes) | version (1 byte) | codec (1 byte) | body
+# Version 1 / codec 1: body is zlib-compressed compact JSON.
+# Version 1 / codec 2: zlib-compressed JSON of SecurityMaster.compact(data) - holdings are rows
+#   referencing the shared security master, which is required to decode them.
+# Anything not starting with MAGIC is the original UTF-8 JSON (pretty-printed or compact).
+MAGIC = b"PMS\x00"
+VERSION = 1
+CODEC_ZLIB_JSON = 1
+CODEC_MASTER_ROWS = 2
+HEADER = struct.Struct(">4sBB")
+
+
+def encode_snapshot(data, level=6, master=None):
+    """Codec 2 when a security master is given and data is a portfolio payload, else codec 1"""
+    codec = CODEC_ZLIB_JSON
+    if master is not None and isinstance(data, dict) and isinstance(data.get('Profile'), dict):
+        data = master.compact(data)
+        codec = CODEC_MASTER_ROWS
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(MAGIC, VERSION, codec) + zlib.compress(body, level)
+
+
+def decode_snapshot(plaintext, master=None):
+    """Decode any snapshot plaintext: versioned binary or legacy JSON"""
+    if plaintext[:4] != MAGIC:
+        return json.loads(plaintext.decode("utf-8"))
+    _, version, codec = HEADER.unpack_from(plaintext)
+    if version != VERSION or codec not in (CODEC_ZLIB_JSON, CODEC_MASTER_ROWS):
+        raise ValueError(f"Unsupported snapshot format version {version} codec {codec}")
+    data = json.loads(zlib.decompress(plaintext[HEADER.size:]).decode("utf-8"))
+    if codec == CODEC_MASTER_ROWS:
+        if master is None:
+            raise ValueError("Snapshot references the security master; pass one to decode it")
+        return master.expand(data)
+    return data
+
+
+def snapshot_version(plaintext):
+    """0 for legacy JSON, else the header version"""
+    if plaintext[:4] != MAGIC:
+        return 0
+    return HEADER.unpack_from(plaintext)[1]
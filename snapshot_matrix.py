@@ -0,0 +1,143 @@
+import numpy as np
+
+
+class SnapshotMatrix:
+    """
+    Columnar view of the snapshot history: one row per ISIN, one column per date.
+
+    value[i, t] / weight[i, t] hold PortfolioValue / PortfolioWeightage of security i on date t
+    (NaN when it was not held), networth[t] the CurrentNetworth. Comparisons between any two
+    dates or over rolling windows are whole-array operations instead of per-holding dict loops.
+    """
+
+    def __init__(self, dates, isins, meta, value, weight, networth, total_return):
+        self.dates = list(dates)
+        self.isins = list(isins)
+        self.meta = meta
+        self.value = value
+        self.weight = weight
+        self.networth = networth
+        self.total_return = total_return
+        self.date_index = {d: t for t, d in enumerate(self.dates)}
+        self.isin_index = {isin: i for i, isin in enumerate(self.isins)}
+        self._returns = None
+
+    @classmethod
+    def from_snapshots(cls, snapshots, security_type='Equity', master=None):
+        """
+        Build from [(date, investor_payload)] in date order, keeping holdings of security_type
+        (None keeps every holding).
+        With a SecurityMaster, aliased ISINs (renames, corporate actions) share one row under
+        their current ISIN.
+        """
+        canonical = master.canonical_isin if master else (lambda isin: isin)
+        isin_index = {}
+        meta = {'company': [], 'sector': [], 'category': []}
+        cells = []
+        networth = np.full(len(snapshots), np.nan)
+        total_return = np.full(len(snapshots), np.nan)
+
+        for t, (_, data) in enumerate(snapshots):
+            profile = data['Profile']
+            networth[t] = profile['Networth']['CurrentNetworth']
+            total_return[t] = profile['Networth']['Return']
+            for h in profile['Holdings']:
+                if security_type and h['SecurityType'] != security_type:
+                    continue
+                isin = canonical(h['ISIN'])
+                i = isin_index.get(isin)
+                # non-equity lines may come without a name / classification
+                if i is None:
+                    i = isin_index[isin] = len(isin_index)
+                    meta['company'].append(h.get('CompanyName'))
+                    meta['sector'].append(h.get('Sector'))
+                    meta['category'].append(h.get('Category'))
+                else:
+                    # keep the most recent name/classification
+                    meta['company'][i] = h.get('CompanyName')
+                    meta['sector'][i] = h.get('Sector')
+                    meta['category'][i] = h.get('Category')
+                cells.append((i, t, h['PortfolioValue'], h['PortfolioWeightage']))
+
+        shape = (len(isin_index), len(snapshots))
+        value = np.full(shape, np.nan)
+        weight = np.full(shape, np.nan)
+        if cells:
+            rows, cols, values, weights = (np.asarray(c) for c in zip(*cells))
+            value[rows.astype(np.intp), cols.astype(np.intp)] = values
+            weight[rows.astype(np.intp), cols.astype(np.intp)] = weights
+
+        meta = {k: np.asarray(v, dtype=object) for k, v in meta.items()}
+        return cls([d for d, _ in snapshots], list(isin_index), meta, value, weight, networth, total_return)
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, security_type='Equity'):
+        """Build from a HistoryStore date range (one snapshot per day)"""
+        return cls.from_snapshots(store.range(start, end), security_type, getattr(store, 'master', None))
+
+    @property
+    def held(self):
+        return ~np.isnan(self.value)
+
+    @property
+    def returns(self):
+        """Day-over-day value return per holding (ISIN x date, NaN in the first column / when not held)"""
+        if self._returns is None:
+            self._returns = np.full(self.value.shape, np.nan)
+            if self.value.shape[1] > 1:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    self._returns[:, 1:] = self.value[:, 1:] / self.value[:, :-1] - 1
+        return self._returns
+
+    def column(self, date):
+        """Column index for a date string, or pass an int through (negative ints count from the end)"""
+        if isinstance(date, (int, np.integer)):
+            return int(date) % len(self.dates)
+        return self.date_index[date]
+
+    def _rows(self, idx, **columns):
+        return [
+            {'company': self.meta['company'][i], 'sector': self.meta['sector'][i],
+             **{name: float(col[i]) for name, col in columns.items()}}
+            for i in idx
+        ]
+
+    def diff(self, start, end, top=5, threshold=0.01):
+        """
+        Compare two dates: top gainers/losers by value change %, entries, exits and weight drift.
+        Mirrors the sections produced by MyAlternatesAutomation.analyze_changes.
+        """
+        t0, t1 = self.column(start), self.column(end)
+        v0, v1 = self.value[:, t0], self.value[:, t1]
+        w0, w1 = self.weight[:, t0], self.weight[:, t1]
+        held0, held1 = ~np.isnan(v0), ~np.isnan(v1)
+        both = held0 & held1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_pct = np.where(both, (v1 - v0) / v0 * 100, np.nan)
+        drift = np.where(both, w1 - w0, np.nan)
+
+        moved = both & (np.abs(np.nan_to_num(change_pct)) > threshold)
+        up = np.flatnonzero(moved & (change_pct > 0))
+        down = np.flatnonzero(moved & (change_pct < 0))
+        gainers = up[np.argsort(-change_pct[up], kind='stable')][:top]
+        losers = down[np.argsort(change_pct[down], kind='stable')][:top]
+
+        entries = np.flatnonzero(held1 & ~held0)
+        exits = np.flatnonzero(held0 & ~held1)
+        entries = entries[np.argsort(-w1[entries], kind='stable')]
+        exits = exits[np.argsort(-w0[exits], kind='stable')]
+        drifted = np.flatnonzero(both)
+        drifted = drifted[np.argsort(-np.abs(drift[drifted]), kind='stable')]
+
+        return {
+            'start': self.dates[t0],
+            'end': self.dates[t1],
+            'networth_change': float(self.networth[t1] - self.networth[t0]),
+            'networth_change_pct': float((self.networth[t1] / self.networth[t0] - 1) * 100),
+            'top_gainers': self._rows(gainers, value_change_pct=change_pct, weight_change=drift, current_weight=w1),
+            'top_losers': self._rows(losers, value_change_pct=change_pct, weight_change=drift, current_weight=w1),
+            'new_stocks': self._rows(entries, weightage=w1, value=v1),
+            'removed_stocks': self._rows(exits, weightage=w0, value=v0),
+            'weight_drift': self._rows(drifted[:top], weight_change=drift, current_weight=w1)
+        }
@@ -0,0 +1,385 @@
+"""
+Local stand-in for the MyAlternates site, for exercising the fetch path without the network.
+
+    python standin_server.py [--port 8766] [--faults 'investor:delay=0.3,error_rate=0.2']
+
+Serves what the tracker talks to:
+
+    GET  /login            HTML login form (username / password / hidden _csrf, submit button)
+    POST /login            checks the credentials, sets the `sid` cookie and redirects to /dashboard
+    GET  /dashboard        a page behind the login (the browser login waits for this URL)
+    GET  /api/session      {"accessToken": ...} for a valid `sid` cookie
+    GET  /api/investor     a synthetic `Profile` payload (synthetic_data) for a valid cookie + authorization
+    GET  /api/extra/NAME   a small JSON body, for EXTRA_API_URLS
+    GET  /__stats          request counts per endpoint and status
+
+Each investor response advances to the next day of a synthetic history (the last day is repeated
+once it runs out), carries an ETag and answers If-None-Match with 304 like the real API.
+Faults are set per endpoint (login, dashboard, session, investor, extra, or * for all):
+`delay` / `jitter` seconds before answering, `error_rate` of requests (or the first `fail_first`)
+answered with `error_status`, and `bytes_per_second` to trickle the body out in small chunks.
+"""
+import argparse
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from synthetic_data import generate_history
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+DEFAULT_USERNAME = "standin"
+DEFAULT_PASSWORD = "standin"
+SESSION_SECONDS = 3600
+# bytes written per chunk when a response is throttled
+SLOW_CHUNK_BYTES = 4096
+ENDPOINTS = ("login", "dashboard", "session", "investor", "extra")
+
+LOGIN_PAGE = """<!doctype html>
+<html><head><title>MyAlternates - Sign in</title></head>
+<body>
+<form method="post" action="/login" class="login-form">
+  <input type="hidden" name="_csrf" value="{csrf}">
+  <input type="text" id="username" name="username" placeholder="Username">
+  <input type="password" id="password" name="password" placeholder="Password">
+  <button type="submit" class="btn-primary login-btn">Sign in</button>
+</form>
+{error}
+</body></html>
+"""
+
+DASHBOARD_PAGE = """<!doctype html>
+<html><head><title>MyAlternates - Dashboard</title></head>
+<body><h1>Dashboard</h1></body></html>
+"""
+
+
+class Faults:
+    """Injected misbehaviour of one endpoint"""
+
+    FIELDS = ('delay', 'jitter', 'error_rate', 'error_status', 'fail_first', 'bytes_per_second')
+
+    def __init__(self, delay=0.0, jitter=0.0, error_rate=0.0, error_status=503, fail_first=0, bytes_per_second=0):
+        self.delay = delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.bytes_per_second = bytes_per_second
+
+    def as_dict(self):
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+
+def parse_faults(spec):
+    """
+    {endpoint: Faults} from 'investor:delay=0.3,error_rate=0.1;session:fail_first=1'.
+    Endpoint `*` applies to every endpoint without its own entry.
+    """
+    faults = {}
+    for part in (spec or "").split(";"):
+        if not part.strip():
+            continue
+        endpoint, _, options = part.partition(":")
+        endpoint = endpoint.strip()
+        if endpoint != "*" and endpoint not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {endpoint!r} (expected one of {', '.join(ENDPOINTS)} or *)")
+        values = {}
+        for option in options.split(","):
+            if not option.strip():
+                continue
+            key, _, value = option.partition("=")
+            key = key.strip()
+            if key not in Faults.FIELDS:
+                raise ValueError(f"unknown fault {key!r} (expected one of {', '.join(Faults.FIELDS)})")
+            values[key] = int(value) if key in ('error_status', 'fail_first', 'bytes_per_second') else float(value)
+        faults[endpoint] = Faults(**values)
+    return faults
+
+
+class StandinState:
+    """
+    Accounts, sessions, the served payload history and the fault plan of one stand-in server.
+    Shared by the handler threads; `faults` may be replaced while the server runs.
+    """
+
+    def __init__(self, username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD, payloads=None, faults=None,
+                 holdings=50, days=30, seed=0):
+        self.username = username
+        self.password = password
+        self.payloads = payloads if payloads is not None else [p for _, p in generate_history(holdings, days, seed)]
+        if not self.payloads:
+            raise ValueError("the stand-in needs at least one payload to serve")
+        self.faults = faults or {}
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget sessions and counters and serve the history from its first day again"""
+        with self._lock:
+            self.cursor = 0
+            self.sessions = {}
+            self.csrf = set()
+            self.requests = {}
+            self.injected = {}
+
+    def faults_for(self, endpoint):
+        return self.faults.get(endpoint) or self.faults.get("*") or Faults()
+
+    def count(self, endpoint, status):
+        with self._lock:
+            key = f"{endpoint} {status}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def should_fail(self, endpoint, faults):
+        with self._lock:
+            seen = self.injected.setdefault(endpoint, {'seen': 0, 'failed': 0})
+            seen['seen'] += 1
+            fail = seen['seen'] <= faults.fail_first or (faults.error_rate and self.rng.random() < faults.error_rate)
+            if fail:
+                seen['failed'] += 1
+            return bool(fail)
+
+    def new_csrf(self):
+        token = secrets.token_hex(8)
+        with self._lock:
+            self.csrf.add(token)
+        return token
+
+    def login(self, form):
+        """sid for a valid form submission, else None"""
+        with self._lock:
+            csrf = form.get('_csrf', '')
+            if csrf not in self.csrf:
+                return None
+            self.csrf.discard(csrf)
+            if form.get('username') != self.username or form.get('password') != self.password:
+                return None
+            sid = secrets.token_hex(16)
+            self.sessions[sid] = {'token': secrets.token_hex(24), 'expires': time.time() + SESSION_SECONDS}
+            return sid
+
+    def session(self, sid):
+        with self._lock:
+            entry = self.sessions.get(sid)
+            if not entry or entry['expires'] <= time.time():
+                return None
+            return entry
+
+    def authorized(self, sid, token):
+        entry = self.session(sid)
+        return bool(entry and token and entry['token'] == token)
+
+    def next_payload(self):
+        """(payload, etag) of the current day; the next call serves the following day"""
+        with self._lock:
+            i = min(self.cursor, len(self.payloads) - 1)
+            self.cursor += 1
+        payload = self.payloads[i]
+        return payload, f'"day-{i}"'
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(sorted(self.requests.items())), 'injected': dict(self.injected),
+                    'served_days': min(self.cursor, len(self.payloads)), 'sessions': len(self.sessions),
+                    'faults': {k: v.as_dict() for k, v in self.faults.items()}}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    state = None
+    verbose = False
+    # keep-alive, like the real site; the API client pools its connections
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip('/') or '/'
+        if path == '/__stats':
+            return self.reply(200, self.state.stats())
+        if path in ('/', '/login'):
+            return self.serve('login', self.login_page)
+        if path == '/dashboard':
+            return self.serve('dashboard', self.dashboard)
+        if path == '/api/session':
+            return self.serve('session', self.session_api)
+        if path == '/api/investor':
+            return self.serve('investor', self.investor_api)
+        if path.startswith('/api/extra/'):
+            return self.serve('extra', lambda: self.extra_api(path.rsplit('/', 1)[1], parse_qs(url.query)))
+        self.reply(404, {'error': f"unknown path {url.path}"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path != '/login':
+            return self.reply(405, {'error': "method not allowed"})
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        self.serve('login', lambda: self.submit_login(form))
+
+    # --- endpoints: each returns (status, body, extra headers) ---------------------------------
+
+    def login_page(self, error=""):
+        return 200, LOGIN_PAGE.format(csrf=self.state.new_csrf(), error=error), {}
+
+    def submit_login(self, form):
+        sid = self.state.login(form)
+        if not sid:
+            return self.login_page('<p class="error">Invalid username or password</p>')
+        cookie = f"sid={sid}; Path=/; Max-Age={SESSION_SECONDS}; HttpOnly"
+        return 303, "", {'Location': '/dashboard', 'Set-Cookie': cookie}
+
+    def dashboard(self):
+        if not self.state.session(self.cookie('sid')):
+            return 303, "", {'Location': '/login'}
+        return 200, DASHBOARD_PAGE, {}
+
+    def session_api(self):
+        entry = self.state.session(self.cookie('sid'))
+        if not entry:
+            return 401, {'error': "not logged in"}, {}
+        return 200, {'accessToken': entry['token'], 'expiresIn': int(entry['expires'] - time.time())}, {}
+
+    def investor_api(self):
+        if not self.state.authorized(self.cookie('sid'), self.headers.get('authorization')):
+            return 401, {'error': "invalid session or access token"}, {}
+        payload, etag = self.state.next_payload()
+        if self.headers.get('If-None-Match') == etag:
+            return 304, None, {'ETag': etag}
+        return 200, payload, {'ETag': etag}
+
+    def extra_api(self, name, query):
+        if not self.state.authorized(self.cookie('sid'), self.headers.get('authorization')):
+            return 401, {'error': "invalid session or access token"}, {}
+        return 200, {'name': name, 'query': {k: v[-1] for k, v in query.items()}, 'items': []}, {}
+
+    # --- plumbing ------------------------------------------------------------------------------
+
+    def cookie(self, name):
+        for part in (self.headers.get('Cookie') or "").split(";"):
+            key, _, value = part.strip().partition("=")
+            if key == name:
+                return value
+        return None
+
+    def serve(self, endpoint, respond):
+        faults = self.state.faults_for(endpoint)
+        pause = faults.delay + (self.state.rng.uniform(0, faults.jitter) if faults.jitter else 0.0)
+        if pause > 0:
+            time.sleep(pause)
+        if self.state.should_fail(endpoint, faults):
+            status, body, headers = faults.error_status, {'error': "injected failure"}, {}
+        else:
+            status, body, headers = respond()
+        self.state.count(endpoint, status)
+        self.reply(status, body, headers, faults.bytes_per_second)
+
+    def reply(self, status, body, headers=None, bytes_per_second=0):
+        if body is None:
+            payload, content_type = b"", None
+        elif isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/html; charset=utf-8"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json"
+        self.send_response(status)
+        if content_type and status != 304:
+            self.send_header("Content-Type", content_type)
+        if status != 304:
+            self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if status == 304 or self.command == "HEAD":
+            return
+        if bytes_per_second > 0:
+            for offset in range(0, len(payload), SLOW_CHUNK_BYTES):
+                chunk = payload[offset:offset + SLOW_CHUNK_BYTES]
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                time.sleep(len(chunk) / bytes_per_second)
+        else:
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+class StandinServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer bound to a StandinState, with the URLs the tracker needs"""
+
+    daemon_threads = True
+
+    def __init__(self, state, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+        handler = type("BoundStandinHandler", (StandinHandler,), {'state': state, 'verbose': verbose})
+        super().__init__((host, port), handler)
+        self.state = state
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self):
+        """login_url, session_api_url, investor_api_url for MyAlternatesAutomation"""
+        return {'login_url': f"{self.base_url}/login", 'session_api_url': f"{self.base_url}/api/session",
+                'investor_api_url': f"{self.base_url}/api/investor"}
+
+    def start(self):
+        """Serve on a background thread (returns self, for `with StandinServer(...).start() as s`)"""
+        self._thread = threading.Thread(target=self.serve_forever, name="standin-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the MyAlternates login and APIs")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--username", default=DEFAULT_USERNAME)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--holdings", type=int, default=50, help="holdings per synthetic payload")
+    parser.add_argument("--days", type=int, default=30, help="synthetic days served in turn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--faults", default="", help="e.g. 'investor:delay=0.3,error_rate=0.1;*:jitter=0.05'")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    try:
+        faults = parse_faults(args.faults)
+    except ValueError as e:
+        parser.error(str(e))
+    state = StandinState(args.username, args.password, faults=faults, holdings=args.holdings, days=args.days,
+                         seed=args.seed)
+    server = StandinServer(state, args.host, args.port, args.verbose)
+    print(f"Stand-in serving {len(state.payloads)} synthetic days on {server.base_url}/login "
+          f"(user {args.username!r}, Ctrl-C to stop)")
+    for name, url in server.urls().items():
+        print(f"  {name.upper()}={url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import random
+from datetime import date, timedelta
+
+SECTORS = [
+    "Banking", "IT - Software", "Pharmaceuticals", "FMCG", "Automobile", "Capital Goods",
+    "Chemicals", "Finance", "Insurance", "Retail", "Telecom", "Realty", "Power", "Cement"
+]
+CATEGORIES = ["Large Cap", "Mid Cap", "Small Cap"]
+WORDS = [
+    "Bharat", "India", "National", "Global", "United", "Sun", "Star", "Apex", "Prime", "Tata",
+    "Nova", "Shree", "Vikas", "Indo", "Asian", "Eastern", "Western", "Royal", "Metro", "Zenith"
+]
+SUFFIXES = ["Industries Ltd", "Finance Ltd", "Technologies Ltd", "Pharma Ltd", "Motors Ltd",
+            "Chemicals Ltd", "Bank Ltd", "Infra Ltd", "Consumer Ltd", "Holdings Ltd"]
+
+
+def make_security(rng, n):
+    """Static attributes of one synthetic security"""
+    isin = "INE" + "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(8)) + str(n % 10)
+    name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)}"
+    return {
+        'ISIN': isin,
+        'CompanyName': name,
+        'Sector': rng.choice(SECTORS),
+        'Category': rng.choice(CATEGORIES),
+        'SecurityType': 'Equity',
+        'Quantity': rng.randint(10, 5000),
+        'AvgCost': round(rng.uniform(50, 5000), 2),
+        'Price': 0.0
+    }
+
+
+def build_payload(securities, invested):
+    """Investor API payload (the `Profile` shape analyze_changes reads) for the given securities"""
+    holdings = []
+    for s in securities:
+        value = s['Quantity'] * s['Price']
+        holdings.append({
+            'ISIN': s['ISIN'],
+            'CompanyName': s['CompanyName'],
+            'Sector': s['Sector'],
+            'Category': s['Category'],
+            'SecurityType': s['SecurityType'],
+            'Quantity': s['Quantity'],
+            'AvgCost': s['AvgCost'],
+            'MarketPrice': round(s['Price'], 2),
+            'PortfolioValue': round(value, 2),
+            'CostValue': round(s['Quantity'] * s['AvgCost'], 2),
+            'UnrealisedGainLoss': round(value - s['Quantity'] * s['AvgCost'], 2),
+            'PortfolioWeightage': 0.0
+        })
+    cash = round(invested * 0.02, 2)
+    holdings.append({
+        'ISIN': 'CASH', 'CompanyName': 'Cash & Equivalents', 'Sector': 'Cash', 'Category': 'Cash',
+        'SecurityType': 'Cash', 'Quantity': 1, 'AvgCost': cash, 'MarketPrice': cash,
+        'PortfolioValue': cash, 'CostValue': cash, 'UnrealisedGainLoss': 0.0, 'PortfolioWeightage': 0.0
+    })
+    total = sum(h['PortfolioValue'] for h in holdings)
+    for h in holdings:
+        h['PortfolioWeightage'] = round(h['PortfolioValue'] / total * 100, 4)
+    return {
+        'Profile': {
+            'Networth': {
+                'CurrentNetworth': round(total, 2),
+                'InvestedAmount': round(invested, 2),
+                'Return': (total - invested) / invested
+            },
+            'Holdings': holdings
+        }
+    }
+
+
+def generate_history(holdings=50, days=30, seed=0, start=None, churn=0.02, volatility=0.015):
+    """
+    [(YYYY-MM-DD, payload)] for consecutive weekdays: prices follow a random walk and each day
+    roughly `churn` of the positions are exited and replaced by new securities.
+    """
+    rng = random.Random(seed)
+    counter = 0
+    securities = []
+    for _ in range(holdings):
+        s = make_security(rng, counter)
+        counter += 1
+        s['Price'] = s['AvgCost'] * rng.uniform(0.7, 1.6)
+        securities.append(s)
+    invested = sum(s['Quantity'] * s['AvgCost'] for s in securities)
+
+    day = start or date(2024, 1, 1)
+    history = []
+    while len(history) < days:
+        if day.weekday() < 5:
+            for s in securities:
+                s['Price'] *= 1 + rng.gauss(0.0004, volatility)
+            for i in range(len(securities)):
+                if rng.random() < churn:
+                    s = make_security(rng, counter)
+                    counter += 1
+                    s['Price'] = s['AvgCost']
+                    securities[i] = s
+            history.append((day.isoformat(), build_payload(securities, invested)))
+        day += timedelta(days=1)
+    return history
+
+
+def generate_payload(holdings=50, seed=0):
+    """A single synthetic investor payload"""
+    return generate_history(holdings=holdings, days=1, seed=seed)[0][1]
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from telethon.sessions import StringSession
+
+
+class TelegramBroadcaster:
+    """
+    Sends one report to many recipients over a single Telegram connection. Up to `concurrency`
+    sends are in flight at once; a FloodWait puts that recipient back to sleep for the requested
+    time (without holding a send slot) and retries the chunk, up to `max_retries` times.
+    `client_factory()` may be overridden to inject a fake client in tests.
+    """
+
+    def __init__(self, api_id, api_hash, session_string, concurrency=5, max_retries=3, max_flood_wait=300,
+                 client_factory=None):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.session_string = session_string
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_flood_wait = max_flood_wait
+        self.client_factory = client_factory or self.make_client
+
+    def make_client(self):
+        return TelegramClient(StringSession(self.session_string), self.api_id, self.api_hash)
+
+    async def _deliver(self, client, slots, recipient, queue):
+        """Send every message arriving on the queue (None ends it) to one recipient, in order"""
+        started = time.perf_counter()
+        attempts = 1
+        sent = 0
+        error = None
+        while True:
+            msg = await queue.get()
+            if msg is None:
+                break
+            if error:
+                # an earlier chunk failed; drop the rest for this recipient
+                continue
+            retries = 0
+            while True:
+                try:
+                    async with slots:
+                        await client.send_message(recipient, msg)
+                    sent += 1
+                    break
+                except FloodWaitError as e:
+                    retries += 1
+                    attempts += 1
+                    if retries > self.max_retries or e.seconds > self.max_flood_wait:
+                        error = f"FloodWait {e.seconds}s (giving up)"
+                        break
+                    print(f"FloodWait for {recipient}: retrying in {e.seconds}s")
+                    await asyncio.sleep(e.seconds)
+                except Exception as e:
+                    error = str(e)
+                    break
+        return {'recipient': recipient, 'ok': error is None, 'attempts': attempts, 'sent': sent,
+                'error': error, 'elapsed': time.perf_counter() - started}
+
+    async def connect(self):
+        """A connected client; pass it to broadcast_async(client=...) and disconnect it yourself"""
+        client = self.client_factory()
+        await client.connect()
+        return client
+
+    async def broadcast_async(self, recipients, messages, client=None):
+        """
+        `messages` may be a string, a list or a lazy iterator of chunks; each chunk is handed to
+        every recipient as soon as it is produced. Without a `client` a connection is opened and
+        closed around the broadcast.
+        """
+        if isinstance(messages, str):
+            messages = [messages]
+        owned = client is None
+        if owned:
+            client = await self.connect()
+        try:
+            slots = asyncio.Semaphore(self.concurrency)
+            queues = [asyncio.Queue() for _ in recipients]
+            workers = [asyncio.create_task(self._deliver(client, slots, r, q)) for r, q in zip(recipients, queues)]
+            try:
+                for msg in messages:
+                    for q in queues:
+                        q.put_nowait(msg)
+                    # let the senders pick up this chunk before rendering the next one
+                    await asyncio.sleep(0)
+            except BaseException:
+                for w in workers:
+                    w.cancel()
+                raise
+            for q in queues:
+                q.put_nowait(None)
+            return await asyncio.gather(*workers)
+        finally:
+            if owned:
+                await client.disconnect()
+
+    def broadcast(self, recipients, messages):
+        """Blocking wrapper; returns one result dict per recipient in input order"""
+        results = asyncio.run(self.broadcast_async(recipients, messages))
+        self.report(results)
+        return results
+
+    @staticmethod
+    def report(results):
+        """Print a one-line summary plus each failed recipient"""
+        ok = sum(1 for r in results if r['ok'])
+        print(f"Telegram message sent to {ok}/{len(results)} recipients")
+        for r in results:
+            if not r['ok']:
+                print(f"Telegram delivery to {r['recipient']} failed: {r['error']}")
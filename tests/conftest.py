@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# the modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# appends one snapshot through its own automation (history store and security master)
+WRITER = """
+import json, sys
+from datetime import datetime
+sys.path.insert(0, sys.argv[1])
+from portfolio_tracker import MyAlternatesAutomation
+automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+automation.get_history_store().append(json.loads(sys.argv[2]), datetime.fromisoformat(sys.argv[3]))
+"""
+
+
+@pytest.fixture
+def append_from_other_process():
+    """append(payload, 'YYYY-MM-DDTHH:MM:SS') in a separate Python process, in the current directory"""
+    def append(data, when):
+        subprocess.run([sys.executable, "-c", WRITER, ROOT, json.dumps(data), when], check=True)
+    return append
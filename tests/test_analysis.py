@@ -0,0 +1,23 @@
+from portfolio_tracker import MyAlternatesAutomation
+
+
+def holding(isin, value):
+    return {'ISIN': isin, 'CompanyName': isin, 'Sector': "Tech", 'Category': "Large", 'SecurityType': 'Equity',
+            'PortfolioValue': value, 'PortfolioWeightage': value / 10}
+
+
+def payload(networth, *holdings):
+    return {'Profile': {'Networth': {'CurrentNetworth': networth, 'Return': 0.1},
+                        'Holdings': [holding(*h) for h in holdings]}}
+
+
+def test_headline_change_is_the_networth_change():
+    automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    previous = payload(1000.0, ("A", 600.0), ("B", 400.0))
+    current = payload(1100.0, ("A", 720.0), ("B", 380.0))
+    analysis = automation.analyze_changes(previous, current)
+    assert analysis['portfolio']['value_change'] == 100.0
+    assert analysis['portfolio']['value_change_pct'] == 10.0
+    assert analysis['top_gainers'][0]['value_change'] == 120.0
+    assert analysis['top_gainers'][0]['value_change_pct'] == 20.0
+    assert analysis['top_losers'][0]['value_change'] == -20.0
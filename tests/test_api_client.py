@@ -0,0 +1,18 @@
+from api_client import redact_error, redact_url
+
+URL = "https://api.pms.example.com/v1/investor/12345?token=abc"
+
+
+def test_redacted_url_is_stable_and_hides_the_url():
+    assert redact_url(URL) == redact_url(URL)
+    assert redact_url(URL) != redact_url(URL.replace("12345", "67890"))
+    assert "example" not in redact_url(URL)
+
+
+def test_redacted_error_masks_host_path_and_query():
+    error = ConnectionError("HTTPSConnectionPool(host='api.pms.example.com', port=443): Max retries exceeded "
+                            "with url: /v1/investor/12345?token=abc (Caused by timeout)")
+    text = redact_error(error, URL)
+    for secret in ("api.pms.example.com", "/v1/investor", "12345", "token=abc"):
+        assert secret not in text
+    assert "port=443" in text and "Caused by timeout" in text
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import pytest
+
+import batch
+from batch import load_accounts
+from metrics import RunMetrics
+
+
+def test_load_accounts_fills_defaults():
+    accounts = load_accounts(json.dumps([{'username': "a", 'password': "x"}, {'username': "b", 'password': "y"}]))
+    assert [a['name'] for a in accounts] == ["account1", "account2"]
+
+
+@pytest.mark.parametrize("names", [["ajay", "ajay"], ["ajay k", "ajay_k"]])
+def test_load_accounts_rejects_names_sharing_files(names):
+    source = json.dumps([{'name': n, 'username': n, 'password': "x"} for n in names])
+    with pytest.raises(ValueError, match="Duplicate account name"):
+        load_accounts(source)
+
+
+class StubDriver:
+    def __init__(self):
+        self.quit_called = threading.Event()
+
+    def quit(self):
+        self.quit_called.set()
+
+
+class StubAutomation:
+    """Stands in for MyAlternatesAutomation in run_batch: `behaviour` is ok, fail or hang"""
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def __init__(self, account):
+        self.name = account['name']
+        self.behaviour = account['behaviour']
+        self.metrics = RunMetrics(labels={'account': self.name})
+        self.on_unchanged = "notice"
+        self.driver = StubDriver() if self.behaviour == "hang" else None
+
+    def run_full_automation(self):
+        with StubAutomation.lock:
+            StubAutomation.active += 1
+            StubAutomation.peak = max(StubAutomation.peak, StubAutomation.active)
+        try:
+            if self.behaviour == "fail":
+                raise RuntimeError("login failed")
+            if self.behaviour == "hang":
+                # a blocked WebDriver call only returns once the browser is closed
+                self.driver.quit_called.wait(10)
+                raise RuntimeError("browser closed")
+            time.sleep(0.05)
+            return {'investor_api': {'Profile': {'Networth': {'CurrentNetworth': 1.0}}}}
+        finally:
+            with StubAutomation.lock:
+                StubAutomation.active -= 1
+
+    def is_unchanged(self, data):
+        return False
+
+    def prepare_report(self, data):
+        return [f"report for {self.name}"]
+
+
+@pytest.fixture
+def stub_batch(monkeypatch):
+    monkeypatch.setattr(batch, 'make_automation', StubAutomation)
+    StubAutomation.active = StubAutomation.peak = 0
+
+    def run(*behaviours, **kwargs):
+        accounts = [{'name': f"a{i}", 'behaviour': b} for i, b in enumerate(behaviours)]
+        return batch.run_batch(accounts, **kwargs)
+    return run
+
+
+def test_accounts_run_concurrently_within_the_worker_bound(stub_batch):
+    results = stub_batch(*["ok"] * 6, workers=3)
+    assert StubAutomation.peak == 3
+    assert {name: r['status'] for name, r in results.items()} == {f"a{i}": 'ok' for i in range(6)}
+    assert results['a4']['report']['message'] == ["report for a4"]
+
+
+def test_a_failing_account_does_not_stop_the_others(stub_batch):
+    results = stub_batch("ok", "fail", "ok", workers=2)
+    assert [results[n]['status'] for n in ("a0", "a1", "a2")] == ['ok', 'failed', 'ok']
+    assert results['a1']['error'] == "login failed"
+
+
+def test_a_hung_account_times_out_and_its_browser_is_closed(stub_batch):
+    started = time.monotonic()
+    results = stub_batch("hang", "ok", "ok", workers=2, timeout=0.2)
+    assert time.monotonic() - started < 3
+    assert results['a0']['status'] == 'timeout'
+    assert results['a0']['automation'].driver.quit_called.is_set()
+    assert results['a1']['status'] == results['a2']['status'] == 'ok'
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from cryptography.fernet import Fernet
+
+from daemon import DriverPool
+from history_store import HistoryStore
+from portfolio_tracker import MyAlternatesAutomation
+
+
+class FakeDriver:
+    def __init__(self):
+        self.origin = "https://pms.example"
+        self.storage = {'accessToken': "secret"}
+        self.cookies = {'session': "abc"}
+        self.calls = []
+
+    def execute_script(self, script):
+        if script.startswith("return window.location.origin"):
+            return self.origin
+        self.calls.append(script)
+        if self.origin != "null":
+            self.storage.clear()
+
+    def delete_all_cookies(self):
+        self.cookies.clear()
+
+    def get(self, url):
+        self.origin = "null"
+
+    def quit(self):
+        pass
+
+
+def payload(networth):
+    return {'Profile': {'Networth': {'CurrentNetworth': networth, 'Return': 0.1}, 'Holdings': []}}
+
+
+def test_release_clears_web_storage_and_cookies():
+    pool = DriverPool(FakeDriver, size=1)
+    driver = pool.acquire()
+    pool.release(driver)
+    assert driver.storage == {} and driver.cookies == {}
+    assert driver.origin == "null"
+    assert pool.acquire() is driver
+
+
+def test_history_store_sees_appends_by_another_process(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "history.enc")
+    daemon_store = HistoryStore(fernet, path, cache_size=4)
+    daemon_store.append(payload(100.0), datetime(2024, 3, 1, 9))
+    assert daemon_store.dates() == ["2024-03-01"]
+    HistoryStore(fernet, path).append(payload(110.0), datetime(2024, 3, 2, 9))
+    assert daemon_store.dates() == ["2024-03-01", "2024-03-02"]
+    daemon_store.append(payload(120.0), datetime(2024, 3, 3, 9))
+    assert len(HistoryStore(fernet, path).entries()) == 3
+
+
+def test_notify_threshold_measures_from_the_last_report():
+    automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    assert not automation.below_notify_threshold(payload(100.1), payload(100.0))
+    automation.notify_min_move_pct = 1.0
+    assert automation.below_notify_threshold(payload(100.5), payload(100.0))
+    assert not automation.below_notify_threshold(payload(101.0), payload(100.0))
+    # small moves add up against the last report, not the last saved snapshot
+    automation.reported_networth = 100.0
+    assert not automation.below_notify_threshold(payload(101.2), payload(100.8))
+
+
+def test_kept_rollups_follow_appends_by_another_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FERNET_KEY', Fernet.generate_key().decode())
+    daemon_side = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    daemon_side.history_cache_size = 32
+    daemon_side.save_current_data(payload(100.0))
+    store = daemon_side.get_history_store()
+    assert daemon_side.get_rollups(store) is daemon_side.get_rollups(store)
+
+    # e.g. a manual `cli.py send` (history_cache_size 0, so nothing kept)
+    MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '').save_current_data(payload(110.0))
+    assert daemon_side.get_rollups(store).state['last']['networth'] == 110.0
+    daemon_side.save_current_data(payload(120.0))
+    rollups = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '').get_rollups(store)
+    assert rollups.state['last']['networth'] == 120.0
@@ -0,0 +1,106 @@
+import math
+
+import pytest
+
+from exposure import ExposureEngine, combined_exposure
+from snapshot_matrix import SnapshotMatrix
+
+
+def holding(isin, sector, category, value, weight, security_type='Equity'):
+    return {'ISIN': isin, 'CompanyName': isin.title(), 'Sector': sector, 'Category': category,
+            'SecurityType': security_type, 'PortfolioValue': value, 'PortfolioWeightage': weight}
+
+
+def payload(networth, *holdings):
+    return {'Profile': {'Networth': {'CurrentNetworth': networth, 'Return': 0.0}, 'Holdings': list(holdings)}}
+
+
+# day 1: networth 1000 = bank 400 + it 300 + pharma 200 + cash 100
+# day 2: networth 1100 = bank 440 + it 270 + cash 90 + new bank holding 300 (pharma sold)
+SNAPSHOTS = [
+    ("2024-03-01", payload(1000.0,
+                           holding("bank", "Banking", "Large Cap", 400.0, 40.0),
+                           holding("it", "IT", "Large Cap", 300.0, 30.0),
+                           holding("pharma", "Pharma", "Mid Cap", 200.0, 20.0),
+                           {'ISIN': "CASH", 'SecurityType': 'Cash', 'PortfolioValue': 100.0, 'PortfolioWeightage': 10.0})),
+    ("2024-03-04", payload(1100.0,
+                           holding("bank", "Banking", "Large Cap", 440.0, 40.0),
+                           holding("it", "IT", "Large Cap", 270.0, 24.5),
+                           holding("bank2", "Banking", "Small Cap", 300.0, 27.3),
+                           {'ISIN': "CASH", 'SecurityType': 'Cash', 'PortfolioValue': 90.0, 'PortfolioWeightage': 8.2})),
+]
+
+
+@pytest.fixture
+def matrix():
+    return SnapshotMatrix.from_snapshots(SNAPSHOTS, security_type=None)
+
+
+def by_group(rows, key):
+    return {row['group']: row[key] for row in rows}
+
+
+def test_sector_weights_values_and_holdings(matrix):
+    engine = ExposureEngine(matrix, 'sector')
+    first = engine.exposure("2024-03-01")
+    assert [row['group'] for row in first] == ["Banking", "IT", "Pharma", "Unknown"]
+    assert by_group(first, 'weight') == {"Banking": 40.0, "IT": 30.0, "Pharma": 20.0, "Unknown": 10.0}
+    assert by_group(first, 'value') == {"Banking": 400.0, "IT": 300.0, "Pharma": 200.0, "Unknown": 100.0}
+
+    last = engine.exposure()
+    assert by_group(last, 'weight') == pytest.approx({"Banking": 67.3, "IT": 24.5, "Unknown": 8.2})
+    assert by_group(last, 'value') == {"Banking": 740.0, "IT": 270.0, "Unknown": 90.0}
+    assert by_group(last, 'holdings') == {"Banking": 2, "IT": 1, "Unknown": 1}
+
+
+def test_category_weights(matrix):
+    last = ExposureEngine(matrix, 'category').exposure()
+    assert by_group(last, 'weight') == pytest.approx({"Large Cap": 64.5, "Small Cap": 27.3, "Unknown": 8.2})
+
+
+def test_drift(matrix):
+    drift = ExposureEngine(matrix, 'sector').drift(0, -1)
+    assert drift[0]['group'] == "Banking"
+    assert by_group(drift, 'change') == pytest.approx({"Banking": 27.3, "Pharma": -20.0, "IT": -5.5,
+                                                       "Unknown": -1.8})
+
+
+def test_attribution_counts_only_holdings_held_on_both_days(matrix):
+    attribution = by_group(ExposureEngine(matrix, 'sector').attribution(), 'contribution_pct')
+    # bank +40 and it -30, cash -10 on a 1000 base; the new and the sold holding contribute nothing
+    assert attribution == pytest.approx({"Banking": 4.0, "IT": -3.0, "Pharma": 0.0, "Unknown": -1.0})
+
+
+def test_combined_exposure_is_value_weighted_over_the_union_of_dates(matrix):
+    other = SnapshotMatrix.from_snapshots([("2024-03-04", payload(
+        900.0, holding("fmcg", "FMCG", "Large Cap", 900.0, 100.0)))], security_type=None)
+    groups, dates, exposure = combined_exposure([matrix, other])
+    assert dates == ["2024-03-01", "2024-03-04"]
+    last = dict(zip(groups, exposure[:, -1]))
+    # 2000 of networth on the last day
+    assert last == pytest.approx({"Banking": 37.0, "FMCG": 45.0, "IT": 13.5, "Pharma": 0.0, "Unknown": 4.5})
+    assert math.isclose(dict(zip(groups, exposure[:, 0]))["Pharma"], 20.0)
+
+
+def test_query_server_sectors_use_the_engine(tmp_path, monkeypatch):
+    from datetime import datetime
+
+    from cryptography.fernet import Fernet
+
+    from portfolio_tracker import MyAlternatesAutomation
+    from query_server import QueryService
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FERNET_KEY', Fernet.generate_key().decode())
+    automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    store = automation.get_history_store()
+    for day, data in SNAPSHOTS:
+        store.append(data, datetime.fromisoformat(day))
+    service = QueryService(automation)
+    service.refresh()
+    sectors = service.sectors(date="2024-03-04")['sectors']
+    assert list(sectors) == ["Banking", "IT", "Unknown"]
+    assert sectors["Banking"] == {'value': 740.0, 'weight': pytest.approx(67.3), 'holdings': 2}
+    assert sectors["Unknown"]['value'] == 90.0
+    change = service.sectors(start="2024-03-01", end="2024-03-04")['change']
+    assert change["Pharma"]['value_change'] == -200.0
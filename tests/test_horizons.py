@@ -0,0 +1,60 @@
+from datetime import date
+
+from horizons import HorizonRollups
+
+
+def payload(networth, value):
+    return {'Profile': {'Networth': {'CurrentNetworth': networth, 'Return': 0.1},
+                        'Holdings': [{'ISIN': "INE1", 'CompanyName': "One", 'SecurityType': 'Equity',
+                                      'PortfolioValue': value}]}}
+
+
+def advance(state, *days):
+    for day, networth in days:
+        state = HorizonRollups.advance(state, day, payload(networth, networth))
+    return state
+
+
+def test_first_snapshot_has_no_horizons():
+    state = advance({'last': None, 'anchors': {}}, (date(2024, 3, 13), 100.0))
+    assert HorizonRollups.summarize(state) == {}
+
+
+def test_horizons_are_period_to_date():
+    # Wed 2024-02-28, Thu 02-29 (end of Feb), Fri 03-01, Mon 03-04 (new ISO week), Wed 03-06
+    state = advance({'last': None, 'anchors': {}}, (date(2024, 2, 28), 100.0), (date(2024, 2, 29), 110.0),
+                    (date(2024, 3, 1), 120.0), (date(2024, 3, 4), 130.0), (date(2024, 3, 6), 150.0))
+    summary = HorizonRollups.summarize(state)
+    assert summary['1D']['base_date'] == "2024-03-04"
+    assert summary['WTD']['base_date'] == "2024-03-01"
+    assert summary['MTD']['base_date'] == "2024-02-29"
+    assert summary['MTD']['value_change'] == 40.0
+    # no earlier year in the data: measured from the first snapshot
+    assert summary['YTD']['base_date'] == "2024-02-28"
+
+
+def test_stored_report_has_the_live_horizons(tmp_path, monkeypatch):
+    from datetime import datetime
+
+    from cryptography.fernet import Fernet
+
+    from portfolio_tracker import MyAlternatesAutomation
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FERNET_KEY', Fernet.generate_key().decode())
+    def full_payload(networth):
+        data = payload(networth, networth)
+        data['Profile']['Holdings'][0].update(Sector="Banking", Category="Large Cap", PortfolioWeightage=100.0)
+        return data
+
+    automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    store = automation.get_history_store()
+    live = {'last': None, 'anchors': {}}
+    for day, networth in ((date(2024, 2, 29), 110.0), (date(2024, 3, 1), 120.0), (date(2024, 3, 4), 130.0),
+                          (date(2024, 3, 6), 150.0)):
+        store.append(full_payload(networth), datetime(day.year, day.month, day.day, 9))
+        live = HorizonRollups.advance(live, day, full_payload(networth))
+
+    analysis, _, _ = automation.prepare_stored_analysis("2024-03-06")
+    assert analysis['horizons'] == HorizonRollups.summarize(live)
+    assert analysis['horizons']['WTD']['base_date'] == "2024-03-01"
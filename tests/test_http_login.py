@@ -0,0 +1,99 @@
+from http_login import HttpLoginBackend, build_form_data, find_login_form
+
+LOGIN_PAGE = """
+<html><body>
+<form action="/search"><input type="text" name="q"></form>
+<form method="POST" action="/auth/login">
+  <input type="hidden" name="csrf_token" value="abc123">
+  <input type="email" id="email" name="user_email" placeholder="Email address">
+  <input type="password" name="pwd">
+  <input type="checkbox" name="remember" value="1">
+  <input type="checkbox" name="newsletter">
+  <input type="submit" name="go" value="Sign in">
+</form>
+</body></html>
+"""
+
+
+class FakeResponse:
+    def __init__(self, url, text="", status_code=200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"status {self.status_code}")
+
+
+class FakeSession:
+    """Serves LOGIN_PAGE and accepts one username / password pair"""
+
+    def __init__(self, page=LOGIN_PAGE):
+        self.page = page
+        self.cookies = []
+        self.requests = []
+
+    def get(self, url, params=None, **kwargs):
+        self.requests.append(('GET', url, params))
+        if params is not None:
+            return self._submit(params)
+        return FakeResponse(url, self.page)
+
+    def post(self, url, data=None, **kwargs):
+        self.requests.append(('POST', url, data))
+        return self._submit(data)
+
+    def _submit(self, data):
+        if data.get('user_email', data.get('username')) == "me@example.com" and data.get('pwd', data.get('password')) == "secret":
+            return FakeResponse("https://pms.example.com/dashboard", "<h1>Dashboard</h1>")
+        return FakeResponse("https://pms.example.com/login", self.page)
+
+
+def test_find_login_form_picks_the_form_with_a_password_field():
+    form = find_login_form(LOGIN_PAGE)
+    assert form['action'] == "/auth/login"
+    assert form['method'] == "post"
+    assert [i['name'] for i in form['inputs']] == ["csrf_token", "user_email", "pwd", "remember", "newsletter", "go"]
+
+
+def test_form_without_method_defaults_to_get():
+    form = find_login_form('<form><input name="username"><input type="password" name="password"></form>')
+    assert form['method'] == "get"
+
+
+def test_build_form_data_keeps_hidden_fields_and_fills_credentials():
+    data, error = build_form_data(find_login_form(LOGIN_PAGE), "me@example.com", "secret")
+    assert error is None
+    assert data == {'csrf_token': "abc123", 'user_email': "me@example.com", 'pwd': "secret", 'remember': "1",
+                    'go': "Sign in"}
+
+
+def test_build_form_data_reports_a_missing_username_field():
+    form = find_login_form('<form method="post"><input type="password" name="pwd"></form>')
+    assert build_form_data(form, "me", "secret") == (None, "Could not find username field")
+
+
+def test_login_posts_the_form_to_its_action():
+    session = FakeSession()
+    assert HttpLoginBackend(session).login("https://pms.example.com/login", "me@example.com", "secret")
+    method, url, data = session.requests[-1]
+    assert (method, url) == ('POST', "https://pms.example.com/auth/login")
+    assert data['csrf_token'] == "abc123"
+
+
+def test_login_submits_a_method_less_form_with_get():
+    session = FakeSession('<form action="/in"><input name="username"><input type="password" name="password"></form>')
+    assert HttpLoginBackend(session).login("https://pms.example.com/login", "me@example.com", "secret")
+    method, url, params = session.requests[-1]
+    assert (method, url) == ('GET', "https://pms.example.com/in")
+    assert params == {'username': "me@example.com", 'password': "secret"}
+
+
+def test_login_fails_when_the_login_page_comes_back():
+    assert not HttpLoginBackend(FakeSession()).login("https://pms.example.com/login", "me@example.com", "wrong")
+
+
+def test_login_fails_without_an_html_form():
+    session = FakeSession("<div id='app'></div><script src='app.js'></script>")
+    assert not HttpLoginBackend(session).login("https://pms.example.com/login", "me@example.com", "secret")
@@ -0,0 +1,29 @@
+from metrics import RunMetrics
+
+
+def test_every_family_has_help_and_type_and_no_resetting_counters():
+    metrics = RunMetrics(labels={'account': "a"})
+    metrics.count('api_retries', 2)
+    metrics.gauge('investor_api_bytes', 1234)
+    with metrics.span('fetch'):
+        pass
+    metrics.set_outcome('success')
+    lines = metrics.prometheus().splitlines()
+
+    families = {line.split()[2] for line in lines if line.startswith("# TYPE")}
+    helped = {line.split()[2] for line in lines if line.startswith("# HELP")}
+    assert families == helped
+    assert all(line.endswith(" gauge") for line in lines if line.startswith("# TYPE"))
+    samples = [line for line in lines if not line.startswith("#")]
+    assert {line.split("{")[0] for line in samples} == families
+    assert 'pms_run_count{name="api_retries",account="a"} 2' in samples
+
+
+def test_quiet_outcomes_count_as_success():
+    for outcome, ok in (('success', 1), ('unchanged', 1), ('below_threshold', 1), ('partial', 0),
+                        ('fetch_failed', 0), ('error', 0), (None, 0)):
+        metrics = RunMetrics(labels={'account': "a"})
+        metrics.set_outcome(outcome)
+        samples = metrics.prometheus().splitlines()
+        assert f'pms_run_success{{account="a"}} {ok}' in samples
+        assert f'pms_run_outcome{{outcome="{outcome or "unknown"}",account="a"}} 1' in samples
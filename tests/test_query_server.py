@@ -0,0 +1,69 @@
+import json
+import threading
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+from cryptography.fernet import Fernet
+
+from portfolio_tracker import MyAlternatesAutomation
+from query_server import QueryService, make_server
+
+
+def holding(isin, value):
+    return {'ISIN': isin, 'CompanyName': f"{isin} Ltd", 'Sector': "Banking", 'Category': "Large Cap",
+            'SecurityType': 'Equity', 'PortfolioValue': value, 'PortfolioWeightage': value / 10}
+
+
+def payload(*holdings):
+    return {'Profile': {'Networth': {'CurrentNetworth': sum(v for _, v in holdings), 'Return': 0.1},
+                        'Holdings': [holding(isin, v) for isin, v in holdings]}}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FERNET_KEY', Fernet.generate_key().decode())
+    automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    automation.get_history_store().append(payload(("A", 600.0), ("B", 400.0)), datetime(2024, 3, 1, 9))
+    service = QueryService(automation)
+    service.refresh()
+    httpd = make_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield service, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(url):
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_sees_securities_appended_by_another_process(server, append_from_other_process):
+    _, base = server
+    assert get(f"{base}/dates") == (200, {'dates': ["2024-03-01"]})
+    # the daily run adds a snapshot with a security the server's master has never seen
+    append_from_other_process(payload(("A", 660.0), ("C", 500.0)), "2024-03-04T09:00:00")
+    status, body = get(f"{base}/snapshot")
+    assert status == 200
+    assert [h['ISIN'] for h in body['snapshot']['Profile']['Holdings']] == ["A", "C"]
+    status, body = get(f"{base}/diff?start=2024-03-01&end=2024-03-04")
+    assert status == 200
+    assert [h['company'] for h in body['new_stocks']] == ["C Ltd"]
+
+
+def test_unexpected_errors_are_json_500s(server, monkeypatch):
+    service, base = server
+
+    def broken(*args, **kwargs):
+        raise IndexError("list index out of range")
+    monkeypatch.setattr(QueryService, 'ROUTES', dict(QueryService.ROUTES, **{'/dates': (broken, (), ())}))
+    status, body = get(f"{base}/dates")
+    assert status == 500
+    assert body == {'error': "internal error: IndexError"}
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+
+from risk_metrics import RiskSeries
+
+
+def payload(networth, invested=1000.0):
+    return {'Profile': {'Networth': {'CurrentNetworth': networth, 'InvestedAmount': invested, 'Return': 0.0},
+                        'Holdings': [{'ISIN': "A", 'CompanyName': "A Ltd", 'PortfolioValue': networth}]}}
+
+
+def series(*days):
+    s = RiskSeries(Fernet(Fernet.generate_key()), "unused.enc")
+    for day, networth in days:
+        s.append(day, payload(networth))
+    return s
+
+
+def test_short_window_has_no_annualized_xirr():
+    start = date(2024, 3, 1)
+    result = series((start, 1000.0), (start + timedelta(days=5), 990.0),
+                    (start + timedelta(days=10), 980.0)).metrics()
+    assert result['days'] == 10
+    assert result['xirr_pct'] is None
+    assert result['twr_annualized_pct'] is None
+    # no flows: the money-weighted return over the window is the plain -2%
+    assert result['mwr_pct'] == pytest.approx(-2.0, abs=1e-6)
+
+
+def test_year_long_window_is_annualized():
+    start = date(2023, 1, 1)
+    result = series((start, 1000.0), (start + timedelta(days=730), 1210.0)).metrics()
+    assert result['xirr_pct'] == pytest.approx(10.0, abs=1e-4)
+    assert result['mwr_pct'] == pytest.approx(21.0, abs=1e-4)
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from cryptography.fernet import Fernet
+
+from portfolio_tracker import MyAlternatesAutomation
+from security_master import SecurityMaster
+
+
+def holding(isin, value):
+    return {'ISIN': isin, 'CompanyName': f"{isin} Ltd", 'Sector': f"{isin} sector", 'Category': "Large Cap",
+            'SecurityType': 'Equity', 'PortfolioValue': value, 'PortfolioWeightage': value / 10}
+
+
+def payload(*isins):
+    return {'Profile': {'Networth': {'CurrentNetworth': 100.0 * len(isins), 'Return': 0.1},
+                        'Holdings': [holding(isin, 100.0) for isin in isins]}}
+
+
+def test_two_processes_share_the_table(tmp_path, monkeypatch, append_from_other_process):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FERNET_KEY', Fernet.generate_key().decode())
+    # long-lived process, as the daemon runs it
+    automation = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '')
+    automation.history_cache_size = 32
+    store = automation.get_history_store()
+    store.append(payload("A", "B"), datetime(2024, 3, 1, 9))
+
+    append_from_other_process(payload("A", "B", "C"), "2024-03-02T09:00:00")
+    assert automation.load_previous_data() == payload("A", "B", "C")
+
+    # registering here must continue after the other process's ids, not reuse them
+    store.append(payload("A", "D"), datetime(2024, 3, 3, 9))
+    append_from_other_process(payload("E", "C"), "2024-03-04T09:00:00")
+
+    fresh = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '').get_history_store()
+    fresh.master = SecurityMaster(fresh.fernet, automation.security_master_file)
+    fresh.master.load()
+    assert [fresh.read(e) for e in fresh.entries()] == [
+        payload("A", "B"), payload("A", "B", "C"), payload("A", "D"), payload("E", "C")]
+    assert automation.load_previous_data() == payload("E", "C")
+    assert fresh.master.stats()['variants'] == 5
+
+
+def test_save_merges_entries_saved_elsewhere(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "master.enc")
+    first, second = SecurityMaster(fernet, path), SecurityMaster(fernet, path)
+    with first.locked():
+        first.variant_id(holding("A", 1.0))
+        first.save()
+    # second registered B before it saw A on disk: the save keeps both
+    second.variant_id(holding("B", 1.0))
+    second.save()
+    merged = SecurityMaster(fernet, path)
+    merged.load()
+    assert [v[0] for v in merged.variants] == ["A", "B"]
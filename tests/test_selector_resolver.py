@@ -0,0 +1,73 @@
+import json
+
+from selector_resolver import SelectorResolver, to_spec
+
+LOGIN_URL = "https://pms.example/login?tenant=secret"
+SUBMIT = ["button[type='submit']", "button:contains('Sign in', 'Login')", ".btn-primary", "form button"]
+
+
+class FakeDriver:
+    """
+    Evaluates the resolver's specs against a fake DOM: `elements` are (css selectors the element
+    matches, text). Records the spec order of every poll.
+    """
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.polls = []
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def execute_script(self, script, specs):
+        self.polls.append([s['css'] for s in specs])
+        for i, spec in enumerate(specs):
+            for selectors, text in self.elements:
+                if spec['css'] not in selectors:
+                    continue
+                if 'texts' in spec and not any(t in " ".join(text.split()).lower() for t in spec['texts']):
+                    continue
+                return [i, (selectors, text)]
+        return None
+
+
+def resolver(driver, tmp_path, url=LOGIN_URL):
+    return SelectorResolver(driver, url, str(tmp_path / "selectors.json"), poll_frequency=0.01)
+
+
+def test_contains_matches_either_text_in_any_case():
+    assert to_spec("button:contains('Sign in', 'Login')") == {'css': "button", 'texts': ["sign in", "login"]}
+    assert to_spec(".btn-primary") == {'css': ".btn-primary"}
+    driver = FakeDriver([({"button", "form button"}, "LOGIN")])
+    element, selector = SelectorResolver(driver, LOGIN_URL, None).resolve("submit", SUBMIT, timeout=0.1)
+    assert selector == "button:contains('Sign in', 'Login')"
+    driver = FakeDriver([({"button", "form button"}, "  Sign\n In ")])
+    assert SelectorResolver(driver, LOGIN_URL, None).resolve("submit", SUBMIT, timeout=0.1)[1] == selector
+
+
+def test_falls_back_to_later_selectors_and_times_out(tmp_path):
+    driver = FakeDriver([({"form button"}, "Continue")])
+    element, selector = resolver(driver, tmp_path).resolve("submit", SUBMIT, timeout=0.1)
+    assert selector == "form button"
+    assert element == ({"form button"}, "Continue")
+
+    empty = resolver(FakeDriver([]), tmp_path)
+    assert empty.resolve("submit", SUBMIT, timeout=0.05) == (None, None)
+    assert empty.timings['submit'] >= 0.05
+
+
+def test_winner_is_tried_first_for_the_same_url_only(tmp_path):
+    first = resolver(FakeDriver([({".btn-primary", "form button"}, "Go")]), tmp_path)
+    assert first.resolve("submit", SUBMIT, timeout=0.1)[1] == ".btn-primary"
+    first.save()
+    # the login URL is a secret: only its hash is stored
+    assert LOGIN_URL not in (tmp_path / "selectors.json").read_text()
+    assert list(json.loads((tmp_path / "selectors.json").read_text()).values()) == [{'submit': ".btn-primary"}]
+
+    hit = FakeDriver([({".btn-primary", "form button"}, "Go")])
+    assert resolver(hit, tmp_path).resolve("submit", SUBMIT, timeout=0.1)[1] == ".btn-primary"
+    assert hit.polls[0][0] == ".btn-primary"
+
+    miss = FakeDriver([({".btn-primary", "form button"}, "Go")])
+    resolver(miss, tmp_path, url="https://other.example/login").resolve("submit", SUBMIT, timeout=0.1)
+    assert miss.polls[0] == [to_spec(s)['css'] for s in SUBMIT]
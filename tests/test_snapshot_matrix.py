@@ -0,0 +1,28 @@
+import pytest
+
+from portfolio_tracker import MyAlternatesAutomation
+from snapshot_matrix import SnapshotMatrix
+from synthetic_data import generate_history
+
+
+def pick(rows, *keys):
+    return [tuple(row[k] for k in keys) for row in rows]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_diff_matches_analyze_changes(seed):
+    history = generate_history(holdings=80, days=6, seed=seed, churn=0.05)
+    (start, previous), (end, current) = history[0], history[-1]
+    analysis = MyAlternatesAutomation('u', 'p', 'http://127.0.0.1/login', '', '').analyze_changes(previous, current)
+    diff = SnapshotMatrix.from_snapshots(history).diff(start, end)
+
+    assert diff['networth_change'] == pytest.approx(analysis['portfolio']['value_change'])
+    assert diff['networth_change_pct'] == pytest.approx(analysis['portfolio']['value_change_pct'])
+    for section in ('top_gainers', 'top_losers'):
+        expected = pick(analysis[section], 'company', 'value_change_pct', 'weight_change', 'current_weight')
+        assert pick(diff[section], 'company', 'value_change_pct', 'weight_change', 'current_weight') == \
+            [pytest.approx(row) for row in expected]
+    for section in ('new_stocks', 'removed_stocks'):
+        assert analysis[section], f"synthetic history has no {section}"
+        assert pick(diff[section], 'company', 'weightage', 'value') == \
+            pick(analysis[section], 'company', 'weightage', 'value')
@@ -0,0 +1,88 @@
+import asyncio
+
+from telethon.errors import FloodWaitError
+
+from telegram_broadcast import TelegramBroadcaster
+
+
+class FakeClient:
+    """Records sends and the peak number in flight; `script` maps recipient -> exceptions to raise first"""
+
+    def __init__(self, script=None, delay=0.01):
+        self.script = {r: list(errors) for r, errors in (script or {}).items()}
+        self.delay = delay
+        self.sent = []
+        self.in_flight = 0
+        self.peak = 0
+        self.connected = False
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def send_message(self, recipient, msg):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            errors = self.script.get(recipient)
+            if errors:
+                raise errors.pop(0)
+            self.sent.append((recipient, msg))
+        finally:
+            self.in_flight -= 1
+
+
+def make_broadcaster(client, **kwargs):
+    return TelegramBroadcaster(1, "hash", "", client_factory=lambda: client, **kwargs)
+
+
+def test_concurrent_sends_are_bounded_by_the_semaphore():
+    client = FakeClient()
+    results = make_broadcaster(client, concurrency=3).broadcast(list(range(10)), ["part 1", "part 2"])
+    assert client.peak == 3
+    assert all(r['ok'] and r['sent'] == 2 for r in results)
+    assert len(client.sent) == 20
+    assert not client.connected
+
+
+def test_chunks_reach_each_recipient_in_order():
+    client = FakeClient()
+    make_broadcaster(client).broadcast([7, 8], iter(["a", "b", "c"]))
+    for recipient in (7, 8):
+        assert [m for r, m in client.sent if r == recipient] == ["a", "b", "c"]
+
+
+def test_flood_wait_is_retried():
+    client = FakeClient({5: [FloodWaitError(request=None, capture=0), FloodWaitError(request=None, capture=0)]})
+    [result] = make_broadcaster(client).broadcast([5], "hello")
+    assert result['ok']
+    assert result['attempts'] == 3
+    assert client.sent == [(5, "hello")]
+
+
+def test_flood_wait_gives_up_after_max_retries():
+    client = FakeClient({5: [FloodWaitError(request=None, capture=0)] * 3})
+    [result] = make_broadcaster(client, max_retries=2).broadcast([5], "hello")
+    assert not result['ok']
+    assert "giving up" in result['error']
+    assert client.sent == []
+
+
+def test_flood_wait_longer_than_the_limit_is_not_waited_for():
+    client = FakeClient({5: [FloodWaitError(request=None, capture=3600)]})
+    [result] = make_broadcaster(client, max_flood_wait=60).broadcast([5], "hello")
+    assert not result['ok']
+    assert result['attempts'] == 2
+
+
+def test_a_failing_chat_does_not_affect_the_others():
+    client = FakeClient({2: [ValueError("chat not found")]})
+    results = make_broadcaster(client).broadcast([1, 2, 3], ["first", "second"])
+    assert [r['ok'] for r in results] == [True, False, True]
+    assert results[1]['error'] == "chat not found"
+    assert results[1]['sent'] == 0
+    # the remaining chunks for the failed chat are dropped, the others get everything
+    assert sorted(client.sent) == [(1, "first"), (1, "second"), (3, "first"), (3, "second")]